@@ -0,0 +1,170 @@
+"""
+File with functions to analyse saved results (see class ResultsStore). All
+functions work with whole tables at once, so time of analysis grows with size of
+array and not with number of Python loops over projects and periods.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from periods import get_periods, roll_up
+from results_store import ResultsStore
+
+PERIODS_PER_YEAR = 4
+# Число периодов в году для длин периодов, из которых год складывается целиком
+YEAR_LENGTHS = {"month": 12, "quarter": 4, "year": 1}
+
+
+def _reindex_to_calendar(frame: pd.DataFrame, periods: Dict[str, Tuple[str, str]], granularity: str
+                         ) -> pd.DataFrame:
+    """
+    Function puts rows of table in order of dates and inserts missing periods, so
+    neighbouring rows are neighbouring calendar periods.
+    :param frame: table with periods in rows;
+    :param periods: dictionary with names of periods and their start and end dates
+    (for example periods of ResultsStore);
+    :param granularity: granularity of periods.
+    :return: table with all calendar periods from first to last period in rows.
+    Values for missing periods are NaN.
+    """
+
+    missing = [name for name in frame.index if name not in periods]
+    if missing:
+        raise ValueError(f"There are no dates for periods: {', '.join(map(str, missing))}")
+    names = sorted(frame.index, key=periods.get)
+    calendar = get_periods(periods[names[0]][0], periods[names[-1]][1], granularity) if names else {}
+    for name in names:
+        if calendar.get(name) != tuple(periods[name]):
+            raise ValueError(f"Period '{name}' ({periods[name][0]} - {periods[name][1]}) is not calendar period "
+                             f"of granularity '{granularity}'")
+    return frame.reindex(list(calendar))
+
+
+def get_group_totals(frame: pd.DataFrame, groups: Dict[str, Iterable[str]]) -> pd.DataFrame:
+    """
+    Function returns totals of groups of projects for every period.
+    :param frame: table with periods in rows and projects in columns;
+    :param groups: dictionary with names of groups and names of projects in groups
+    (for example {"Malt": MALT_PAYMENT_LIST, "EZ": EZ_PAYMENT_LIST}). Projects that
+    are not in table are ignored.
+    :return: table with periods in rows and groups in columns. If there are no values
+    for group in period then total is NaN.
+    """
+
+    membership = np.zeros((len(frame.columns), len(groups)))
+    for index, project_names in enumerate(groups.values()):
+        membership[:, index] = frame.columns.isin(list(project_names))
+    values = frame.to_numpy()
+    totals = np.nan_to_num(values) @ membership
+    # Группа без единого значения за период не считается нулевой
+    counts = (~np.isnan(values)) @ membership
+    totals[counts == 0] = np.nan
+    return pd.DataFrame(totals, index=frame.index, columns=list(groups))
+
+
+def get_margins(store: ResultsStore, rate: float) -> pd.DataFrame:
+    """
+    Function returns margins M = C * (Iu - Eu) + Ir - Er of projects for every
+    period, where Iu, Eu are USD incomes and expenditures, Ir, Er are RUB incomes and
+    expenditures and C is exchange rate.
+    :param store: results with metrics INCOME_RUB, EXPENDITURE_RUB, INCOME_USD and
+    EXPENDITURE_USD (see save_finances.py);
+    :param rate: exchange rate C.
+    :return: table with periods in rows and projects in columns.
+    """
+
+    income_rub, expenditure_rub, income_usd, expenditure_usd = (
+        get_metric(store, metric).to_numpy() for metric in ("INCOME_RUB", "EXPENDITURE_RUB", "INCOME_USD",
+                                                             "EXPENDITURE_USD"))
+    margins = rate * (income_usd - expenditure_usd) + income_rub - expenditure_rub
+    return pd.DataFrame(margins, index=list(store.periods), columns=store.projects)
+
+
+def get_metric(store: ResultsStore, metric: str) -> pd.DataFrame:
+    """
+    Function returns values of metric of all projects for every period. Table is
+    built over memory-mapped array without copying.
+    :param store: results;
+    :param metric: name of metric.
+    :return: table with periods in rows and projects in columns.
+    """
+
+    return pd.DataFrame(store.values[:, :, store.metrics.index(metric)], index=list(store.periods),
+                        columns=store.projects, copy=False)
+
+
+def get_project_totals(store: ResultsStore, metrics: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Function returns totals of metrics of projects over all periods.
+    :param store: results;
+    :param metrics: names of metrics. If None then all metrics are used.
+    :return: table with projects in rows and metrics in columns.
+    """
+
+    metrics = store.metrics if metrics is None else list(metrics)
+    indexes = [store.metrics.index(metric) for metric in metrics]
+    totals = np.nansum(store.values[:, :, indexes], axis=0)
+    return pd.DataFrame(totals, index=store.projects, columns=metrics)
+
+
+def get_period_totals(frame: pd.DataFrame, base_periods: Dict[str, Tuple[str, str]], granularity: str
+                      ) -> pd.DataFrame:
+    """
+    Function returns totals for coarser calendar periods (for example for quarters
+    or years from months). Totals are summed up locally, no requests are needed.
+    :param frame: table with base periods in rows;
+    :param base_periods: dictionary with names of base periods and their start and
+    end dates in order of dates (for example periods of ResultsStore);
+    :param granularity: granularity of periods ("week", "month", "quarter" or
+    "year").
+    :return: table with periods of given granularity in rows. If there are no values
+    for period then total is NaN.
+    """
+
+    dates = list(base_periods.values())
+    periods = get_periods(dates[0][0], dates[-1][1], granularity)
+    return pd.DataFrame(roll_up(frame.loc[list(base_periods)].to_numpy(), base_periods, periods),
+                        index=list(periods), columns=frame.columns)
+
+
+def get_rolling_totals(frame: pd.DataFrame, periods: Dict[str, Tuple[str, str]], granularity: str = "quarter",
+                       window: int = PERIODS_PER_YEAR) -> pd.DataFrame:
+    """
+    Function returns rolling totals over given number of last periods (for example
+    totals for last 12 months for every quarter). Window is counted in calendar
+    periods, not in rows of table.
+    :param frame: table with periods in rows;
+    :param periods: dictionary with names of periods and their start and end dates
+    (for example periods of ResultsStore);
+    :param granularity: granularity of periods;
+    :param window: number of periods in window.
+    :return: table with rolling totals for all calendar periods from first to last
+    period. Totals are NaN until there are enough periods and for windows with
+    missing periods.
+    """
+
+    return _reindex_to_calendar(frame, periods, granularity).rolling(window).sum()
+
+
+def get_year_over_year(frame: pd.DataFrame, periods: Dict[str, Tuple[str, str]], granularity: str = "quarter",
+                       relative: bool = False) -> pd.DataFrame:
+    """
+    Function returns change of values compared to the same period of previous year.
+    :param frame: table with periods in rows;
+    :param periods: dictionary with names of periods and their start and end dates
+    (for example periods of ResultsStore);
+    :param granularity: "month", "quarter" or "year";
+    :param relative: if True then relative change is returned, otherwise absolute
+    change.
+    :return: table with changes for all calendar periods from first to last period.
+    Changes for first year and for periods without the same period of previous year
+    are NaN.
+    """
+
+    if granularity not in YEAR_LENGTHS:
+        raise ValueError(f"Year does not consist of whole number of periods of granularity '{granularity}', "
+                         f"available: {', '.join(YEAR_LENGTHS)}")
+    frame = _reindex_to_calendar(frame, periods, granularity)
+    previous = frame.shift(YEAR_LENGTHS[granularity])
+    change = frame - previous
+    return change / previous.abs() if relative else change
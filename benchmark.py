@@ -0,0 +1,141 @@
+"""
+File with benchmark of scripts against local stand-in of ximc Redmine.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from fake_redmine import FakeData, FakeRedmineServer
+from request_layer import RATE
+from save_finances import EZ_PAYMENT_LIST, MALT_PAYMENT_LIST, RAW_PAYMENT_LIST, ZAP_PAYMENT_LIST
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Имена, которые используются в example.py (проект Payments уже есть в RAW_PAYMENT_LIST)
+EXAMPLE_PROJECTS = ["EP-software"]
+EXAMPLE_USERS = ["dasha", "mikheev", "VladBelov", "vladimirov_iy"]
+EXAMPLE_VERSIONS = ["Развитие-2018"]
+USAGE_FILE_VARIABLE = "BENCHMARK_USAGE_FILE"
+WORKLOADS: Dict[str, Tuple[str, List[str]]] = {"example": ("example.py", []),
+                                               "finances": ("save_finances.py", []),
+                                               "finances-grouped": ("save_finances.py", ["--grouped"]),
+                                               "finances-csv": ("save_finances.py", ["--csv"]),
+                                               "finances-local": ("save_finances.py", ["--local"]),
+                                               "finances-store": ("save_finances.py", ["--store"])}
+
+
+def _save_usage():
+    """
+    Function saves CPU time and peak memory of current process to file given by
+    environment variable.
+    """
+
+    usage = {"cpu_time": time.process_time(), "peak_memory": None}
+    if resource is not None:
+        # На Linux ru_maxrss задается в килобайтах
+        usage["peak_memory"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    with open(os.environ[USAGE_FILE_VARIABLE], "w", encoding="utf-8") as file:
+        json.dump(usage, file)
+
+
+def run_script(script: str, args: List[str]):
+    """
+    Function runs script in current process and saves its resource usage at exit.
+    :param script: path to script;
+    :param args: arguments of script.
+    """
+
+    atexit.register(_save_usage)
+    sys.argv = [script, *args]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    runpy.run_path(script, run_name="__main__")
+
+
+def run_workload(server: FakeRedmineServer, name: str, runs: int = 1, rate: float = RATE) -> List[dict]:
+    """
+    Function runs workload against fake Redmine and measures it.
+    :param server: fake Redmine;
+    :param name: name of workload;
+    :param runs: number of consecutive runs in the same working directory (second
+    and later runs show effect of caches);
+    :param rate: maximum number of requests per second sent by workload.
+    :return: list with measurements of every run.
+    """
+
+    script, args = WORKLOADS[name]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "config.ini"), "w", encoding="utf-8") as file:
+            file.write(f"[MAIN]\nlogin = benchmark\npassword = benchmark\nurl = {server.url}\n\n"
+                       f"[NETWORK]\nrate = {rate}\n")
+        usage_file = os.path.join(directory, "usage.json")
+        for _ in range(runs):
+            server.reset_stats()
+            start = time.perf_counter()
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-script", script, *args],
+                                     cwd=directory, env=dict(os.environ, **{USAGE_FILE_VARIABLE: usage_file}),
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            wall_time = time.perf_counter() - start
+            with open(usage_file, "r", encoding="utf-8") as file:
+                usage = json.load(file)
+            results.append({"workload": name,
+                            "returncode": process.returncode,
+                            "requests": server.stats["requests"],
+                            "bytes": server.stats["bytes"],
+                            "errors": server.stats["errors"],
+                            "wall_time": round(wall_time, 3),
+                            "cpu_time": round(usage["cpu_time"], 3),
+                            "peak_memory": usage["peak_memory"]})
+            if process.returncode:
+                print(process.stderr, file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--run-script":
+        run_script(sys.argv[2], sys.argv[3:])
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="Benchmark of scripts against local stand-in of ximc Redmine")
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS),
+                        help="workloads to run")
+    parser.add_argument("--projects", type=int, default=100, help="number of projects")
+    parser.add_argument("--users", type=int, default=50, help="number of users")
+    parser.add_argument("--issues", type=int, default=100000, help="number of issues")
+    parser.add_argument("--latency", type=float, default=0.02, help="delay of every response in seconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests that fail")
+    parser.add_argument("--rate", type=float, default=RATE,
+                        help="maximum number of requests per second sent by workloads")
+    parser.add_argument("--runs", type=int, default=1, help="number of consecutive runs of every workload")
+    parser.add_argument("--json", help="name of file to save results")
+    args = parser.parse_args()
+
+    payment_list = MALT_PAYMENT_LIST + EZ_PAYMENT_LIST + RAW_PAYMENT_LIST + ZAP_PAYMENT_LIST
+    fake_data = FakeData(project_names=payment_list + EXAMPLE_PROJECTS, user_names=EXAMPLE_USERS,
+                         version_names=EXAMPLE_VERSIONS, projects_number=args.projects, users_number=args.users,
+                         issues_number=args.issues)
+    fake_server = FakeRedmineServer(fake_data, latency=args.latency, error_rate=args.error_rate)
+    fake_server.start()
+    all_results = []
+    print(f"{'workload':<16}{'requests':>10}{'bytes':>14}{'errors':>8}{'wall, s':>10}{'cpu, s':>10}"
+          f"{'memory, MB':>12}")
+    for workload in args.workloads:
+        for result in run_workload(fake_server, workload, args.runs, args.rate):
+            all_results.append(result)
+            memory = "-" if result["peak_memory"] is None else f"{result['peak_memory'] / 2 ** 20:.1f}"
+            print(f"{result['workload']:<16}{result['requests']:>10}{result['bytes']:>14}{result['errors']:>8}"
+                  f"{result['wall_time']:>10}{result['cpu_time']:>10}{memory:>12}")
+    fake_server.stop()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(all_results, file, indent=2)
@@ -0,0 +1,155 @@
+"""
+File with functions to render charts of saved results to files. Charts are
+rendered by pool of processes with Agg backend, charts whose data have not changed
+since the last rendering are skipped.
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+DPI = 100
+FIGURE_SIZE = (8, 4.5)
+MANIFEST_FILE = "charts.json"
+# Рисунок с осями и линией создается в каждом процессе один раз и используется для всех графиков
+_template = None
+
+
+def _get_file_name(name: str, file_format: str) -> str:
+    """
+    Function returns name of file for chart.
+    :param name: name of chart (for example name of project);
+    :param file_format: format of file.
+    :return: name of file.
+    """
+
+    return f"{re.sub(r'[^0-9A-Za-zА-Яа-яЁё._-]+', '_', name)}.{file_format}"
+
+
+def _get_hash(name: str, x_labels: List[str], values: np.ndarray, settings: tuple) -> str:
+    """
+    Function returns hash of input data of chart.
+    :param name: name of chart;
+    :param x_labels: labels of points;
+    :param values: values of points;
+    :param settings: other settings that affect picture.
+    :return: hash.
+    """
+
+    digest = hashlib.sha256(json.dumps([name, x_labels, settings], ensure_ascii=False).encode("utf-8"))
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _get_template(figure_size: Tuple[float, float], dpi: int):
+    """
+    Function returns figure template of current process, template is created at
+    first call. Figure is drawn by Agg canvas directly without pyplot, so backend of
+    notebook is not changed.
+    :param figure_size: size of figure in inches;
+    :param dpi: resolution of figure.
+    :return: figure, axes and line of template.
+    """
+
+    global _template
+    if _template is None or _template[0] != (tuple(figure_size), dpi):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=figure_size, dpi=dpi)
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot(1, 1, 1)
+        # Поля задаются один раз вместо подбора разметки для каждого графика
+        figure.subplots_adjust(left=0.12, right=0.97, top=0.9, bottom=0.22)
+        line, = axes.plot([], [], marker="o")
+        _template = (tuple(figure_size), dpi), figure, axes, line
+    return _template[1:]
+
+
+def _render_batch(charts: List[Tuple[str, str, List[str], np.ndarray]], xlabel: str, ylabel: str,
+                  figure_size: Tuple[float, float], dpi: int) -> List[str]:
+    """
+    Function renders charts with figure template of current process.
+    :param charts: list with paths of files, titles, labels of points and values of
+    charts;
+    :param xlabel: label of x axis;
+    :param ylabel: label of y axis;
+    :param figure_size: size of figure in inches;
+    :param dpi: resolution of figure.
+    :return: paths of rendered files.
+    """
+
+    figure, axes, line = _get_template(figure_size, dpi)
+    axes.set_xlabel(xlabel, fontweight="semibold")
+    axes.set_ylabel(ylabel, fontweight="semibold")
+    for path, title, x_labels, values in charts:
+        line.set_data(np.arange(len(values)), values)
+        axes.set_title(title, fontweight="bold")
+        axes.set_xticks(range(len(x_labels)))
+        axes.set_xticklabels(x_labels, rotation=30, ha="right")
+        axes.relim()
+        axes.autoscale_view()
+        figure.savefig(path)
+    return [path for path, _, _, _ in charts]
+
+
+def render_charts(frame: pd.DataFrame, directory: str, xlabel: str = "", ylabel: str = "", file_format: str = "png",
+                  workers: Optional[int] = None, force: bool = False, figure_size: Tuple[float, float] = FIGURE_SIZE,
+                  dpi: int = DPI) -> Dict[str, str]:
+    """
+    Function renders chart for every column of table (for example for every project
+    or group of projects) to files in given directory. Charts are rendered by pool of
+    processes. Hashes of input data of charts are saved in directory, charts whose
+    data have not changed since the last rendering are not rendered again.
+    :param frame: table with periods in rows and charts in columns;
+    :param directory: directory for files;
+    :param xlabel: label of x axis;
+    :param ylabel: label of y axis;
+    :param file_format: format of files ("png" or "svg");
+    :param workers: number of processes. If None then number of processors is used;
+    :param force: if True then all charts are rendered;
+    :param figure_size: size of figure in inches;
+    :param dpi: resolution of figure.
+    :return: dictionary with names and paths of rendered charts.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    x_labels = [str(label) for label in frame.index]
+    settings = (xlabel, ylabel, file_format, tuple(figure_size), dpi)
+    charts = []
+    paths = {}
+    hashes = {}
+    for name in frame.columns:
+        path = os.path.join(directory, _get_file_name(str(name), file_format))
+        values = frame[name].to_numpy(dtype=np.float64)
+        hashes[path] = _get_hash(str(name), x_labels, values, settings)
+        if force or manifest.get(os.path.basename(path)) != hashes[path] or not os.path.exists(path):
+            charts.append((path, str(name), x_labels, values))
+            paths[str(name)] = path
+    workers = min(workers or os.cpu_count() or 1, len(charts))
+    if workers == 1:
+        _render_batch(charts, xlabel, ylabel, figure_size, dpi)
+    elif workers > 1:
+        # Графики делятся на пачки, чтобы сократить число передач данных между процессами
+        batches = [charts[index::workers * 4] for index in range(min(workers * 4, len(charts)))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(_render_batch, batches, [xlabel] * len(batches),
+                                  [ylabel] * len(batches), [figure_size] * len(batches), [dpi] * len(batches)):
+                pass
+    for path, _, _, _ in charts:
+        manifest[os.path.basename(path)] = hashes[path]
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1)
+    os.replace(temp_path, manifest_path)
+    return paths
@@ -4,6 +4,9 @@ Example file.
 
 import configparser
 import sys
+from request_layer import create_request_layer
+from stats_client import StatsClient
+import utils as ut
 from ximc import XimcRedmine
 
 if __name__ == "__main__":
@@ -11,8 +14,9 @@ if __name__ == "__main__":
     config.read("config.ini")
     user_name = config.get("MAIN", "login")
     password = config.get("MAIN", "password")
+    url = config.get("MAIN", "url", fallback=ut.REDMINE_URL)
     try:
-        ximc_user = XimcRedmine(user_name, password)
+        ximc_user = XimcRedmine(user_name, password, url=url, request_layer=create_request_layer(config))
         ximc_user.auth()
     except Exception:
         print("User authorization failed")
@@ -69,3 +73,14 @@ if __name__ == "__main__":
     print("\nAll projects")
     for option_name, value in totals.items():
         print(f"{option_name}: {value}")
+
+    # Если запущен локальный демон (python stats_daemon.py), те же итоги можно получить у него: демон уже
+    # авторизован, а повторные запросы отвечаются из памяти без обращения к серверу
+    client = StatsClient()
+    if client.is_running():
+        filters = [("Status", "is", "Closed"), ("Tracker", "is not", "Bug"), ("Priority", "is", "Normal"),
+                   ("Author", "is", "dasha"), ("Assignee", "is", "vladimirov_iy"), ("% Done", ">=", 50)]
+        totals = client.get_totals(filters, "Estimated time", "Spent time", "Payment cash", "Payment cashless", "Rate")
+        print("\nAll projects (stats daemon)")
+        for option_name, value in totals.items():
+            print(f"{option_name}: {value}")
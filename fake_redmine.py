@@ -0,0 +1,810 @@
+"""
+File with local stand-in of ximc Redmine. Server serves page with issues and JSON
+API used by class XimcRedmine on synthetic data, so that performance of client
+can be measured without production Redmine.
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+
+ACTIVITIES = ((8, "Design"), (9, "Development"), (10, "Testing"))
+CATEGORIES = ("", "Income", "Expense", "Salary")
+CLOSED_STATUSES = (5, 6)
+CURRENCY_SUBJECT = "Платеж валюта"
+CUSTOM_FIELDS = {28: "Payment category", 29: "Payment cash", 30: "Payment cashless", 38: "Rate", 39: "Payment tail"}
+EPOCH = date(2017, 1, 1)
+MAX_LIMIT = 100
+PRIORITIES = (12, 3, 4, 5, 6, 7)
+STATUSES = ((1, "New"), (2, "Assigned"), (3, "Resolved"), (4, "Feedback"), (5, "Closed"), (6, "Rejected"))
+SUBJECT = "Платеж"
+TOTALS_COLUMNS = ("estimated_hours", "spent_hours", "cf_29", "cf_30", "cf_38", "cf_39")
+TRACKERS = ((1, "Bug"), (2, "Feature"), (3, "Support"), (4, "Payment"))
+
+
+def _get_filters_script() -> str:
+    """
+    Function returns script with definitions of filters that Redmine embeds into page
+    with issues for form of filters.
+    :return: HTML of script.
+    """
+
+    operator_labels = {"=": "is", "!": "is not", "o": "open", "c": "closed", "!*": "none", "*": "any", ">=": ">=",
+                       "<=": "<=", "><": "between", "~": "contains", "!~": "doesn't contain"}
+    operator_by_type = {"list": ["=", "!"], "list_status": ["o", "=", "!", "c", "*"],
+                        "list_optional": ["=", "!", "!*", "*"], "date": ["=", ">=", "<=", "><", "!*", "*"],
+                        "text": ["~", "!~", "!*", "*"], "integer": ["=", ">=", "<=", "><", "!*", "*"]}
+    available_filters = {"status_id": {"type": "list_status", "name": "Status",
+                                       "values": [[name, str(status_id)] for status_id, name in STATUSES]},
+                         "project_id": {"type": "list", "name": "Project", "remote": True},
+                         "tracker_id": {"type": "list", "name": "Tracker",
+                                        "values": [[name, str(tracker_id)] for tracker_id, name in TRACKERS]},
+                         "subject": {"type": "text", "name": "Subject"},
+                         "due_date": {"type": "date", "name": "Due date"},
+                         "updated_on": {"type": "date", "name": "Updated"}}
+    for field_id, name in CUSTOM_FIELDS.items():
+        available_filters[f"cf_{field_id}"] = ({"type": "list_optional", "name": name,
+                                                "values": [[category, category] for category in CATEGORIES[1:]]}
+                                               if field_id == 28 else {"type": "integer", "name": name})
+    return (f"<script>\n//<![CDATA[\nvar operatorLabels = {json.dumps(operator_labels)};\n"
+            f"var operatorByType = {json.dumps(operator_by_type)};\n"
+            f"var availableFilters = {json.dumps(available_filters)};\n//]]>\n</script>")
+
+
+def _to_day(value: str) -> int:
+    """
+    Function converts date in ISO format to number of days since epoch.
+    :param value: date or time in ISO format.
+    :return: number of days.
+    """
+
+    return (date.fromisoformat(value[:10]) - EPOCH).days
+
+
+def _to_iso(day: int, with_time: bool = False) -> str:
+    """
+    Function converts number of days since epoch to date in ISO format.
+    :param day: number of days;
+    :param with_time: if True then time is added.
+    :return: date or time in ISO format.
+    """
+
+    value = (EPOCH + timedelta(days=int(day))).isoformat()
+    return f"{value}T10:00:00Z" if with_time else value
+
+
+class FakeData:
+    """
+    Class with synthetic projects, users, versions and issues. Issues are kept in
+    NumPy arrays, so that millions of issues can be filtered quickly.
+    """
+
+    def __init__(self, project_names: Iterable[str] = (), user_names: Iterable[str] = (),
+                 version_names: Iterable[str] = (), projects_number: int = 100, users_number: int = 50,
+                 issues_number: int = 10000, start_date: str = "2018-01-01", stop_date: str = "2022-12-31",
+                 seed: int = 0, time_entries_number: Optional[int] = None):
+        """
+        :param project_names: names of projects that must exist, other projects get
+        generated names. Repeated names are dropped;
+        :param user_names: names of users that must exist;
+        :param version_names: names of versions that must exist, they are added to
+        first project;
+        :param projects_number: total number of projects;
+        :param users_number: total number of users;
+        :param issues_number: number of issues;
+        :param start_date: earliest creation date of issues;
+        :param stop_date: latest creation date of issues;
+        :param seed: seed of random generator;
+        :param time_entries_number: number of time entries. If None then it equals
+        number of issues.
+        """
+
+        rng = np.random.default_rng(seed)
+        project_names = list(dict.fromkeys(project_names))
+        project_names += [f"project-{index}" for index in range(len(project_names), projects_number)]
+        self.projects: List[dict] = [{"id": index + 1, "name": name, "identifier": name.lower()}
+                                     for index, name in enumerate(project_names)]
+        user_names = list(user_names)
+        user_names += [f"user-{index}" for index in range(len(user_names), users_number)]
+        self.users: List[dict] = [{"id": index + 1, "name": name, "login": name}
+                                  for index, name in enumerate(user_names)]
+        self.groups: List[dict] = [{"id": len(self.users) + 1, "name": "Developers"}]
+        self.memberships: Dict[int, List[int]] = {}
+        self.versions: Dict[int, List[dict]] = {}
+        version_id = 1
+        for project in self.projects:
+            members = rng.choice(len(self.users), size=min(10, len(self.users)), replace=False) + 1
+            self.memberships[project["id"]] = sorted(int(user_id) for user_id in members)
+            names = [f"{project['name']}-v{index}" for index in range(3)]
+            if project["id"] == 1:
+                names = list(version_names) + names
+            self.versions[project["id"]] = []
+            for name in names:
+                self.versions[project["id"]].append({"id": version_id, "name": name, "status": "open"})
+                version_id += 1
+        # Задачи равномерно распределены по проектам
+        n = issues_number
+        first_day, last_day = _to_day(start_date), _to_day(stop_date)
+        self.id = np.arange(1, n + 1)
+        self.project_id = np.resize(np.arange(1, len(self.projects) + 1), n)
+        rng.shuffle(self.project_id)
+        self.tracker_id = rng.integers(1, len(TRACKERS) + 1, n)
+        self.status_id = rng.choice([status_id for status_id, _ in STATUSES], n, p=[0.1, 0.1, 0.05, 0.05, 0.6, 0.1])
+        self.priority_id = rng.choice(PRIORITIES, n)
+        self.author_id = rng.integers(1, len(self.users) + 1, n)
+        self.assigned_to_id = rng.integers(1, len(self.users) + 1, n)
+        versions_by_project = np.array([versions[0]["id"] for _, versions in sorted(self.versions.items())])
+        self.fixed_version_id = np.where(rng.random(n) < 0.5, versions_by_project[self.project_id - 1], 0)
+        self.created_on = rng.integers(first_day, last_day + 1, n)
+        self.start_date = self.created_on
+        self.due_date = self.created_on + rng.integers(0, 60, n)
+        self.updated_on = self.created_on + rng.integers(0, 90, n)
+        self.done_ratio = rng.integers(0, 11, n) * 10
+        self.currency = rng.random(n) < 0.2
+        self.cf_28 = rng.integers(0, len(CATEGORIES), n)
+        self.cf_29 = rng.integers(0, 100, n) * 1000
+        self.cf_30 = rng.integers(0, 100, n) * 1000
+        self.cf_38 = rng.integers(0, 10, n)
+        self.cf_39 = rng.integers(0, 10, n) * 100
+        self.estimated_hours = rng.integers(0, 80, n) / 2
+        self.updated_order = np.argsort(self.updated_on, kind="stable")
+        # Трудозатраты списываются на задачи в течение двух месяцев после их создания, затраты задачи
+        # равны сумме ее трудозатрат
+        m = n if time_entries_number is None else time_entries_number
+        self.entry_issue = rng.integers(0, n, m) if n else np.zeros(0, dtype=np.int64)
+        self.entry_user_id = rng.integers(1, len(self.users) + 1, len(self.entry_issue))
+        self.entry_activity_id = rng.choice([activity_id for activity_id, _ in ACTIVITIES], len(self.entry_issue))
+        self.entry_spent_on = self.created_on[self.entry_issue] + rng.integers(0, 60, len(self.entry_issue))
+        self.entry_hours = rng.integers(1, 17, len(self.entry_issue)) / 2
+        self.spent_hours = np.bincount(self.entry_issue, weights=self.entry_hours, minlength=n)
+
+    def _convert_value(self, filter_name: str, value: str):
+        """
+        Method converts value of filter to value in arrays with issues.
+        :param filter_name: name of filter;
+        :param value: value of filter.
+        :return: converted value.
+        """
+
+        if filter_name in ("created_on", "updated_on", "due_date", "start_date", "closed_on"):
+            # Все задачи дня изменены в 10:00, время другое в фильтре сдвигает границу на полдня
+            time = value[11:19]
+            return _to_day(value) + (0.5 if time > "10:00:00" else -0.5 if time and time < "10:00:00" else 0)
+        if filter_name == "cf_28":
+            return CATEGORIES.index(value) if value in CATEGORIES else -1
+        return float(value)
+
+    def _get_column(self, filter_name: str) -> Optional[np.ndarray]:
+        """
+        Method returns array with values of issues for filter.
+        :param filter_name: name of filter.
+        :return: array or None if filter is not modelled.
+        """
+
+        if filter_name == "issue_id":
+            return self.id
+        if filter_name == "closed_on":
+            return np.where(np.isin(self.status_id, CLOSED_STATUSES), self.updated_on, 0)
+        if filter_name == "subject":
+            return self.currency
+        column = getattr(self, filter_name, None)
+        return column if isinstance(column, np.ndarray) else None
+
+    def _select_subject(self, operator: str, values: List[str]) -> np.ndarray:
+        """
+        Method returns mask of issues with subjects that satisfy text filter.
+        :param operator: operator of filter;
+        :param values: values of filter.
+        :return: mask of issues.
+        """
+
+        value = values[0].casefold() if values else ""
+        matches_currency = value in CURRENCY_SUBJECT.casefold()
+        matches_plain = value in SUBJECT.casefold()
+        mask = np.where(self.currency, matches_currency, matches_plain)
+        return ~mask if operator == "!~" else mask
+
+    def format_column(self, column: str, indexes: np.ndarray) -> List[str]:
+        """
+        Method returns values of column for issues as in CSV export of Redmine with
+        russian language: dates are in format "dd.mm.yyyy", decimal separator is
+        comma.
+        :param column: real name of column;
+        :param indexes: indexes of issues.
+        :return: values of column.
+        """
+
+        if column == "project":
+            names = np.array([project["name"] for project in self.projects], dtype=object)
+            return list(names[self.project_id[indexes] - 1])
+        if column in ("author", "assigned_to"):
+            names = np.array([user["name"] for user in self.users], dtype=object)
+            return list(names[getattr(self, f"{column}_id")[indexes] - 1])
+        if column in ("tracker", "status"):
+            names = dict(TRACKERS if column == "tracker" else STATUSES)
+            return [names[value] for value in getattr(self, f"{column}_id")[indexes].tolist()]
+        if column == "subject":
+            return [f"{CURRENCY_SUBJECT if currency else SUBJECT} {issue_id}"
+                    for currency, issue_id in zip(self.currency[indexes].tolist(), self.id[indexes].tolist())]
+        if column == "cf_28":
+            return [CATEGORIES[value] for value in self.cf_28[indexes].tolist()]
+        if column in ("created_on", "updated_on", "due_date", "start_date", "closed_on"):
+            days = self._get_column(column)[indexes].tolist()
+            suffix = " 10:00" if column in ("created_on", "updated_on", "closed_on") else ""
+            return [(EPOCH + timedelta(days=day)).strftime("%d.%m.%Y") + suffix if day else "" for day in days]
+        if column in ("estimated_hours", "spent_hours"):
+            return [f"{value:.2f}".replace(".", ",") for value in getattr(self, column)[indexes].tolist()]
+        values = self._get_column(column)
+        if values is None:
+            return [""] * len(indexes)
+        return [str(value) for value in values[indexes].tolist()]
+
+    def get_group_name(self, group_by: str, group: int) -> str:
+        """
+        Method returns name of group of issues.
+        :param group_by: name of column to group issues by;
+        :param group: value of column for group.
+        :return: name of group.
+        """
+
+        if group_by == "project":
+            name = self.projects[group - 1]["name"]
+        elif group_by == "tracker":
+            name = dict(TRACKERS)[group]
+        elif group_by == "status":
+            name = dict(STATUSES)[group]
+        elif group_by == "assigned_to":
+            name = self.users[group - 1]["name"]
+        elif group_by == "cf_28":
+            name = CATEGORIES[group]
+        else:
+            name = str(group)
+        return name or "(пусто)"
+
+    def get_groups(self, group_by: str) -> Optional[np.ndarray]:
+        """
+        Method returns array with groups of issues.
+        :param group_by: name of column to group issues by.
+        :return: array or None if grouping is not modelled.
+        """
+
+        if group_by in ("project", "tracker", "status", "priority", "assigned_to", "fixed_version"):
+            return getattr(self, f"{group_by}_id")
+        if group_by == "cf_28":
+            return self.cf_28
+        return None
+
+    def get_issue(self, index: int) -> dict:
+        """
+        Method returns issue in format of REST API.
+        :param index: index of issue.
+        :return: issue.
+        """
+
+        project = self.projects[self.project_id[index] - 1]
+        status_id = int(self.status_id[index])
+        issue = {"id": int(self.id[index]),
+                 "project": {"id": project["id"], "name": project["name"]},
+                 "tracker": {"id": int(self.tracker_id[index]), "name": dict(TRACKERS)[self.tracker_id[index]]},
+                 "status": {"id": status_id, "name": dict(STATUSES)[status_id]},
+                 "priority": {"id": int(self.priority_id[index])},
+                 "author": self.users[self.author_id[index] - 1],
+                 "assigned_to": self.users[self.assigned_to_id[index] - 1],
+                 "subject": f"{CURRENCY_SUBJECT if self.currency[index] else SUBJECT} {self.id[index]}",
+                 "start_date": _to_iso(self.start_date[index]),
+                 "due_date": _to_iso(self.due_date[index]),
+                 "done_ratio": int(self.done_ratio[index]),
+                 "is_private": False,
+                 "estimated_hours": float(self.estimated_hours[index]),
+                 "spent_hours": float(self.spent_hours[index]),
+                 "custom_fields": [{"id": 28, "name": CUSTOM_FIELDS[28], "value": CATEGORIES[self.cf_28[index]]}] +
+                                  [{"id": field_id, "name": CUSTOM_FIELDS[field_id],
+                                    "value": str(getattr(self, f"cf_{field_id}")[index])} for field_id in (29, 30, 38, 39)],
+                 "created_on": _to_iso(self.created_on[index], True),
+                 "updated_on": _to_iso(self.updated_on[index], True),
+                 "closed_on": _to_iso(self.updated_on[index], True) if status_id in CLOSED_STATUSES else None}
+        if self.fixed_version_id[index]:
+            issue["fixed_version"] = {"id": int(self.fixed_version_id[index])}
+        return issue
+
+    def get_time_entry(self, index: int) -> dict:
+        """
+        Method returns time entry in format of REST API.
+        :param index: index of time entry.
+        :return: time entry.
+        """
+
+        issue = self.entry_issue[index]
+        project = self.projects[self.project_id[issue] - 1]
+        user = self.users[self.entry_user_id[index] - 1]
+        activity_id = int(self.entry_activity_id[index])
+        return {"id": int(index) + 1,
+                "project": {"id": project["id"], "name": project["name"]},
+                "issue": {"id": int(self.id[issue])},
+                "user": {"id": user["id"], "name": user["name"]},
+                "activity": {"id": activity_id, "name": dict(ACTIVITIES)[activity_id]},
+                "hours": float(self.entry_hours[index]),
+                "comments": "",
+                "spent_on": _to_iso(self.entry_spent_on[index]),
+                "created_on": _to_iso(self.entry_spent_on[index], True),
+                "updated_on": _to_iso(self.entry_spent_on[index], True)}
+
+    def select(self, filters: List[Tuple[str, str, List[str]]]) -> np.ndarray:
+        """
+        Method returns mask of issues that satisfy filters of page with issues.
+        Filters that are not modelled by synthetic data are ignored.
+        :param filters: list with names, operators and values of filters.
+        :return: mask of issues.
+        """
+
+        mask = np.ones(len(self.id), dtype=bool)
+        for filter_name, operator, values in filters:
+            column = self._get_column(filter_name)
+            if column is None:
+                continue
+            if filter_name == "subject":
+                mask &= self._select_subject(operator, values)
+            elif operator == "o":
+                mask &= ~np.isin(column, CLOSED_STATUSES)
+            elif operator == "c":
+                mask &= np.isin(column, CLOSED_STATUSES)
+            elif operator == "*":
+                mask &= column != 0
+            elif operator == "!*":
+                mask &= column == 0
+            else:
+                try:
+                    values = [self._convert_value(filter_name, value) for value in values]
+                except ValueError:
+                    continue
+                if operator == "=":
+                    mask &= np.isin(column, values)
+                elif operator == "!":
+                    mask &= ~np.isin(column, values)
+                elif operator == ">=":
+                    mask &= column >= values[0]
+                elif operator == "<=":
+                    mask &= column <= values[0]
+                elif operator == "><":
+                    mask &= (column >= values[0]) & (column <= values[1])
+        return mask
+
+
+class FakeRedmineServer:
+    """
+    Class with HTTP server that imitates ximc Redmine. Latency and errors can be
+    injected, number of requests and sent bytes are counted.
+    """
+
+    def __init__(self, data: FakeData, host: str = "127.0.0.1", port: int = 0, latency: float = 0,
+                 error_rate: float = 0, admin: bool = True, per_page_options: Tuple[int, ...] = (25, 50, 100),
+                 export_limit: Optional[int] = None):
+        """
+        :param data: synthetic data;
+        :param host: host of server;
+        :param port: port of server. If 0 then free port is chosen;
+        :param latency: delay of every response in seconds;
+        :param error_rate: share of requests that fail with error 500;
+        :param admin: if False then users and groups are forbidden;
+        :param per_page_options: allowed numbers of issues on page;
+        :param export_limit: maximum number of issues in CSV export. If None then
+        number of issues is not limited.
+        """
+
+        self.admin: bool = admin
+        self.data: FakeData = data
+        self.error_rate: float = error_rate
+        self.export_limit: Optional[int] = export_limit
+        self.latency: float = latency
+        self.per_page_options: Tuple[int, ...] = per_page_options
+        self._lock: threading.Lock = threading.Lock()
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+
+    def count(self, kind: str, sent_bytes: int):
+        """
+        Method counts request.
+        :param kind: kind of request;
+        :param sent_bytes: number of bytes in response.
+        """
+
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += sent_bytes
+            self.stats[f"requests:{kind}"] = self.stats.get(f"requests:{kind}", 0) + 1
+
+    def reset_stats(self):
+        """
+        Method resets counters of requests.
+        """
+
+        with self._lock:
+            self.stats = {"requests": 0, "bytes": 0, "errors": 0}
+
+    def serve_forever(self):
+        """
+        Method serves requests until server is stopped.
+        """
+
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Method starts server in background thread.
+        """
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Method stops server.
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        """
+        :return: url address of server.
+        """
+
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Class handles requests to fake Redmine.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _find_project(self, project_id: str) -> Optional[dict]:
+        """
+        Method finds project by ID or identifier.
+        :param project_id: ID or identifier of project.
+        :return: project.
+        """
+
+        for project in self.fake.data.projects:
+            if str(project["id"]) == project_id or project["identifier"] == project_id:
+                return project
+        return None
+
+    def _get_issues_csv(self, query: str) -> str:
+        """
+        Method returns CSV export of issues with columns of query.
+        :param query: query string of request.
+        :return: CSV.
+        """
+
+        data = self.fake.data
+        params = parse_qs(query, keep_blank_values=True)
+        indexes = np.flatnonzero(self._select_issues(params))[::-1]
+        if self.fake.export_limit is not None:
+            indexes = indexes[:self.fake.export_limit]
+        columns = params.get("c[]", [])
+        output = io.StringIO()
+        writer = csv.writer(output, delimiter=";", lineterminator="\r\n")
+        writer.writerow(CUSTOM_FIELDS.get(int(column[3:]), column) if column.startswith("cf_") else column.capitalize()
+                        for column in columns)
+        writer.writerows(zip(*(data.format_column(column, indexes) for column in columns)))
+        return "\ufeff" + output.getvalue()
+
+    def _get_issues_html(self, query: str) -> str:
+        """
+        Method returns page with issues and query totals. If issues are grouped then
+        groups of issues on page are shown with their totals.
+        :param query: query string of request.
+        :return: HTML of page.
+        """
+
+        data = self.fake.data
+        params = parse_qs(query, keep_blank_values=True)
+        mask = self._select_issues(params)
+        indexes = np.flatnonzero(mask)[::-1]
+        group_by = params.get("group_by", [""])[0]
+        groups = data.get_groups(group_by)
+        if groups is not None:
+            indexes = indexes[np.argsort(groups[indexes], kind="stable")]
+        per_page = int(params.get("per_page", [0])[0] or 0)
+        if per_page not in self.fake.per_page_options:
+            per_page = self.fake.per_page_options[0]
+        page = int(params.get("page", [1])[0] or 1)
+        totals_options = [option for option in params.get("t[]", []) if option in TOTALS_COLUMNS]
+
+        def totals_html(group_mask: np.ndarray) -> str:
+            return "".join(f'<span class="total-for-{option.replace("_", "-")}"><span>{option}:</span> '
+                           f'<span class="value">{getattr(data, option)[group_mask].sum():.2f}</span></span> '
+                           for option in totals_options)
+
+        parts = ['<!DOCTYPE html><html><head><title>Задачи - Redmine</title></head><body><div id="wrapper">',
+                 '<div id="header"><h1>ximc</h1></div><div id="main"><div id="sidebar">',
+                 "".join(f'<a href="/projects/{project["identifier"]}">{project["name"]}</a>'
+                         for project in data.projects[:50]),
+                 '</div><div id="content"><h2>Задачи</h2>', _get_filters_script()]
+        if len(indexes) == 0:
+            parts.append('<p class="nodata">Нет данных для отображения</p>')
+        else:
+            parts.append(f'<p class="query-totals">{totals_html(mask)}</p><table class="list issues"><tbody>')
+            previous_group = None
+            for index in indexes[(page - 1) * per_page:page * per_page]:
+                if groups is not None and groups[index] != previous_group:
+                    previous_group = groups[index]
+                    group_mask = mask & (groups == previous_group)
+                    parts.append(f'<tr class="group open"><td colspan="2"><span class="expander">&nbsp;</span> '
+                                 f'<span class="name">{data.get_group_name(group_by, previous_group)}</span> '
+                                 f'<span class="badge badge-count count">{group_mask.sum()}</span> '
+                                 f'<span class="totals">{totals_html(group_mask)}</span></td></tr>')
+                parts.append(f'<tr id="issue-{data.id[index]}" class="issue"><td class="id">{data.id[index]}</td>'
+                             f'<td class="subject">{SUBJECT}</td></tr>')
+            parts.append(f'</tbody></table><ul class="pages"><li class="items">(1-{min(per_page, len(indexes))}/'
+                         f'{len(indexes)})</li>')
+            if page * per_page < len(indexes):
+                parts.append(f'<li class="next page"><a href="/issues?page={page + 1}">»</a></li>')
+            parts.append("</ul>")
+        parts.append('</div></div><div id="footer">Powered by Redmine</div></div></body></html>')
+        return "".join(parts)
+
+    def _get_issues_json(self, params: Dict[str, List[str]]) -> dict:
+        """
+        Method returns issues for REST API.
+        :param params: parameters of request.
+        :return: response.
+        """
+
+        data = self.fake.data
+        filters = []
+        # Фильтры в формате страницы с задачами REST API тоже принимает
+        for filter_name in params.get("f[]", []):
+            filters.append((filter_name, params.get(f"op[{filter_name}]", ["="])[0],
+                            params.get(f"v[{filter_name}][]", [])))
+        status = params.get("status_id", ["o" if "f[]" not in params else "*"])[0]
+        if status == "closed":
+            filters.append(("status_id", "c", []))
+        elif status in ("open", "o"):
+            filters.append(("status_id", "o", []))
+        elif status != "*":
+            filters.append(("status_id", "=", status.split("|")))
+        for filter_name in ("project_id", "tracker_id", "author_id", "assigned_to_id", "fixed_version_id"):
+            if filter_name in params:
+                filters.append((filter_name, "=", params[filter_name][0].split("|")))
+        for filter_name in ("created_on", "updated_on", "due_date", "start_date", "closed_on", "issue_id"):
+            if filter_name in params:
+                filters.append(self._parse_rest_range_filter(filter_name, params[filter_name][0]))
+        for field_id in CUSTOM_FIELDS:
+            if f"cf_{field_id}" in params:
+                filters.append((f"cf_{field_id}", "=", params[f"cf_{field_id}"][0].split("|")))
+        mask = data.select(filters)
+        sort = params.get("sort", ["id:desc"])[0]
+        if sort.startswith("updated_on"):
+            indexes = data.updated_order[mask[data.updated_order]]
+            if sort.endswith(":desc"):
+                indexes = indexes[::-1]
+        else:
+            indexes = np.flatnonzero(mask)
+            if not sort.startswith("id") or sort.endswith(":desc"):
+                indexes = indexes[::-1]
+        offset, limit = self._get_page(params)
+        return {"issues": [data.get_issue(index) for index in indexes[offset:offset + limit]],
+                "total_count": int(len(indexes)), "offset": offset, "limit": limit}
+
+    def _get_time_entries_json(self, params: Dict[str, List[str]]) -> dict:
+        """
+        Method returns time entries for REST API.
+        :param params: parameters of request.
+        :return: response.
+        """
+
+        data = self.fake.data
+        mask = np.ones(len(data.entry_issue), dtype=bool)
+        if "project_id" in params:
+            project = self._find_project(params["project_id"][0])
+            mask &= data.project_id[data.entry_issue] == (0 if project is None else project["id"])
+        if "issue_id" in params:
+            mask &= np.isin(data.id[data.entry_issue], [int(value) for value in params["issue_id"][0].split("|")])
+        for filter_name, column in (("user_id", data.entry_user_id), ("activity_id", data.entry_activity_id)):
+            if filter_name in params:
+                mask &= np.isin(column, [int(value) for value in params[filter_name][0].split("|")])
+        if "from" in params:
+            mask &= data.entry_spent_on >= _to_day(params["from"][0])
+        if "to" in params:
+            mask &= data.entry_spent_on <= _to_day(params["to"][0])
+        # Как в Redmine, сначала идут последние трудозатраты
+        indexes = np.flatnonzero(mask)[::-1]
+        offset, limit = self._get_page(params)
+        return {"time_entries": [data.get_time_entry(index) for index in indexes[offset:offset + limit]],
+                "total_count": int(len(indexes)), "offset": offset, "limit": limit}
+
+    def _get_json(self, path: str, params: Dict[str, List[str]]) -> Optional[dict]:
+        """
+        Method returns response of REST API.
+        :param path: path of request;
+        :param params: parameters of request.
+        :return: response or None if resource is not found.
+        """
+
+        data = self.fake.data
+        parts = path[:-len(".json")].strip("/").split("/")
+        offset, limit = self._get_page(params)
+
+        def page(name: str, items: list) -> dict:
+            return {name: items[offset:offset + limit], "total_count": len(items), "offset": offset,
+                    "limit": limit}
+
+        if parts == ["users", "current"]:
+            return {"user": {"id": 1, "login": data.users[0]["login"], "admin": self.fake.admin}}
+        if parts == ["projects"]:
+            return page("projects", data.projects)
+        if parts == ["issues"]:
+            return self._get_issues_json(params)
+        if parts == ["time_entries"]:
+            return self._get_time_entries_json(params)
+        if parts == ["issue_statuses"]:
+            return {"issue_statuses": [{"id": status_id, "name": name, "is_closed": status_id in CLOSED_STATUSES}
+                                       for status_id, name in STATUSES]}
+        if parts == ["roles"]:
+            return {"roles": [{"id": 3, "name": "Manager"}, {"id": 4, "name": "Developer"}]}
+        if parts == ["users"]:
+            return page("users", data.users)
+        if parts == ["groups"]:
+            return page("groups", data.groups)
+        if len(parts) >= 2 and parts[0] == "projects":
+            project = self._find_project(parts[1])
+            if project is None:
+                return None
+            if len(parts) == 2:
+                return {"project": project}
+            if parts[2] == "memberships":
+                memberships = [{"id": project["id"] * 1000 + user_id, "project": project,
+                                "user": {"id": user_id, "name": data.users[user_id - 1]["name"]},
+                                "roles": [{"id": 4, "name": "Developer"}]}
+                               for user_id in data.memberships[project["id"]]]
+                return page("memberships", memberships)
+            if parts[2] == "versions":
+                versions = [dict(version, project={"id": project["id"], "name": project["name"]})
+                            for version in data.versions[project["id"]]]
+                return {"versions": versions, "total_count": len(versions)}
+        return None
+
+    @staticmethod
+    def _get_page(params: Dict[str, List[str]]) -> Tuple[int, int]:
+        """
+        Method returns offset and limit of REST API request.
+        :param params: parameters of request.
+        :return: offset and limit.
+        """
+
+        offset = int(params.get("offset", [0])[0])
+        limit = min(int(params.get("limit", [25])[0]), MAX_LIMIT)
+        return offset, limit
+
+    @staticmethod
+    def _parse_rest_range_filter(filter_name: str, value: str) -> Tuple[str, str, List[str]]:
+        """
+        Method converts filter by date or number of REST API to filter of page with
+        issues.
+        :param filter_name: name of filter;
+        :param value: value of filter, for example "><2018-01-01|2018-03-31".
+        :return: name, operator and values of filter.
+        """
+
+        for operator in ("><", ">=", "<="):
+            if value.startswith(operator):
+                return filter_name, operator, value[len(operator):].split("|")
+        return filter_name, "=", [value]
+
+    def _select_issues(self, params: Dict[str, List[str]]) -> np.ndarray:
+        """
+        Method returns mask of issues that satisfy filters of query.
+        :param params: parameters of request.
+        :return: mask of issues.
+        """
+
+        filters = []
+        for filter_name in params.get("f[]", []):
+            operator = params.get(f"op[{filter_name}]", ["="])[0]
+            filters.append((filter_name, operator, params.get(f"v[{filter_name}][]", [])))
+        return self.fake.data.select(filters)
+
+    def _send(self, status: int, body: bytes, content_type: str, kind: str, headers: Optional[dict] = None):
+        """
+        Method sends response.
+        :param status: HTTP status;
+        :param body: body of response;
+        :param content_type: content type of response;
+        :param kind: kind of request for statistics;
+        :param headers: additional headers.
+        """
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.fake.count(kind, len(body))
+
+    def do_GET(self):
+        """
+        Method handles GET request.
+        """
+
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        url = urlsplit(self.path)
+        if url.path == "/_stats.json":
+            self._send(200, json.dumps(self.fake.stats).encode("utf-8"), "application/json", "stats")
+            return
+        if self.fake.error_rate and random.random() < self.fake.error_rate:
+            with self.fake._lock:
+                self.fake.stats["errors"] += 1
+            self._send(500, b"Internal error", "text/plain", "error")
+            return
+        if url.path == "/issues":
+            body = self._get_issues_html(url.query).encode("utf-8")
+            etag = f'W/"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", "text/html; charset=utf-8", "issues.html", {"ETag": etag})
+            else:
+                self._send(200, body, "text/html; charset=utf-8", "issues.html", {"ETag": etag})
+            return
+        if url.path == "/issues.csv":
+            self._send(200, self._get_issues_csv(url.query).encode("utf-8"), "text/csv; header=present",
+                       "issues.csv")
+            return
+        if url.path.endswith(".json"):
+            if url.path in ("/users.json", "/groups.json") and not self.fake.admin:
+                self._send(403, b"", "application/json", "forbidden")
+                return
+            response = self._get_json(url.path, parse_qs(url.query))
+            if response is not None:
+                self._send(200, json.dumps(response, ensure_ascii=False).encode("utf-8"),
+                           "application/json; charset=utf-8", url.path.strip("/").split("/")[-1])
+                return
+        self._send(404, b"", "text/plain", "not found")
+
+    @property
+    def fake(self) -> FakeRedmineServer:
+        """
+        :return: fake Redmine served by handler.
+        """
+
+        return self.server.fake
+
+    def log_message(self, format: str, *args):
+        """
+        Method disables logging of requests.
+        """
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in of ximc Redmine with synthetic data")
+    parser.add_argument("--port", type=int, default=8080, help="port of server")
+    parser.add_argument("--projects", type=int, default=100, help="number of projects")
+    parser.add_argument("--users", type=int, default=50, help="number of users")
+    parser.add_argument("--issues", type=int, default=10000, help="number of issues")
+    parser.add_argument("--latency", type=float, default=0, help="delay of every response in seconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests that fail")
+    args = parser.parse_args()
+    fake_data = FakeData(projects_number=args.projects, users_number=args.users, issues_number=args.issues)
+    server = FakeRedmineServer(fake_data, port=args.port, latency=args.latency, error_rate=args.error_rate)
+    print(f"Fake Redmine is running on {server.url}")
+    server.serve_forever()
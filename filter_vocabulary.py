@@ -0,0 +1,200 @@
+"""
+File with class to synchronize vocabulary of filters (filters, operators and
+values of list filters, IDs of custom fields) with Redmine. Redmine has no REST
+API for definitions of query filters, so they are read from JavaScript variables
+of page with issues, which web interface uses to build form of filters.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+import utils as ut
+
+# Версия формата снимка, снимок другого формата не читается
+FORMAT_VERSION = 1
+FILTERS_TTL = 24 * 60 * 60
+# Переменные страницы с задачами, в которых Redmine передает определения фильтров
+VARIABLES = {"operator_labels": "operatorLabels",
+             "operator_by_type": "operatorByType",
+             "available_filters": "availableFilters"}
+
+
+def _add_label(labels: tuple, label: str) -> tuple:
+    """
+    Function adds label to labels if there is no such label.
+    :param labels: labels;
+    :param label: new label.
+    :return: labels.
+    """
+
+    label = label.lower()
+    return labels if label in labels else labels + (label,)
+
+
+def parse_definitions(html: str) -> Optional[Dict[str, dict]]:
+    """
+    Function parses definitions of filters from page with issues.
+    :param html: HTML of page with issues.
+    :return: dictionary with labels of operators, operators of types of filters and
+    available filters or None if page has no definitions (for example, if user can
+    not see issues).
+    """
+
+    decoder = json.JSONDecoder()
+    definitions = {}
+    for key, variable in VARIABLES.items():
+        match = re.search(rf"var\s+{variable}\s*=\s*", html)
+        if match is None:
+            return None
+        try:
+            definitions[key], _ = decoder.raw_decode(html, match.end())
+        except ValueError:
+            return None
+    return definitions
+
+
+class FilterVocabulary:
+    """
+    Class with definitions of filters received from Redmine. Definitions are saved
+    to file with version stamp (hash of definitions), so next sessions do not
+    request them while snapshot is fresh. Definitions are merged into tables of
+    utils.py, then reverse indexes of labels are rebuilt.
+    """
+
+    def __init__(self, file_name: Optional[str] = None, ttl: float = FILTERS_TTL):
+        """
+        :param file_name: name of file with snapshot of definitions. If None then
+        snapshot is not used;
+        :param ttl: lifetime of snapshot in seconds.
+        """
+
+        self._created: float = 0
+        self._file_name: Optional[str] = file_name
+        self._ttl: float = ttl
+        self.definitions: Optional[Dict[str, dict]] = None
+        self.version: Optional[str] = None
+
+    def _read_snapshot(self, url: str) -> bool:
+        """
+        Method reads definitions from snapshot file.
+        :param url: url address of Redmine whose definitions are needed.
+        :return: True if fresh snapshot was read.
+        """
+
+        if self._file_name is None or not os.path.isfile(self._file_name):
+            return False
+        try:
+            with open(self._file_name, "r", encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if (snapshot.get("format") != FORMAT_VERSION or snapshot.get("url") != url or
+                time.time() - snapshot.get("created", 0) > self._ttl):
+            return False
+        self._created = snapshot["created"]
+        self.definitions = snapshot["definitions"]
+        self.version = snapshot["version"]
+        return True
+
+    def _save_snapshot(self, url: str):
+        """
+        Method saves definitions to snapshot file.
+        :param url: url address of Redmine.
+        """
+
+        if self._file_name is None:
+            return
+        snapshot = {"format": FORMAT_VERSION,
+                    "created": self._created,
+                    "url": url,
+                    "version": self.version,
+                    "definitions": self.definitions}
+        temp_name = f"{self._file_name}.{os.getpid()}.tmp"
+        with open(temp_name, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(temp_name, self._file_name)
+
+    def apply(self) -> List[str]:
+        """
+        Method merges definitions into tables of utils.py and rebuilds reverse
+        indexes. Labels of server are added to built-in labels, IDs of values and
+        types of filters are taken from server. Custom field whose ID has changed is
+        found by label and moved to new ID together with its totals and grouping
+        options, its built-in ID is mapped to new ID (see function
+        utils.get_field_id).
+        :return: descriptions of changed IDs.
+        """
+
+        changes = []
+        if self.definitions is None:
+            return changes
+        for operator, label in self.definitions["operator_labels"].items():
+            ut.OPERATOR_LABELS[operator] = _add_label(ut.OPERATOR_LABELS.get(operator, ()), label)
+        ut.OPERATOR_BY_TYPES.update(self.definitions["operator_by_type"])
+        for real_name, server_filter in self.definitions["available_filters"].items():
+            label = server_filter.get("name", real_name).lower()
+            if real_name not in ut.AVAILABLE_FILTERS and real_name.startswith("cf_"):
+                old_name = ut.FILTER_INDEX.get(label.casefold())
+                if (old_name is not None and old_name.startswith("cf_") and old_name in ut.AVAILABLE_FILTERS
+                        and old_name not in self.definitions["available_filters"]):
+                    ut.AVAILABLE_FILTERS[real_name] = ut.AVAILABLE_FILTERS.pop(old_name)
+                    built_in_id = next((field_id for field_id, current_id in ut.FIELD_IDS.items()
+                                        if current_id == old_name), old_name)
+                    ut.FIELD_IDS[built_in_id] = real_name
+                    for options in (ut.GROUP_BY_OPTIONS, ut.TOTALS_OPTIONS):
+                        for option, option_name in options.items():
+                            if option_name == old_name:
+                                options[option] = real_name
+                    changes.append(f"filter '{label}': {old_name} -> {real_name}")
+            available_filter = ut.AVAILABLE_FILTERS.setdefault(real_name, {"name": ()})
+            available_filter["name"] = _add_label(available_filter["name"], label)
+            available_filter["type"] = server_filter.get("type", available_filter.get("type"))
+            # Значения фильтров вроде проектов и пользователей сервер подгружает отдельно, они здесь не приходят
+            values = available_filter.get("values", [])
+            for server_value in server_filter.get("values") or []:
+                value_label, value_id = server_value[0].lower(), str(server_value[1])
+                for value in values:
+                    if value_label in value[0]:
+                        if value[1] != value_id:
+                            changes.append(f"value '{value_label}' of filter {real_name}: {value[1]} -> {value_id}")
+                            value[1] = value_id
+                        break
+                else:
+                    values.append([(value_label,), value_id])
+            if values:
+                available_filter["values"] = values
+        ut.build_indexes()
+        return changes
+
+    def is_fresh(self, url: str) -> bool:
+        """
+        Method checks whether there are fresh definitions for Redmine in memory or
+        in snapshot file.
+        :param url: url address of Redmine.
+        :return: True if definitions are fresh.
+        """
+
+        if self.definitions is not None and time.time() - self._created <= self._ttl:
+            return True
+        return self._read_snapshot(url)
+
+    def load(self, html: str, url: str) -> bool:
+        """
+        Method reads definitions from page with issues and saves them to snapshot.
+        :param html: HTML of page with issues;
+        :param url: url address of Redmine.
+        :return: True if page has definitions.
+        """
+
+        definitions = parse_definitions(html)
+        if definitions is None:
+            return False
+        self._created = time.time()
+        self.definitions = definitions
+        self.version = hashlib.sha256(json.dumps(definitions, ensure_ascii=False, sort_keys=True).encode("utf-8")
+                                      ).hexdigest()[:16]
+        self._save_snapshot(url)
+        return True
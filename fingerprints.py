@@ -0,0 +1,119 @@
+"""
+File with class to store fingerprints of sets of issues (time of the last update
+and number of issues) between runs. Run compares fingerprints of its scopes with
+stored ones and recomputes only scopes whose issues have changed.
+"""
+
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+import utils as ut
+from ximc import XimcRedmine
+
+FINGERPRINTS_FILE = "fingerprints.json"
+
+
+class FingerprintStore:
+    """
+    Class with fingerprints of sets of issues. Set of issues is identified by its
+    filters. New fingerprints are kept in memory until method save is called, so
+    run that failed before its results were saved detects the same changes next
+    time.
+    """
+
+    def __init__(self, file_name: str = FINGERPRINTS_FILE, url: str = ut.REDMINE_URL):
+        """
+        :param file_name: name of file with fingerprints;
+        :param url: url address of Redmine. Fingerprints of other Redmine are not
+        used.
+        """
+
+        self._file_name: str = file_name
+        self._new: Dict[str, list] = {}
+        self._url: str = url
+        self.fingerprints: Dict[str, list] = {}
+        self._read()
+
+    @staticmethod
+    def _get_key(filters: list) -> str:
+        """
+        Method returns key of set of issues.
+        :param filters: list with filters (see method XimcRedmine.get_filters).
+        :return: key.
+        """
+
+        return json.dumps(filters, ensure_ascii=False, sort_keys=True)
+
+    def _read(self):
+        """
+        Method reads fingerprints from file if it exists.
+        """
+
+        if not os.path.isfile(self._file_name):
+            return
+        try:
+            with open(self._file_name, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("url") == self._url:
+            self.fingerprints = data["fingerprints"]
+
+    def is_changed(self, ximc_user: XimcRedmine, filters: list) -> bool:
+        """
+        Method requests fingerprint of set of issues and compares it with stored
+        one.
+        :param ximc_user: authorized to Redmine user;
+        :param filters: list with filters.
+        :return: True if fingerprint differs from stored one or there is no stored
+        fingerprint.
+        """
+
+        key = self._get_key(filters)
+        self._new[key] = list(ximc_user.get_fingerprint(filters))
+        return self.fingerprints.get(key) != self._new[key]
+
+    def save(self):
+        """
+        Method saves fingerprints received by run. Method must be called after
+        results of changed scopes are saved.
+        """
+
+        self.fingerprints.update(self._new)
+        self._new = {}
+        temp_name = f"{self._file_name}.{os.getpid()}.tmp"
+        with open(temp_name, "w", encoding="utf-8") as file:
+            json.dump({"url": self._url, "fingerprints": self.fingerprints}, file, ensure_ascii=False)
+        os.replace(temp_name, self._file_name)
+
+
+def find_changed_periods(store: FingerprintStore, ximc_user: XimcRedmine,
+                         create_filters: Callable[[str, str], list], periods: Dict[str, Tuple[str, str]],
+                         names: Optional[List[str]] = None) -> List[str]:
+    """
+    Function finds periods whose issues have changed. Range of periods is checked
+    by one request, changed range is split in halves, so few changed periods among
+    many are found by number of requests proportional to logarithm of number of
+    periods.
+    :param store: stored fingerprints;
+    :param ximc_user: authorized to Redmine user;
+    :param create_filters: function that returns filters of scope for given start
+    and end dates;
+    :param periods: dictionary with names of periods and their start and end dates
+    in chronological order;
+    :param names: names of periods to check. If None then all periods are checked.
+    :return: names of changed periods.
+    """
+
+    names = list(periods) if names is None else names
+    if not names:
+        return []
+    start_date = min(periods[name][0] for name in names)
+    stop_date = max(periods[name][1] for name in names)
+    if not store.is_changed(ximc_user, create_filters(start_date, stop_date)):
+        return []
+    if len(names) == 1:
+        return names
+    middle = len(names) // 2
+    return (find_changed_periods(store, ximc_user, create_filters, periods, names[:middle]) +
+            find_changed_periods(store, ximc_user, create_filters, periods, names[middle:]))
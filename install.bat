@@ -1,3 +1,9 @@
+python -c "import sys; sys.exit(sys.version_info < (3, 9))"
+if errorlevel 1 (
+    echo Python 3.9 or newer is required
+    pause
+    exit /b 1
+)
 if exist venv rd /s/q venv
 python -m venv venv
 venv\Scripts\python -m pip install --upgrade pip
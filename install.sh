@@ -1,3 +1,4 @@
+python3 -c "import sys; sys.exit(sys.version_info < (3, 9))" || { echo "Python 3.9 or newer is required"; exit 1; }
 rm -rf venv
 python3 -m venv venv
 ./venv/bin/python3 -m pip install --upgrade pip
@@ -0,0 +1,199 @@
+"""
+File with class to measure operations of client of ximc Redmine.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+MAX_EVENTS_NUMBER = 100000
+METRICS_PREFIX = "ximc"
+
+
+class InstrumentationHook:
+    """
+    Base class for hooks that receive notifications about measured operations. To
+    attach own profiler redefine required methods and pass hook to method add_hook
+    of Instrumentation.
+    """
+
+    def on_count(self, name: str, value: float):
+        """
+        Method is called when counter is increased.
+        :param name: name of counter;
+        :param value: increment.
+        """
+
+    def on_finish(self, event: Dict[str, Any]):
+        """
+        Method is called when operation is finished.
+        :param event: dictionary with name, start time, duration in seconds, thread
+        and attributes of operation.
+        """
+
+    def on_start(self, name: str, attributes: Dict[str, Any]):
+        """
+        Method is called when operation is started.
+        :param name: name of operation;
+        :param attributes: attributes of operation.
+        """
+
+
+class Instrumentation:
+    """
+    Class collects durations of operations (spans) and counters. Collected data can
+    be saved as JSON summary, Prometheus text file and Chrome trace-event file.
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS_NUMBER):
+        """
+        :param max_events: maximum number of operations kept for trace, operations
+        over limit are only summarized.
+        """
+
+        self._counters: Dict[str, float] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._hooks: List[InstrumentationHook] = []
+        self._lock: threading.Lock = threading.Lock()
+        self._max_events: int = max_events
+        self._spans: Dict[str, Dict[str, float]] = {}
+        self._start: float = time.perf_counter()
+        self._started: float = time.time()
+
+    def add_hook(self, hook: InstrumentationHook):
+        """
+        Method adds hook that receives notifications about operations.
+        :param hook: hook.
+        """
+
+        self._hooks.append(hook)
+
+    def count(self, name: str, value: float = 1):
+        """
+        Method increases counter.
+        :param name: name of counter;
+        :param value: increment.
+        """
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        for hook in self._hooks:
+            hook.on_count(name, value)
+
+    def format_summary(self) -> str:
+        """
+        Method returns human-readable summary. Operations can be nested and executed
+        concurrently, so their total durations may exceed duration of run.
+        :return: summary.
+        """
+
+        summary = self.get_summary()
+        lines = [f"Duration of run: {summary['duration']:.3f} s",
+                 f"{'operation':<20}{'count':>10}{'total, s':>12}{'mean, s':>12}{'max, s':>12}"]
+        for name, span in sorted(summary["spans"].items(), key=lambda item: -item[1]["total"]):
+            lines.append(f"{name:<20}{span['count']:>10}{span['total']:>12.3f}{span['mean']:>12.4f}"
+                         f"{span['max']:>12.4f}")
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"{name:<20}{value:>10.0f}")
+        return "\n".join(lines)
+
+    def get_summary(self) -> Dict[str, Any]:
+        """
+        Method returns summary of run.
+        :return: dictionary with start time and duration of run, statistics of
+        operations and counters.
+        """
+
+        with self._lock:
+            spans = {name: dict(span, mean=span["total"] / span["count"]) for name, span in self._spans.items()}
+            counters = dict(self._counters)
+        return {"started": self._started,
+                "duration": time.perf_counter() - self._start,
+                "spans": spans,
+                "counters": counters}
+
+    def save_chrome_trace(self, file_name: str):
+        """
+        Method saves operations to file in Chrome trace-event format (can be opened in
+        chrome://tracing or Perfetto).
+        :param file_name: name of file.
+        """
+
+        pid = os.getpid()
+        with self._lock:
+            events = [{"name": event["name"],
+                       "cat": METRICS_PREFIX,
+                       "ph": "X",
+                       "ts": round((event["start"] - self._start) * 1e6),
+                       "dur": round(event["duration"] * 1e6),
+                       "pid": pid,
+                       "tid": event["thread"],
+                       "args": event["attributes"]} for event in self._events]
+        with open(file_name, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, ensure_ascii=False, default=str)
+
+    def save_json(self, file_name: str):
+        """
+        Method saves summary of run to JSON file.
+        :param file_name: name of file.
+        """
+
+        with open(file_name, "w", encoding="utf-8") as file:
+            json.dump(self.get_summary(), file, ensure_ascii=False, indent=2)
+
+    def save_prometheus(self, file_name: str):
+        """
+        Method saves summary of run to file in Prometheus text format (for example,
+        for textfile collector of node exporter).
+        :param file_name: name of file.
+        """
+
+        summary = self.get_summary()
+        lines = [f"# TYPE {METRICS_PREFIX}_run_duration_seconds gauge",
+                 f"{METRICS_PREFIX}_run_duration_seconds {summary['duration']}",
+                 f"# TYPE {METRICS_PREFIX}_operation_seconds summary"]
+        for name, span in sorted(summary["spans"].items()):
+            lines.append(f'{METRICS_PREFIX}_operation_seconds_sum{{operation="{name}"}} {span["total"]}')
+            lines.append(f'{METRICS_PREFIX}_operation_seconds_count{{operation="{name}"}} {span["count"]}')
+        for name, value in sorted(summary["counters"].items()):
+            metric_name = f"{METRICS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric_name} counter")
+            lines.append(f"{metric_name} {value}")
+        with open(file_name, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """
+        Method measures duration of operation executed inside context.
+        :param name: name of operation;
+        :param attributes: attributes of operation. Attributes can be added inside
+        context to yielded dictionary.
+        :return: dictionary with attributes of operation.
+        """
+
+        for hook in self._hooks:
+            hook.on_start(name, attributes)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            duration = time.perf_counter() - start
+            event = {"name": name,
+                     "start": start,
+                     "duration": duration,
+                     "thread": threading.get_ident(),
+                     "attributes": attributes}
+            with self._lock:
+                span = self._spans.setdefault(name, {"count": 0, "total": 0.0, "min": duration, "max": duration})
+                span["count"] += 1
+                span["total"] += duration
+                span["min"] = min(span["min"], duration)
+                span["max"] = max(span["max"], duration)
+                if len(self._events) < self._max_events:
+                    self._events.append(event)
+            for hook in self._hooks:
+                hook.on_finish(event)
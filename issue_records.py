@@ -0,0 +1,216 @@
+"""
+File with class to keep large number of issues in memory compactly. Only fields
+used by statistics are kept as fixed-size records of NumPy structured array, names
+of projects, users, trackers, statuses and values of list custom fields (payment
+category, company, currency) are kept once.
+"""
+
+import sys
+from typing import Dict, Iterable, List, Optional, Union
+import numpy as np
+import pandas as pd
+import utils as ut
+from ximc import XimcRedmine
+
+# Поля-списки: payment category, company, валюта. Значения хранятся кодами
+CATEGORY_FIELDS = ("cf_28", "cf_41", "cf_42")
+# Признак валютного платежа вычисляется по теме, сама тема не хранится
+CURRENCY_SUBJECT = "валют"
+NUMERIC_FIELDS = ("cf_29", "cf_30", "cf_38", "cf_39")
+ISSUE_DTYPE = np.dtype([("id", np.int32), ("project_id", np.int32), ("tracker_id", np.int16),
+                        ("status_id", np.int16), ("author_id", np.int32), ("assigned_to_id", np.int32),
+                        ("start_date", "datetime64[D]"), ("due_date", "datetime64[D]"),
+                        ("created_on", "datetime64[s]"), ("updated_on", "datetime64[s]"),
+                        ("closed_on", "datetime64[s]"), ("estimated_hours", np.float32),
+                        ("spent_hours", np.float32), ("currency_subject", np.bool_)] +
+                       [(field_id, np.int16) for field_id in CATEGORY_FIELDS] +
+                       [(field_id, np.float64) for field_id in NUMERIC_FIELDS])
+GROUP_COLUMNS = {"project": "project_id",
+                 "tracker": "tracker_id",
+                 "status": "status_id",
+                 "author": "author_id",
+                 "assigned_to": "assigned_to_id",
+                 "category": "cf_28",
+                 "company": "cf_41",
+                 "currency": "cf_42"}
+REFERENCE_COLUMNS = {"project_id": "project",
+                     "tracker_id": "tracker",
+                     "status_id": "status",
+                     "author_id": "user",
+                     "assigned_to_id": "user"}
+
+
+def _to_number(value: Optional[str]) -> float:
+    """
+    Function converts value of numeric custom field to number.
+    :param value: value of custom field.
+    :return: number or NaN if value is empty or is not number.
+    """
+
+    if not value:
+        return np.nan
+    try:
+        return float(str(value).replace(",", ".").replace(" ", ""))
+    except ValueError:
+        return np.nan
+
+
+class IssueRecords:
+    """
+    Class with issues as records of NumPy structured array (about hundred bytes per
+    issue instead of several kilobytes of dictionaries of REST API). Issues are
+    converted page by page as they are downloaded, so full responses are never kept.
+    """
+
+    def __init__(self):
+        self.categories: Dict[str, List[str]] = {field_id: [""] for field_id in CATEGORY_FIELDS}
+        self.names: Dict[str, Dict[int, str]] = {"project": {}, "user": {}, "tracker": {}, "status": {}}
+        self.records: np.ndarray = np.zeros(0, dtype=ISSUE_DTYPE)
+
+    def __len__(self) -> int:
+        """
+        :return: number of issues.
+        """
+
+        return len(self.records)
+
+    def _convert_page(self, issues: List[dict], category_codes: Dict[str, Dict[str, int]]) -> np.ndarray:
+        """
+        Method converts page of issues of REST API to records. Names of referenced
+        entities are interned and saved to dictionaries of names.
+        :param issues: issues as dictionaries;
+        :param category_codes: dictionary with codes of known values of list custom
+        fields, new values are added.
+        :return: records.
+        """
+
+        page = np.zeros(len(issues), dtype=ISSUE_DTYPE)
+        # Столбцы настраиваемых полей называются встроенными идентификаторами, значения берутся из полей сервера
+        field_ids = {ut.get_field_id(field_id): field_id for field_id in CATEGORY_FIELDS + NUMERIC_FIELDS}
+        rows = []
+        for issue in issues:
+            row = [issue["id"]]
+            for column, group in REFERENCE_COLUMNS.items():
+                reference = issue.get(column[:-3]) or {}
+                row.append(reference.get("id", 0))
+                if "name" in reference and reference["id"] not in self.names[group]:
+                    self.names[group][reference["id"]] = sys.intern(reference["name"])
+            row.extend((issue.get("start_date"), issue.get("due_date")))
+            # Часовой пояс отбрасывается: Redmine отдает время в UTC
+            row.extend(value and value[:19] for value in (issue.get("created_on"), issue.get("updated_on"),
+                                                           issue.get("closed_on")))
+            row.extend((issue.get("estimated_hours"), issue.get("spent_hours") or 0))
+            custom_values = {field_ids.get(f"cf_{custom_field.get('id')}"): custom_field.get("value")
+                             for custom_field in issue.get("custom_fields", [])}
+            row.append(CURRENCY_SUBJECT in (issue.get("subject") or "").casefold())
+            for field_id in CATEGORY_FIELDS:
+                value = custom_values.get(field_id) or ""
+                if value not in category_codes[field_id]:
+                    category_codes[field_id][value] = len(self.categories[field_id])
+                    self.categories[field_id].append(sys.intern(value))
+                row.append(category_codes[field_id][value])
+            row.extend(_to_number(custom_values.get(field_id)) for field_id in NUMERIC_FIELDS)
+            rows.append(tuple(row))
+        # Столбцы переводятся в массив целиком, None становится NaT или NaN
+        for index, name in enumerate(ISSUE_DTYPE.names):
+            page[name] = np.array([row[index] for row in rows], dtype=ISSUE_DTYPE[name])
+        return page
+
+    def _find_ids(self, group: str, values: Iterable[Union[int, str]]) -> np.ndarray:
+        """
+        Method converts names of projects, users, trackers, statuses or values of list
+        custom fields to IDs (codes for custom fields). IDs are kept as they are.
+        :param group: name of group (see GROUP_COLUMNS);
+        :param values: names or IDs.
+        :return: IDs. Unknown names are skipped.
+        """
+
+        column = GROUP_COLUMNS[group]
+        if column in CATEGORY_FIELDS:
+            ids_by_name = {name: code for code, name in enumerate(self.categories[column])}
+        else:
+            ids_by_name = {name: entity_id for entity_id, name in
+                           self.names[REFERENCE_COLUMNS[column]].items()}
+        ids = []
+        for value in values:
+            if isinstance(value, str) and value in ids_by_name:
+                ids.append(ids_by_name[value])
+            elif not isinstance(value, str):
+                ids.append(value)
+        return np.array(ids, dtype=np.int64)
+
+    def _get_label(self, group: str, entity_id: int) -> Union[int, str]:
+        """
+        Method returns label of group for tables.
+        :param group: name of group (see GROUP_COLUMNS);
+        :param entity_id: ID or code of value of custom field.
+        :return: name or ID if name is unknown.
+        """
+
+        column = GROUP_COLUMNS[group]
+        if column in CATEGORY_FIELDS:
+            return self.categories[column][entity_id]
+        return self.names[REFERENCE_COLUMNS[column]].get(entity_id, entity_id)
+
+    def get_totals(self, *columns, by: str = "project", date_column: str = "due_date", start_date: Optional[str] = None,
+                   stop_date: Optional[str] = None, **filters: Iterable[Union[int, str]]) -> pd.DataFrame:
+        """
+        Method returns sums of numeric columns for every value of given group.
+        :param columns: names of numeric columns, for example "spent_hours", "cf_29";
+        :param by: name of group: "project", "tracker", "status", "author",
+        "assigned_to", "category", "company" or "currency";
+        :param date_column: name of date column to select issues by dates;
+        :param start_date: first date of issues, if None then issues are not limited;
+        :param stop_date: last date of issues, if None then issues are not limited;
+        :param filters: names or IDs of projects, trackers, statuses, users or values
+        of list custom fields to take into account, for example tracker=["Payment"],
+        status=["Closed"].
+        :return: table with groups in rows and columns in columns. Empty values are
+        not summed.
+        """
+
+        for group in [by] + list(filters):
+            if group not in GROUP_COLUMNS:
+                raise ValueError(f"Unknown group '{group}', available: {', '.join(GROUP_COLUMNS)}")
+        mask = np.ones(len(self), dtype=bool)
+        for group, values in filters.items():
+            mask &= np.isin(self.records[GROUP_COLUMNS[group]], self._find_ids(group, values))
+        dates = self.records[date_column].astype("datetime64[D]")
+        if start_date is not None:
+            mask &= dates >= np.datetime64(start_date)
+        if stop_date is not None:
+            mask &= dates <= np.datetime64(stop_date)
+        selected = self.records[mask]
+        groups, codes = np.unique(selected[GROUP_COLUMNS[by]], return_inverse=True)
+        table = np.zeros((len(groups), len(columns)))
+        for index, column in enumerate(columns):
+            table[:, index] = np.bincount(codes.reshape(-1), weights=np.nan_to_num(selected[column]),
+                                          minlength=len(groups))
+        return pd.DataFrame(table, index=[self._get_label(by, int(group)) for group in groups], columns=list(columns))
+
+    def load(self, ximc_user: XimcRedmine, **filters):
+        """
+        Method downloads issues and converts them to records page by page,
+        previously loaded issues are replaced.
+        :param ximc_user: authorized to Redmine user;
+        :param filters: filters for issues in format of REST API (for example
+        project_id, status_id="*").
+        """
+
+        self.categories = {field_id: [""] for field_id in CATEGORY_FIELDS}
+        self.names = {"project": {}, "user": {}, "tracker": {}, "status": {}}
+        category_codes = {field_id: {"": 0} for field_id in CATEGORY_FIELDS}
+        records = np.zeros(0, dtype=ISSUE_DTYPE)
+        size = 0
+        with ximc_user.instrumentation.span("load_issue_records"):
+            for issues in ximc_user.get_issue_pages(**filters):
+                page = self._convert_page(issues, category_codes)
+                if size + len(page) > len(records):
+                    # Массив растет удвоением, чтобы не копировать его на каждой странице
+                    grown = np.zeros(max(2 * len(records), size + len(page)), dtype=ISSUE_DTYPE)
+                    grown[:size] = records[:size]
+                    records = grown
+                records[size:size + len(page)] = page
+                size += len(page)
+        self.records = records[:size].copy()
+        ximc_user.instrumentation.count("issue_records", size)
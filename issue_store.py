@@ -0,0 +1,304 @@
+"""
+File with class to mirror issues of ximc Redmine into local SQLite database.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+import utils as ut
+from ximc import PAYMENT_FIELDS, XimcRedmine
+
+BATCH_SIZE = 1000
+ISSUE_COLUMNS = ("id", "project_id", "project", "tracker_id", "status_id", "priority_id", "author_id",
+                 "assigned_to_id", "fixed_version_id", "subject", "start_date", "due_date", "created_on", "updated_on",
+                 "closed_on", "done_ratio", "estimated_hours", "spent_hours", "is_private")
+DATE_COLUMNS = ("start_date", "due_date", "created_on", "updated_on", "closed_on")
+REFERENCE_COLUMNS = {"project_id": "project",
+                     "tracker_id": "tracker",
+                     "status_id": "status",
+                     "priority_id": "priority",
+                     "author_id": "author",
+                     "assigned_to_id": "assigned_to",
+                     "fixed_version_id": "fixed_version"}
+FILTER_COLUMNS = {"issue_id": "id"}
+TEXT_COLUMNS = ("project", "subject") + DATE_COLUMNS
+
+
+def _casefold(value: Optional[str]) -> Optional[str]:
+    """
+    Function converts string to lower case for case insensitive search.
+    :param value: string.
+    :return: string in lower case.
+    """
+
+    return None if value is None else value.casefold()
+
+
+class IssueStore:
+    """
+    Class with local mirror of issues and their custom fields. After first load
+    only issues updated since last synchronization are downloaded.
+    """
+
+    def __init__(self, file_name: str = "issues.sqlite"):
+        """
+        :param file_name: name of SQLite database file.
+        """
+
+        self._connection: sqlite3.Connection = sqlite3.connect(file_name)
+        self._connection.create_function("casefold", 1, _casefold, deterministic=True)
+        self._connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS issues ({", ".join(f"{column} {self._get_column_type(column)}"
+                                                          for column in ISSUE_COLUMNS)}, PRIMARY KEY (id));
+            CREATE TABLE IF NOT EXISTS custom_values (issue_id INTEGER, field_id INTEGER, value TEXT);
+            CREATE INDEX IF NOT EXISTS custom_values_issue ON custom_values (issue_id, field_id);
+            CREATE TABLE IF NOT EXISTS statuses (id INTEGER PRIMARY KEY, name TEXT, is_closed INTEGER);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);""")
+        self._connection.commit()
+
+    def _create_condition(self, filter_obj: dict) -> Tuple[str, list]:
+        """
+        Method creates SQL condition for filter.
+        :param filter_obj: filter (see method XimcRedmine.get_filters).
+        :return: SQL condition and its parameters.
+        """
+
+        filter_name = filter_obj.get("filter")
+        operator = filter_obj.get("operator")
+        values = [str(value) for value in filter_obj.get("values", [])]
+        if filter_name.startswith("cf_"):
+            return self._create_custom_field_condition(int(filter_name[3:]), operator, values)
+        column = FILTER_COLUMNS.get(filter_name, filter_name)
+        if column not in ISSUE_COLUMNS:
+            raise ValueError(f"Filter '{filter_name}' is not supported by local store")
+        if column in DATE_COLUMNS:
+            column = f"date({column})"
+        marks = ", ".join("?" * len(values))
+        if operator == "=":
+            return f"{column} IN ({marks})", values
+        if operator == "!":
+            return f"({column} IS NULL OR {column} NOT IN ({marks}))", values
+        if operator == "!*":
+            return f"{column} IS NULL", []
+        if operator == "*":
+            return f"{column} IS NOT NULL", []
+        if operator in ("o", "c"):
+            return f"status_id IN (SELECT id FROM statuses WHERE is_closed = ?)", [int(operator == "c")]
+        if operator in (">=", "<="):
+            return f"{column} {operator} ?", values[:1]
+        if operator == "><":
+            return f"{column} BETWEEN ? AND ?", values[:2]
+        if operator in ("~", "!~", "^", "$"):
+            pattern = {"~": "%{}%", "!~": "%{}%", "^": "{}%", "$": "%{}"}[operator]
+            condition = f"casefold({column}) LIKE casefold(?)"
+            if operator == "!~":
+                condition = f"NOT {condition}"
+            return condition, [pattern.format(value) for value in values[:1]]
+        raise ValueError(f"Operator '{operator}' for filter '{filter_name}' is not supported by local store")
+
+    @staticmethod
+    def _create_custom_field_condition(field_id: int, operator: str, values: List[str]) -> Tuple[str, list]:
+        """
+        Method creates SQL condition for filter by custom field.
+        :param field_id: ID of custom field;
+        :param operator: operator of filter;
+        :param values: values of filter.
+        :return: SQL condition and its parameters.
+        """
+
+        exists = "EXISTS (SELECT 1 FROM custom_values WHERE issue_id = issues.id AND field_id = ? AND {})"
+        marks = ", ".join("?" * len(values))
+        if operator == "=":
+            return exists.format(f"value IN ({marks})"), [field_id, *values]
+        if operator == "!":
+            return "NOT " + exists.format(f"value IN ({marks})"), [field_id, *values]
+        if operator == "!*":
+            return "NOT " + exists.format("value <> ''"), [field_id]
+        if operator == "*":
+            return exists.format("value <> ''"), [field_id]
+        if operator in (">=", "<="):
+            return exists.format(f"CAST(value AS REAL) {operator} ?"), [field_id, float(values[0])]
+        if operator == "><":
+            return exists.format("CAST(value AS REAL) BETWEEN ? AND ?"), [field_id, float(values[0]),
+                                                                          float(values[1])]
+        raise ValueError(f"Operator '{operator}' for filter 'cf_{field_id}' is not supported by local store")
+
+    @staticmethod
+    def _get_column_type(column: str) -> str:
+        """
+        Method returns SQLite type of column in table with issues.
+        :param column: name of column.
+        :return: type of column.
+        """
+
+        if column in TEXT_COLUMNS:
+            return "TEXT"
+        if column.endswith("_hours"):
+            return "REAL"
+        return "INTEGER"
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        """
+        Method returns value saved in table with metadata.
+        :param key: key of value.
+        :return: value.
+        """
+
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _save_batch(self, issues: Iterable[dict], watermark: Optional[str], issue_id: int = 0):
+        """
+        Method saves batch of issues and new watermark in one transaction.
+        :param issues: issues from REST API;
+        :param watermark: time of last update of saved issues;
+        :param issue_id: ID of the last saved issue with this time of update.
+        """
+
+        self._save_issues(list(issues))
+        if watermark is not None:
+            self._set_meta("watermark", watermark)
+            self._set_meta("watermark_id", str(issue_id))
+        self._connection.commit()
+
+    def _save_issues(self, issues: List[dict]):
+        """
+        Method saves issues and their custom fields to database.
+        :param issues: issues from REST API.
+        """
+
+        rows = []
+        custom_values = []
+        for issue in issues:
+            row = {column: issue.get(column) for column in ISSUE_COLUMNS}
+            for column, reference in REFERENCE_COLUMNS.items():
+                row[column] = issue.get(reference, {}).get("id")
+            row["project"] = issue.get("project", {}).get("name")
+            rows.append(tuple(row.values()))
+            for custom_field in issue.get("custom_fields", []):
+                field_values = custom_field.get("value")
+                if not isinstance(field_values, list):
+                    field_values = [field_values]
+                custom_values.extend((issue["id"], custom_field["id"], value) for value in field_values
+                                     if value is not None)
+        self._connection.executemany("DELETE FROM custom_values WHERE issue_id = ?", [(row[0],) for row in rows])
+        self._connection.executemany(f"INSERT OR REPLACE INTO issues VALUES ({', '.join('?' * len(ISSUE_COLUMNS))})",
+                                     rows)
+        self._connection.executemany("INSERT INTO custom_values VALUES (?, ?, ?)", custom_values)
+
+    def _set_meta(self, key: str, value: str):
+        """
+        Method saves value to table with metadata.
+        :param key: key of value;
+        :param value: value.
+        """
+
+        self._connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def close(self):
+        """
+        Method closes database.
+        """
+
+        self._connection.close()
+
+    def get_payments(self, start_date: str, stop_date: str) -> List[Dict[str, Optional[str]]]:
+        """
+        Method returns closed issues of tracker Payment with due date in given period
+        (see method XimcRedmine.get_payments).
+        :param start_date: period start date;
+        :param stop_date: period end date.
+        :return: list with due date, project, subject and payment custom fields of
+        issues. Custom fields are named by built-in IDs.
+        """
+
+        _, status_id = ut.find_real_filter_name_and_value("статус", "closed")
+        _, tracker_id = ut.find_real_filter_name_and_value("трекер", "payment")
+        custom_fields = ", ".join(f"(SELECT value FROM custom_values WHERE issue_id = issues.id AND field_id = "
+                                  f"{int(ut.get_field_id(field_id)[3:])})" for field_id in PAYMENT_FIELDS)
+        rows = self._connection.execute(f"SELECT due_date, project, subject, {custom_fields} FROM issues "
+                                        f"WHERE status_id = ? AND tracker_id = ? AND due_date BETWEEN ? AND ?",
+                                        (status_id, tracker_id, start_date, stop_date))
+        return [dict(zip(("due_date", "project", "subject", *PAYMENT_FIELDS), row)) for row in rows]
+
+    def get_totals(self, filters: list, *totals_options) -> Dict[str, Optional[float]]:
+        """
+        Method returns values for given totals options for issues that satisfy
+        filters (see method XimcRedmine.get_totals).
+        :param filters: list with filters (see method XimcRedmine.get_filters);
+        :param totals_options: list with required totals options.
+        :return: dictionary with values of required options.
+        """
+
+        conditions = []
+        parameters = []
+        for filter_obj in filters:
+            condition, condition_parameters = self._create_condition(filter_obj)
+            conditions.append(condition)
+            parameters.extend(condition_parameters)
+        where = " AND ".join(conditions) or "1"
+        options = [option for option in totals_options if option.lower() in ut.TOTALS_OPTIONS]
+        columns = ["COUNT(*)"]
+        for option in options:
+            real_option_name = ut.TOTALS_OPTIONS[option.lower()]
+            if real_option_name.startswith("cf_"):
+                columns.append(f"SUM((SELECT SUM(CAST(value AS REAL)) FROM custom_values WHERE issue_id = issues.id "
+                               f"AND field_id = {int(real_option_name[3:])}))")
+            else:
+                columns.append(f"SUM({real_option_name})")
+        row = self._connection.execute(f"SELECT {', '.join(columns)} FROM issues WHERE {where}", parameters).fetchone()
+        if not row[0]:
+            return {option: None for option in options}
+        return {option: float(value or 0) for option, value in zip(options, row[1:])}
+
+    def get_watermark(self) -> Optional[str]:
+        """
+        Method returns time of last update of issues that were synchronized.
+        :return: time of last update.
+        """
+
+        return self._get_meta("watermark")
+
+    def reconcile(self, ximc_user: XimcRedmine) -> int:
+        """
+        Method removes issues that were deleted in Redmine.
+        :param ximc_user: authorized to Redmine user.
+        :return: number of removed issues.
+        """
+
+        remote_ids = ximc_user.get_issue_ids()
+        local_ids = {row[0] for row in self._connection.execute("SELECT id FROM issues")}
+        deleted_ids = [(issue_id,) for issue_id in local_ids - remote_ids]
+        self._connection.executemany("DELETE FROM issues WHERE id = ?", deleted_ids)
+        self._connection.executemany("DELETE FROM custom_values WHERE issue_id = ?", deleted_ids)
+        self._connection.commit()
+        return len(deleted_ids)
+
+    def sync(self, ximc_user: XimcRedmine, reconcile: bool = False) -> int:
+        """
+        Method downloads issues updated since last synchronization. Watermark is time
+        of update and ID of the last downloaded issue, issues are downloaded in order
+        of them by keyset pagination (see method XimcRedmine.get_updated_issues), so
+        issues changed during synchronization are not lost.
+        :param ximc_user: authorized to Redmine user;
+        :param reconcile: if True then issues deleted in Redmine are removed.
+        :return: number of downloaded issues.
+        """
+
+        self._connection.execute("DELETE FROM statuses")
+        self._connection.executemany("INSERT INTO statuses VALUES (?, ?, ?)", ximc_user.get_issue_statuses())
+        watermark = self.get_watermark()
+        issue_id = int(self._get_meta("watermark_id") or 0)
+        issues_number = 0
+        batch = []
+        for issues in ximc_user.get_updated_issues(watermark, issue_id, status_id="*"):
+            batch.extend(issues)
+            watermark, issue_id = issues[-1]["updated_on"], issues[-1]["id"]
+            if len(batch) >= BATCH_SIZE:
+                self._save_batch(batch, watermark, issue_id)
+                issues_number += len(batch)
+                batch = []
+        self._save_batch(batch, watermark, issue_id)
+        issues_number += len(batch)
+        if reconcile:
+            self.reconcile(ximc_user)
+        return issues_number
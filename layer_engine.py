@@ -0,0 +1,61 @@
+"""
+File with engine of python-redmine that sends requests through request layer (see
+request_layer.py). Engine is in separate file, so request layer can be imported
+without python-redmine.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from redminelib.engines.sync import SyncEngine
+from request_layer import RequestLayer
+
+
+class LayerEngine(SyncEngine):
+    """
+    Engine of python-redmine that sends requests through request layer.
+    """
+
+    def __init__(self, **options):
+        """
+        :param options: options of engine, option request_layer sets request layer.
+        """
+
+        self._layer: RequestLayer = options.pop("request_layer")
+        super().__init__(**options)
+
+    def process_bulk_request(self, method: str, url: str, container: str, bulk_params: List[dict]) -> list:
+        """
+        Method requests remaining pages of resource set. Total number of resources is
+        known from the first page, so all remaining pages are requested concurrently
+        with maximum page size, number of concurrent requests is limited by request
+        layer.
+        :param method: HTTP method;
+        :param url: url address;
+        :param container: key of resources in response;
+        :param bulk_params: parameters of query string for every page.
+        :return: resources of all pages in order of pages.
+        """
+
+        executor = ThreadPoolExecutor(max_workers=min(self._layer.max_connections, len(bulk_params)))
+        try:
+            pages = list(executor.map(lambda params: self.request(method, url, params=params)[container],
+                                      bulk_params))
+        finally:
+            executor.shutdown(cancel_futures=True)
+        return [resource for page in pages for resource in page]
+
+    def request(self, method, url, headers=None, params=None, data=None):
+        """
+        Method makes request to Redmine and returns processed response.
+        :param method: HTTP method;
+        :param url: url address;
+        :param headers: HTTP headers;
+        :param params: parameters of query string;
+        :param data: data of request.
+        :return: processed response.
+        """
+
+        kwargs = self.construct_request_kwargs(method, headers, params, data)
+        with self._layer.request(self.session, method, url, **kwargs) as response:
+            self._layer.instrumentation.count("bytes_received", len(response.content))
+            return self.process_response(response)
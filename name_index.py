@@ -0,0 +1,293 @@
+"""
+File with class to resolve names of projects, users and versions to their IDs.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from redminelib import Redmine
+
+INDEX_TTL = 24 * 60 * 60
+# Число одновременных запросов участников и версий проектов
+WORKERS_NUMBER = 8
+
+
+class NameIndex:
+    """
+    Class with in-memory indexes of names of projects, users and versions. Indexes
+    are filled once per session, missing parts are loaded lazily: memberships and
+    versions of projects are requested concurrently, list of projects is reloaded
+    once if name of project is not found. Indexes can be saved to file to start
+    next session warm, snapshot is used only by the same user of the same Redmine.
+    """
+
+    def __init__(self, get_redmine: Callable[[], "Redmine"], file_name: Optional[str] = None, ttl: float = INDEX_TTL,
+                 url: str = "", login: str = ""):
+        """
+        :param get_redmine: function that returns Redmine object. Object is requested
+        only when index needs data that are not in snapshot;
+        :param file_name: name of file with snapshot of indexes. If None then snapshot
+        is not used;
+        :param ttl: lifetime of snapshot in seconds;
+        :param url: url address of Redmine;
+        :param login: login of user. Users see different projects, so snapshot of
+        other user or other Redmine is not used.
+        """
+
+        self._created: float = time.time()
+        self._file_name: Optional[str] = file_name
+        self._get_redmine: Callable[[], "Redmine"] = get_redmine
+        self._login: str = login
+        self._projects: Dict[str, int] = {}
+        self._projects_loaded: bool = False
+        self._projects_with_memberships: Set[int] = set()
+        self._ttl: float = ttl
+        self._url: str = url
+        self._users: Dict[str, int] = {}
+        self._versions: Dict[int, Dict[str, int]] = {}
+        self.user: Optional[dict] = None
+
+    def _get_projects_to_search(self, project_ids: Iterable[int], all_projects: bool = True) -> List[int]:
+        """
+        Method returns IDs of projects in order in which they should be searched.
+        :param project_ids: IDs of projects to search first;
+        :param all_projects: if True then other projects of index are added after
+        given projects.
+        :return: IDs of projects.
+        """
+
+        ordered_ids = [project_id for project_id in project_ids if project_id is not None]
+        if all_projects:
+            ordered_ids.extend(project_id for project_id in self._projects.values() if project_id not in ordered_ids)
+        return ordered_ids
+
+    def _load_memberships(self, project_ids: Iterable[int]) -> bool:
+        """
+        Method loads users who work in given projects. Memberships of projects are
+        requested concurrently.
+        :param project_ids: IDs of projects.
+        :return: True if memberships were requested.
+        """
+
+        project_ids = [project_id for project_id in project_ids if project_id not in self._projects_with_memberships]
+        # Пользователи добавляются в порядке проектов, как при последовательной загрузке
+        for project_id, memberships in zip(project_ids, self._request(self._request_memberships, project_ids)):
+            for membership in memberships:
+                user = membership.get("user")
+                if user is not None:
+                    self._users.setdefault(user["name"], user["id"])
+            self._projects_with_memberships.add(project_id)
+        return bool(project_ids)
+
+    def _load_projects(self):
+        """
+        Method loads names and IDs of projects from Redmine.
+        """
+
+        self._projects = {project["name"]: project["id"]
+                          for project in self._get_redmine().project.all().values("id", "name")}
+        self._projects_loaded = True
+
+    def _load_versions(self, project_ids: Iterable[int]) -> bool:
+        """
+        Method loads versions of given projects. Versions of projects are requested
+        concurrently.
+        :param project_ids: IDs of projects.
+        :return: True if versions were requested.
+        """
+
+        project_ids = [project_id for project_id in project_ids if project_id not in self._versions]
+        for project_id, versions in zip(project_ids, self._request(self._request_versions, project_ids)):
+            self._versions[project_id] = {}
+            for version in versions:
+                self._versions[project_id].setdefault(version["name"], version["id"])
+        return bool(project_ids)
+
+    def _read_snapshot(self) -> bool:
+        """
+        Method reads indexes from snapshot file.
+        :return: True if fresh snapshot was read.
+        """
+
+        if self._file_name is None or not os.path.isfile(self._file_name):
+            return False
+        try:
+            with open(self._file_name, "r", encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if (snapshot.get("url") != self._url or snapshot.get("login") != self._login or
+                time.time() - snapshot.get("created", 0) > self._ttl):
+            return False
+        self._projects = snapshot["projects"]
+        self._projects_with_memberships = set(snapshot["projects_with_memberships"])
+        self._users = snapshot["users"]
+        self._versions = {int(project_id): versions for project_id, versions in snapshot["versions"].items()}
+        self._created = snapshot["created"]
+        self.user = snapshot.get("user")
+        return True
+
+    def _request(self, request: Callable[[int], list], project_ids: List[int]) -> List[list]:
+        """
+        Method requests data of given projects concurrently.
+        :param request: function that requests data of one project;
+        :param project_ids: IDs of projects.
+        :return: data of projects in order of IDs.
+        """
+
+        if len(project_ids) <= 1:
+            return [request(project_id) for project_id in project_ids]
+        with ThreadPoolExecutor(max_workers=min(WORKERS_NUMBER, len(project_ids))) as executor:
+            return list(executor.map(request, project_ids))
+
+    def _request_memberships(self, project_id: int) -> list:
+        """
+        Method requests memberships of project.
+        :param project_id: project ID.
+        :return: list with memberships.
+        """
+
+        return list(self._get_redmine().project_membership.filter(project_id=project_id).values("user"))
+
+    def _request_versions(self, project_id: int) -> list:
+        """
+        Method requests versions of project.
+        :param project_id: project ID.
+        :return: list with IDs and names of versions.
+        """
+
+        return list(self._get_redmine().version.filter(project_id=project_id).values("id", "name"))
+
+    def _save_snapshot(self):
+        """
+        Method saves indexes to snapshot file.
+        """
+
+        if self._file_name is None:
+            return
+        snapshot = {"created": self._created,
+                    "url": self._url,
+                    "login": self._login,
+                    "projects": self._projects,
+                    "projects_with_memberships": sorted(self._projects_with_memberships),
+                    "users": self._users,
+                    "versions": self._versions,
+                    "user": self.user}
+        # Снимок заменяется целиком, чтобы параллельные процессы (шарды) не прочитали недописанный файл
+        temp_name = f"{self._file_name}.{os.getpid()}.tmp"
+        with open(temp_name, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(temp_name, self._file_name)
+
+    def find_project_id(self, project_name: str) -> Optional[int]:
+        """
+        Method returns ID of project with given name. If project is not in index
+        that was read from snapshot then list of projects is reloaded once.
+        :param project_name: project name.
+        :return: project ID.
+        """
+
+        if project_name not in self._projects and not self._projects_loaded:
+            self._load_projects()
+            self._save_snapshot()
+        return self._projects.get(project_name)
+
+    def find_user_id(self, username: str, project_ids: Iterable[int] = ()) -> Optional[int]:
+        """
+        Method returns ID of user with given name. If user is not in index then
+        users of given projects are loaded first and then users of other projects.
+        :param username: username;
+        :param project_ids: IDs of projects where user is searched first.
+        :return: user ID.
+        """
+
+        if username in self._users:
+            return self._users[username]
+        loaded = False
+        for ids_to_search in (self._get_projects_to_search(project_ids, False),
+                              self._get_projects_to_search(project_ids)):
+            loaded = self._load_memberships(ids_to_search) or loaded
+            if username in self._users:
+                break
+        if loaded:
+            self._save_snapshot()
+        return self._users.get(username)
+
+    def find_version_id(self, version_name: str, project_ids: Iterable[int] = ()) -> Optional[int]:
+        """
+        Method returns ID of version with given name. Versions of given projects are
+        searched first and then versions of other projects.
+        :param version_name: name of version;
+        :param project_ids: IDs of projects where version is searched first.
+        :return: version ID.
+        """
+
+        loaded = False
+        version_id = None
+        for ids_to_search in (self._get_projects_to_search(project_ids, False),
+                              self._get_projects_to_search(project_ids)):
+            loaded = self._load_versions(ids_to_search) or loaded
+            version_id = next((self._versions[project_id][version_name] for project_id in ids_to_search
+                               if version_name in self._versions[project_id]), None)
+            if version_id is not None:
+                break
+        if loaded:
+            self._save_snapshot()
+        return version_id
+
+    def get_projects(self) -> List[Tuple[int, str]]:
+        """
+        Method returns IDs and names of projects from index.
+        :return: IDs and names of projects.
+        """
+
+        return [(project_id, project_name) for project_name, project_id in self._projects.items()]
+
+    def get_user(self, login: str) -> Optional[dict]:
+        """
+        Method returns data of authenticated user from fresh snapshot.
+        :param login: login of user.
+        :return: data of user or None if there is no fresh snapshot for this user.
+        """
+
+        if self.user is None and not self._read_snapshot():
+            return None
+        if self.user is None or self.user.get("login") != login:
+            return None
+        return self.user
+
+    def get_versions(self, project_id: int) -> List[Tuple[int, str]]:
+        """
+        Method returns IDs and names of versions of project. Versions are loaded
+        only if they are not in index.
+        :param project_id: project ID.
+        :return: IDs and names of versions.
+        """
+
+        if self._load_versions([project_id]):
+            self._save_snapshot()
+        return [(version_id, version_name) for version_name, version_id in self._versions[project_id].items()]
+
+    def load(self, user: Optional[dict] = None):
+        """
+        Method fills index of projects. If there is fresh snapshot then indexes are
+        read from it and projects are not requested.
+        :param user: data of authenticated user that is saved with indexes.
+        """
+
+        if self._read_snapshot():
+            if user is not None and user != self.user:
+                self.user = user
+                self._save_snapshot()
+            return
+        self._created = time.time()
+        self._load_projects()
+        self._projects_with_memberships = set()
+        self._users = {}
+        self._versions = {}
+        self.user = user
+        self._save_snapshot()
@@ -0,0 +1,196 @@
+"""
+File with functions to generate calendar periods (days, weeks, months, quarters,
+years) and to roll up values of fine periods to coarser periods locally.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, Tuple
+import numpy as np
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+
+def _get_next_start(start: date, granularity: str) -> date:
+    """
+    Function returns start of calendar period that follows period with given date.
+    :param start: date in period;
+    :param granularity: granularity of period.
+    :return: start of next period.
+    """
+
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7 - start.weekday())
+    if granularity == "year":
+        return date(start.year + 1, 1, 1)
+    months = 1 if granularity == "month" else 3
+    month = (start.month - 1) // months * months + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def _get_period_name(start: date, granularity: str) -> str:
+    """
+    Function returns name of period.
+    :param start: start of period;
+    :param granularity: granularity of period.
+    :return: name of period, for example "2021-01-05", "W01 2021", "2021-01",
+    "Q1 2021" or "2021".
+    """
+
+    if granularity == "day":
+        return start.isoformat()
+    if granularity == "week":
+        year, week, _ = start.isocalendar()
+        return f"W{week:02d} {year}"
+    if granularity == "month":
+        return f"{start.year}-{start.month:02d}"
+    if granularity == "quarter":
+        return f"Q{(start.month - 1) // 3 + 1} {start.year}"
+    return str(start.year)
+
+
+def get_base_granularity(granularities: Iterable[str]) -> str:
+    """
+    Function returns granularity of periods from which periods of all given
+    granularities can be rolled up. Weeks are not composed of months, so if weeks
+    are required together with months, quarters or years then days are used.
+    :param granularities: required granularities.
+    :return: base granularity.
+    """
+
+    granularities = set(granularities)
+    for granularity in granularities:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}', available: {', '.join(GRANULARITIES)}")
+    if "week" in granularities and granularities & {"month", "quarter", "year"}:
+        return "day"
+    return min(granularities, key=GRANULARITIES.index)
+
+
+def is_cut_period(start_date: str, stop_date: str, granularity: str) -> bool:
+    """
+    Function checks whether period is calendar period cut by dates.
+    :param start_date: start date of period in format YYYY-MM-DD;
+    :param stop_date: end date of period in format YYYY-MM-DD;
+    :param granularity: granularity of period.
+    :return: True if period does not start or end at bounds of calendar period.
+    """
+
+    start = date.fromisoformat(start_date)
+    return (_get_next_start(start - timedelta(days=1), granularity) != start or
+            date.fromisoformat(stop_date) != _get_next_start(start, granularity) - timedelta(days=1))
+
+
+def get_periods(start_date: str, stop_date: str, granularity: str) -> Dict[str, Tuple[str, str]]:
+    """
+    Function returns calendar periods of given granularity that cover given dates.
+    First and last periods are cut by given dates, names of cut periods contain
+    their dates (for example "Q1 2021 2021-02-15..2021-03-31"), so they are never
+    confused with whole periods.
+    :param start_date: first date in format YYYY-MM-DD;
+    :param stop_date: last date in format YYYY-MM-DD;
+    :param granularity: "day", "week", "month", "quarter" or "year".
+    :return: dictionary with names of periods and their start and end dates.
+    """
+
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}', available: {', '.join(GRANULARITIES)}")
+    start = date.fromisoformat(start_date)
+    stop = date.fromisoformat(stop_date)
+    periods = {}
+    while start <= stop:
+        next_start = _get_next_start(start, granularity)
+        period_stop = min(next_start - timedelta(days=1), stop)
+        name = _get_period_name(start, granularity)
+        # Неполный период не должен заменять сохраненный полный период с тем же именем
+        if is_cut_period(start.isoformat(), period_stop.isoformat(), granularity):
+            name = f"{name} {start.isoformat()}..{period_stop.isoformat()}"
+        periods[name] = start.isoformat(), period_stop.isoformat()
+        start = next_start
+    return periods
+
+
+def get_roll_up_indexes(base_periods: Dict[str, Tuple[str, str]], periods: Dict[str, Tuple[str, str]]
+                        ) -> np.ndarray:
+    """
+    Function returns indexes of first and next after last base periods for every
+    period. Every period must consist of consecutive base periods.
+    :param base_periods: dictionary with names of base periods and their start and
+    end dates in order of dates;
+    :param periods: dictionary with names of periods and their start and end dates.
+    :return: array with shape (periods, 2).
+    """
+
+    dates = list(base_periods.values())
+    if dates != sorted(dates):
+        raise ValueError("Base periods are not in order of dates")
+    starts = {start_date: index for index, (start_date, _) in enumerate(dates)}
+    stops = {stop_date: index + 1 for index, (_, stop_date) in enumerate(dates)}
+    # Число разрывов между базовыми периодами до каждого периода, период с разрывом внутри нельзя сложить
+    gaps = np.cumsum([0] + [date.fromisoformat(start_date) - date.fromisoformat(dates[index][1]) != timedelta(days=1)
+                            for index, (start_date, _) in enumerate(dates[1:])])
+    indexes = np.empty((len(periods), 2), dtype=np.int64)
+    for index, (period_name, (start_date, stop_date)) in enumerate(periods.items()):
+        if (start_date not in starts or stop_date not in stops or starts[start_date] >= stops[stop_date] or
+                gaps[stops[stop_date] - 1] != gaps[starts[start_date]]):
+            raise ValueError(f"Period '{period_name}' ({start_date} - {stop_date}) does not consist of base periods")
+        indexes[index] = starts[start_date], stops[stop_date]
+    return indexes
+
+
+def roll_up(values: np.ndarray, base_periods: Dict[str, Tuple[str, str]], periods: Dict[str, Tuple[str, str]]
+            ) -> np.ndarray:
+    """
+    Function sums values of base periods into values of coarser periods by prefix
+    sums, so every period costs two subtractions whatever its length.
+    :param values: array with base periods along first axis (for example values of
+    ResultsStore with shape (periods, projects, metrics)). NaN means absence of
+    value;
+    :param base_periods: dictionary with names of base periods and their start and
+    end dates in order of dates;
+    :param periods: dictionary with names of periods and their start and end dates.
+    :return: array with periods along first axis. If there are no values for period
+    then value is NaN.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    indexes = get_roll_up_indexes(base_periods, periods)
+    zero = np.zeros((1,) + values.shape[1:])
+    sums = np.concatenate((zero, np.cumsum(np.nan_to_num(values), axis=0)))
+    counts = np.concatenate((zero, np.cumsum(~np.isnan(values), axis=0)))
+    result = sums[indexes[:, 1]] - sums[indexes[:, 0]]
+    # Период без единого значения не считается нулевым
+    result[counts[indexes[:, 1]] - counts[indexes[:, 0]] == 0] = np.nan
+    return result
+
+
+def roll_up_result(result: Dict[str, Dict[str, Dict[str, float]]], base_periods: Dict[str, Tuple[str, str]],
+                   periods: Dict[str, Tuple[str, str]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Function sums results of base periods into results of coarser periods.
+    :param result: dictionary with values of metrics for every project and base
+    period (see function get_finances of save_finances.py);
+    :param base_periods: dictionary with names of base periods and their start and
+    end dates in order of dates;
+    :param periods: dictionary with names of periods and their start and end dates.
+    :return: dictionary with values of metrics for every project and period.
+    """
+
+    project_names = list(result)
+    metrics = []
+    for periods_for_project in result.values():
+        for values_for_period in periods_for_project.values():
+            metrics.extend(metric for metric in values_for_period if metric not in metrics)
+    values = np.full((len(base_periods), len(project_names), len(metrics)), np.nan)
+    for j, project_name in enumerate(project_names):
+        for i, period_name in enumerate(base_periods):
+            for k, metric in enumerate(metrics):
+                value = result[project_name].get(period_name, {}).get(metric)
+                if value is not None:
+                    values[i, j, k] = value
+    rolled_up = roll_up(values, base_periods, periods)
+    return {project_name: {period_name: {metric: float(rolled_up[i, j, k]) for k, metric in enumerate(metrics)
+                                         if not np.isnan(rolled_up[i, j, k])}
+                           for i, period_name in enumerate(periods)}
+            for j, project_name in enumerate(project_names)}
@@ -0,0 +1,105 @@
+"""
+File with class to record progress of long runs, so that interrupted run can be
+resumed.
+"""
+
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+JOURNAL_FILE = "finances.journal"
+
+
+class ProgressJournal:
+    """
+    Class with append-only journal of completed cells of results. Every cell (value
+    of metric of project for period) is written to file as separate JSON line as soon
+    as it is computed. Cells are identified by name of project, name and dates of
+    period and name of metric, so journal of run with other periods is not used.
+    """
+
+    def __init__(self, file_name: str = JOURNAL_FILE, resume: bool = False):
+        """
+        :param file_name: name of journal file;
+        :param resume: if True then cells from existing journal are loaded and new
+        cells are appended, otherwise journal is started anew.
+        """
+
+        self._file_name: str = file_name
+        self.cells: Dict[Tuple[str, str, str, str, str], float] = {}
+        if resume:
+            self._read()
+        self._file = open(file_name, "a" if resume else "w", encoding="utf-8")
+
+    def _read(self):
+        """
+        Method reads cells from journal file. Last line can be incomplete if previous
+        run was interrupted while writing, such line is cut off, so new cells are
+        appended from new line.
+        """
+
+        if not os.path.exists(self._file_name):
+            return
+        with open(self._file_name, "rb+") as file:
+            size = 0
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                size += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.cells[(record["project"], record["period"], record["start"], record["stop"],
+                            record["key"])] = record["value"]
+            file.truncate(size)
+
+    def add(self, project_name: str, period_name: str, period: Tuple[str, str], key: str, value: float):
+        """
+        Method writes completed cell to journal.
+        :param project_name: name of project;
+        :param period_name: name of period;
+        :param period: start and end dates of period;
+        :param key: name of metric;
+        :param value: value of cell.
+        """
+
+        start_date, stop_date = period
+        self.cells[(project_name, period_name, start_date, stop_date, key)] = value
+        record = {"project": project_name, "period": period_name, "start": start_date, "stop": stop_date, "key": key,
+                  "value": value}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Запись сбрасывается сразу, чтобы ячейка сохранилась при аварийном завершении процесса
+        self._file.flush()
+
+    def close(self):
+        """
+        Method closes journal file.
+        """
+
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def get(self, project_name: str, period_name: str, period: Tuple[str, str], key: str) -> Optional[float]:
+        """
+        Method returns value of cell from journal.
+        :param project_name: name of project;
+        :param period_name: name of period;
+        :param period: start and end dates of period;
+        :param key: name of metric.
+        :return: value of cell or None if cell is not completed.
+        """
+
+        start_date, stop_date = period
+        return self.cells.get((project_name, period_name, start_date, stop_date, key))
+
+    def remove(self):
+        """
+        Method closes and removes journal file. Method is called when results are
+        saved (journal is compacted to results).
+        """
+
+        self.close()
+        os.remove(self._file_name)
@@ -0,0 +1,278 @@
+"""
+File with planner of totals queries. Queries that differ only by complementary
+filters (for example "Тема содержит валют" and "Тема не содержит валют") are not
+requested independently: both parts of list custom field are taken from one page
+grouped by this field, and other parts are computed by subtraction from sets that
+are requested anyway.
+"""
+
+from typing import Dict, FrozenSet, Hashable, List, Optional, Tuple
+import utils as ut
+
+COMPLEMENT_OPERATORS = {"=": "!", "!": "=", "~": "!~", "!~": "~"}
+# Задачи без значения поля не попадают ни в «содержит», ни в «не содержит», поэтому для текстовых полей
+# дополнение точное только у обязательных полей
+REQUIRED_TEXT_FILTERS = ("subject",)
+# Точность итогов на странице Redmine, разности округляются до нее
+TOTALS_DIGITS = 2
+
+# Условие фильтра: имя, оператор и значения
+Atom = Tuple[str, str, Tuple[str, ...]]
+QuerySet = FrozenSet[Atom]
+
+
+def _get_complement(atom: Atom) -> Optional[Atom]:
+    """
+    Function returns condition that together with given condition divides any set of
+    issues into two parts without intersection.
+    :param atom: condition of filter.
+    :return: complementary condition or None if there is no such condition.
+    """
+
+    filter_name, operator, values = atom
+    if operator in ("=", "!") and ut.AVAILABLE_FILTERS.get(filter_name, {}).get("type", "").startswith("list"):
+        return filter_name, COMPLEMENT_OPERATORS[operator], values
+    if operator in ("~", "!~") and filter_name in REQUIRED_TEXT_FILTERS:
+        return filter_name, COMPLEMENT_OPERATORS[operator], values
+    return None
+
+
+def _is_groupable(atom: Atom) -> bool:
+    """
+    Function checks whether parts of set of issues for condition and its complement
+    can be read from one page grouped by field of condition. Names of groups of
+    list custom fields coincide with values of filter, so only such fields are used.
+    :param atom: condition of filter.
+    :return: True if condition can be resolved by grouping.
+    """
+
+    filter_name, operator, _ = atom
+    return (operator in ("=", "!") and filter_name.startswith("cf_") and filter_name in ut.GROUP_BY_OPTIONS.values()
+            and _get_complement(atom) is not None)
+
+
+def _to_query_set(filters: list) -> QuerySet:
+    """
+    Function converts list with filters to set of conditions, so that order of
+    filters and values of lists does not matter.
+    :param filters: list with filters (see method XimcRedmine.get_filters).
+    :return: set of conditions.
+    """
+
+    query_set = set()
+    for filter_obj in filters:
+        if filter_obj.get("filter") is None:
+            continue
+        values = tuple(str(value) for value in filter_obj.get("values", []))
+        # Порядок важен только для значений вроде границ «между»
+        if filter_obj.get("operator") in ("=", "!"):
+            values = tuple(sorted(values))
+        query_set.add((filter_obj.get("filter"), filter_obj.get("operator"), values))
+    return frozenset(query_set)
+
+
+def _to_filters(query_set: QuerySet) -> list:
+    """
+    Function converts set of conditions to list with filters.
+    :param query_set: set of conditions.
+    :return: list with filters (see method XimcRedmine.get_filters).
+    """
+
+    return [{"filter": filter_name, "operator": operator, "values": list(values)}
+            for filter_name, operator, values in sorted(query_set)]
+
+
+class QueryPlan:
+    """
+    Class with plan of totals queries. Every query is resolved in one of ways:
+    - by request of page with totals;
+    - by request of page grouped by list custom field: totals of query with
+    condition "=" are totals of groups with given values, totals of query with
+    condition "!" are query totals of page minus totals of these groups;
+    - by subtraction: totals of set with condition are totals of set without this
+    condition minus totals of set with complementary condition, if both sets are
+    requested anyway.
+    """
+
+    def __init__(self, filters: Dict[Hashable, list]):
+        """
+        :param filters: dictionary with keys of queries and lists with filters (see
+        method XimcRedmine.get_filters).
+        """
+
+        self._query_sets: Dict[Hashable, QuerySet] = {key: _to_query_set(filters_for_key)
+                                                      for key, filters_for_key in filters.items()}
+        self._sources: Dict[QuerySet, tuple] = {}
+        self.requests: List[Tuple[list, Optional[str]]] = []
+        self._plan()
+
+    def __len__(self) -> int:
+        """
+        :return: number of planned requests.
+        """
+
+        return len(self.requests)
+
+    def _add_request(self, query_set: QuerySet, group_by: Optional[str] = None) -> int:
+        """
+        Method adds request to plan.
+        :param query_set: set of conditions of request;
+        :param group_by: real name of field to group issues by.
+        :return: index of request.
+        """
+
+        source = self._sources.get(query_set)
+        if source is not None and source[0] == "request":
+            # Уже запланированный запрос становится группированным, число запросов не растет
+            filters, current_group_by = self.requests[source[1]]
+            if current_group_by is None or group_by is None or current_group_by == group_by:
+                self.requests[source[1]] = filters, current_group_by or group_by
+                return source[1]
+        self.requests.append((_to_filters(query_set), group_by))
+        if source is None:
+            self._sources[query_set] = ("request", len(self.requests) - 1)
+        return len(self.requests) - 1
+
+    def _describe(self, query_set: QuerySet) -> str:
+        """
+        Method returns how totals of set of issues are received.
+        :param query_set: set of conditions.
+        :return: description.
+        """
+
+        source = self._sources[query_set]
+        if source[0] == "request":
+            return f"request {source[1] + 1}"
+        if source[0] == "group":
+            _, index, atom = source
+            if atom[1] == "=":
+                return f"groups {', '.join(atom[2])} of request {index + 1}"
+            return f"request {index + 1} minus groups {', '.join(atom[2])}"
+        _, base, subset = source
+        return f"({self._describe(base)}) minus ({self._describe(subset)})"
+
+    def _plan(self):
+        """
+        Method chooses requests. At first queries with complementary conditions on
+        list custom fields are joined into grouped requests, then remaining queries
+        are resolved by subtraction if possible, otherwise they are requested.
+        """
+
+        # Сначала рассматриваются множества с меньшим числом условий, они могут быть основой для вычитания
+        remaining = sorted(dict.fromkeys(self._query_sets.values()), key=len)
+        # Группировка: одна страница дает обе части множества по полю-списку
+        for query_set in remaining:
+            if query_set in self._sources:
+                continue
+            best = None
+            for atom in sorted(query_set):
+                if not _is_groupable(atom):
+                    continue
+                base = query_set - {atom}
+                partner = base | {_get_complement(atom)}
+                covered = [atom] + ([_get_complement(atom)] if partner in remaining and partner not in self._sources
+                                    else [])
+                if best is None or len(covered) > len(best[1]):
+                    best = base, covered
+            if best is not None and len(best[1]) > 1:
+                base, covered = best
+                index = self._add_request(base, covered[0][0])
+                for atom in covered:
+                    self._sources[base | {atom}] = ("group", index, atom)
+        # Вычитание: множество с условием равно множеству без условия минус множество с дополнением
+        for query_set in remaining:
+            if query_set in self._sources:
+                continue
+            for atom in sorted(query_set):
+                complement = _get_complement(atom)
+                if complement is None:
+                    continue
+                base = query_set - {atom}
+                partner = base | {complement}
+                if base in self._sources and (partner in self._sources or partner in remaining):
+                    if partner not in self._sources:
+                        self._add_request(partner)
+                    self._sources[query_set] = ("difference", base, partner)
+                    break
+            else:
+                self._add_request(query_set)
+
+    def _resolve(self, query_set: QuerySet, responses: Dict[int, tuple], options: List[str]
+                 ) -> Dict[str, Optional[float]]:
+        """
+        Method computes totals of set of issues from responses of requests.
+        :param query_set: set of conditions;
+        :param responses: dictionary with indexes of requests and pairs of query
+        totals and totals of groups;
+        :param options: names of totals options.
+        :return: dictionary with values of totals options.
+        """
+
+        source = self._sources[query_set]
+        if source[0] == "request":
+            return dict(responses[source[1]][0])
+        if source[0] == "group":
+            _, index, (_, operator, values) = source
+            totals, groups = responses[index]
+            result = {}
+            for option in options:
+                values_of_groups = [groups[value][option] for value in values
+                                    if value in groups and groups[value][option] is not None]
+                if operator == "=":
+                    result[option] = round(sum(values_of_groups), TOTALS_DIGITS) if values_of_groups else None
+                elif totals[option] is None:
+                    result[option] = None
+                else:
+                    result[option] = round(totals[option] - sum(values_of_groups), TOTALS_DIGITS)
+            return result
+        _, base, subset = source
+        base_totals = self._resolve(base, responses, options)
+        subset_totals = self._resolve(subset, responses, options)
+        return {option: None if base_totals[option] is None
+                else round(base_totals[option] - (subset_totals[option] or 0), TOTALS_DIGITS)
+                for option in options}
+
+    def explain(self) -> str:
+        """
+        Method returns description of plan: requests with their filters and the way
+        totals of every query are received.
+        :return: description of plan.
+        """
+
+        lines = [f"Queries: {len(self._query_sets)}, unique: {len(set(self._query_sets.values()))}, "
+                 f"requests: {len(self.requests)} (grouped requests can take several pages)"]
+        for index, (filters, group_by) in enumerate(self.requests):
+            conditions = "; ".join(f"{filter_obj['filter']} {filter_obj['operator']} {'|'.join(filter_obj['values'])}"
+                                   for filter_obj in filters)
+            lines.append(f"request {index + 1}: {conditions}" + ("" if group_by is None else f" grouped by {group_by}"))
+        for key, query_set in self._query_sets.items():
+            lines.append(f"{key}: {self._describe(query_set)}")
+        return "\n".join(lines)
+
+    def get_keys(self, index: Optional[int] = None) -> List[Hashable]:
+        """
+        Method returns keys of queries whose totals are received from given request.
+        :param index: index of request. If None then keys of queries computed by
+        subtraction are returned.
+        :return: keys of queries.
+        """
+
+        keys = []
+        for key, query_set in self._query_sets.items():
+            source = self._sources[query_set]
+            if (source[0] == "difference" and index is None) or (source[0] != "difference" and source[1] == index):
+                keys.append(key)
+        return keys
+
+    def get_totals(self, key: Hashable, responses: Dict[int, tuple], options: List[str]) -> Dict[str, Optional[float]]:
+        """
+        Method computes totals of query from responses of requests.
+        :param key: key of query;
+        :param responses: dictionary with indexes of requests and pairs of query
+        totals and totals of groups (for not grouped requests totals of groups are
+        empty). Responses of all requests which query depends on must be received;
+        :param options: names of totals options.
+        :return: dictionary with values of totals options.
+        """
+
+        return self._resolve(self._query_sets[key], responses, options)
@@ -0,0 +1,2 @@
+@cd /d "%~dp0"
+@venv\Scripts\python redmine_stats.py %*
\ No newline at end of file
@@ -0,0 +1,2 @@
+cd "$(dirname "$0")"
+./venv/bin/python3 redmine_stats.py "$@"
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Command-line tool to get statistics from ximc Redmine. Heavy modules are imported
+only by subcommands that need them, authentication and names of projects and
+versions are taken from snapshot of indexes, so short queries start quickly.
+
+Examples:
+    python redmine_stats.py projects
+    python redmine_stats.py versions EP-software
+    python redmine_stats.py totals "Payment cash" "Payment cashless" -f Project is Payments -f Status closed
+    python redmine_stats.py totals "Payment cash" -f Project is Payments --store
+    python redmine_stats.py finances Payments --period 2021-01-01 2021-03-31
+"""
+
+import argparse
+import configparser
+import json
+import sys
+import utils as ut
+
+# Файлы общие с save_finances.py, поэтому кэш и индексы, собранные одним скриптом, используются другим
+CACHE_FILE = "responses.sqlite"
+CONFIG_FILE = "config.ini"
+FILTERS_FILE = "redmine_filters.json"
+INDEX_FILE = "redmine_index.json"
+STORE_FILE = "issues.sqlite"
+
+
+def _create_client(args: argparse.Namespace):
+    """
+    Function creates client of ximc Redmine and authenticates user.
+    :param args: arguments of command line.
+    :return: authorized client.
+    """
+
+    from request_layer import create_request_layer
+    from response_cache import ResponseCache
+    from ximc import XimcRedmine
+
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    user_name = config.get("MAIN", "login")
+    password = config.get("MAIN", "password")
+    url = config.get("MAIN", "url", fallback=ut.REDMINE_URL)
+    try:
+        ximc_user = XimcRedmine(user_name, password, index_file=INDEX_FILE,
+                                cache=ResponseCache(CACHE_FILE, offline=args.offline), url=url,
+                                request_layer=create_request_layer(config), filters_file=FILTERS_FILE)
+        ximc_user.auth(cached=not args.refresh)
+    except Exception:
+        print("User authorization failed", file=sys.stderr)
+        sys.exit(1)
+    for change in ximc_user.load_filters(cached=not args.refresh):
+        print(f"Definition of filter in Redmine differs from built-in one: {change}", file=sys.stderr)
+    return ximc_user
+
+
+def _print_table(rows: list, as_json: bool):
+    """
+    Function prints rows of result.
+    :param rows: list with rows;
+    :param as_json: if True then rows are printed as JSON.
+    """
+
+    if as_json:
+        print(json.dumps(rows, ensure_ascii=False))
+        return
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+
+
+def print_finances(args: argparse.Namespace):
+    """
+    Function prints RUB and USD incomes and expenditures of payment projects.
+    :param args: arguments of command line.
+    """
+
+    import save_finances as sf
+
+    ximc_user = _create_client(args)
+    project_names = args.projects or (sf.MALT_PAYMENT_LIST + sf.EZ_PAYMENT_LIST + sf.RAW_PAYMENT_LIST +
+                                      sf.ZAP_PAYMENT_LIST)
+    periods = {f"{args.period[0]} - {args.period[1]}": tuple(args.period)} if args.period else sf.QUARTERS
+    get_finances = sf.get_finances_grouped if args.grouped else sf.get_finances
+    result = get_finances(ximc_user, project_names, periods)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    print("\t".join(["project", "period"] + [key for _, _, key in sf.FINANCE_KEYS]))
+    for project_name in project_names:
+        for period_name in periods:
+            _print_table([[project_name, period_name, *result[project_name][period_name].values()]], False)
+
+
+def print_projects(args: argparse.Namespace):
+    """
+    Function prints IDs and names of available projects.
+    :param args: arguments of command line.
+    """
+
+    ximc_user = _create_client(args)
+    _print_table(sorted(ximc_user.get_projects(cached=not args.refresh), key=lambda project: project[1]), args.json)
+
+
+def print_totals(args: argparse.Namespace):
+    """
+    Function prints values of totals options for issues that satisfy filters.
+    Totals are requested from Redmine or computed from local store with issues.
+    :param args: arguments of command line.
+    """
+
+    ximc_user = _create_client(args)
+    for filter_name, operator_name, *values in args.filter or []:
+        ximc_user.add_filter(filter_name, operator_name, *values)
+    if args.store:
+        from issue_store import IssueStore
+
+        store = IssueStore(STORE_FILE)
+        try:
+            if not args.offline:
+                store.sync(ximc_user)
+            totals = store.get_totals(ximc_user.get_filters(), *args.options)
+        finally:
+            store.close()
+    else:
+        totals = ximc_user.get_totals(*args.options)
+    if args.json:
+        print(json.dumps(totals, ensure_ascii=False))
+        return
+    for option_name, value in totals.items():
+        print(f"{option_name}: {value}")
+
+
+def print_versions(args: argparse.Namespace):
+    """
+    Function prints IDs and names of versions of project.
+    :param args: arguments of command line.
+    """
+
+    ximc_user = _create_client(args)
+    _print_table(ximc_user.get_versions_for_project(args.project, cached=not args.refresh), args.json)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="redmine-stats", description="Get statistics from ximc Redmine")
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument("--json", action="store_true", help="print result as JSON")
+    common_parser.add_argument("--offline", action="store_true",
+                               help="take pages with issues only from cache and fail if page is not cached")
+    common_parser.add_argument("--refresh", action="store_true",
+                               help="authenticate and request projects and versions even if they are cached")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    finances_parser = subparsers.add_parser("finances", parents=[common_parser],
+                                            help="RUB and USD incomes and expenditures of payment projects")
+    finances_parser.add_argument("projects", nargs="*",
+                                 help="names of payment projects, all payment projects by default")
+    finances_parser.add_argument("--period", nargs=2, metavar=("START", "STOP"),
+                                 help="start and end dates of period, quarters of save_finances.py by default")
+    finances_parser.add_argument("--grouped", action="store_true",
+                                 help="get incomes or expenditures of all projects for period by one grouped query")
+    finances_parser.set_defaults(func=print_finances)
+
+    projects_parser = subparsers.add_parser("projects", parents=[common_parser], help="available projects")
+    projects_parser.set_defaults(func=print_projects)
+
+    totals_parser = subparsers.add_parser("totals", parents=[common_parser],
+                                          help="totals options for issues that satisfy filters")
+    totals_parser.add_argument("options", nargs="+", help="names of totals options (for example 'Spent time')")
+    totals_parser.add_argument("-f", "--filter", nargs="+", action="append", metavar="FILTER",
+                               help="filter as name, operator and values (for example -f Project is Payments)")
+    totals_parser.add_argument("--store", action="store_true",
+                               help="synchronize issues updated since last run into local store (shared with "
+                                    "save_finances.py --store) and compute totals from it, with --offline store "
+                                    "is not synchronized")
+    totals_parser.set_defaults(func=print_totals)
+
+    versions_parser = subparsers.add_parser("versions", parents=[common_parser], help="versions of project")
+    versions_parser.add_argument("project", help="name of project")
+    versions_parser.set_defaults(func=print_versions)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except Exception as exc:
+        print(f"Failed to get data from Redmine: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,289 @@
+"""
+File with request layer that is shared by all requests to ximc Redmine. Layer
+limits number of concurrent requests to host and rate of requests, retries failed
+requests with exponential backoff and stops sending requests to host that keeps
+failing.
+"""
+
+import configparser
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Optional, TYPE_CHECKING
+from urllib.parse import urlsplit
+from instrumentation import Instrumentation
+
+if TYPE_CHECKING:
+    import requests
+
+BACKOFF = 0.5
+CONNECT_TIMEOUT = 3.05
+FAILURE_THRESHOLD = 10
+MAX_ATTEMPTS_NUMBER = 5
+MAX_BACKOFF = 30
+MAX_CONNECTIONS = 8
+RATE = 20
+READ_TIMEOUT = 30
+RESET_TIMEOUT = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RequestError(Exception):
+    """
+    Exception is raised if request failed after all attempts.
+    """
+
+
+class CircuitOpenError(RequestError):
+    """
+    Exception is raised if requests to host are suspended after many failures.
+    """
+
+
+class CircuitBreaker:
+    """
+    Class suspends requests to host after several consecutive failures. After
+    timeout one trial request is allowed, its success resumes requests.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        """
+        :param failure_threshold: number of consecutive failures after which requests
+        are suspended;
+        :param reset_timeout: time in seconds after which trial request is allowed.
+        """
+
+        self._failure_threshold: int = failure_threshold
+        self._failures: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._opened: Optional[float] = None
+        self._reset_timeout: float = reset_timeout
+        self._trial: bool = False
+
+    def before_request(self, host: str):
+        """
+        Method checks whether request can be sent.
+        :param host: host of request.
+        """
+
+        with self._lock:
+            if self._opened is None:
+                return
+            if self._trial or time.monotonic() - self._opened < self._reset_timeout:
+                raise CircuitOpenError(f"Requests to {host} are suspended after {self._failures} failures")
+            self._trial = True
+
+    def record_failure(self):
+        """
+        Method records failed request.
+        """
+
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._failures >= self._failure_threshold:
+                self._opened = time.monotonic()
+
+    def record_success(self):
+        """
+        Method records successful request.
+        """
+
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+
+class TokenBucket:
+    """
+    Class limits rate of requests.
+    """
+
+    def __init__(self, rate: float = RATE, capacity: Optional[float] = None):
+        """
+        :param rate: number of requests per second;
+        :param capacity: maximum number of requests in burst.
+        """
+
+        self._capacity: float = rate if capacity is None else capacity
+        self._lock: threading.Lock = threading.Lock()
+        self._rate: float = rate
+        self._tokens: float = self._capacity
+        self._updated: float = time.monotonic()
+
+    def acquire(self):
+        """
+        Method waits until request can be sent.
+        """
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self._rate
+            time.sleep(delay)
+
+
+class RequestLayer:
+    """
+    Class sends requests with per-host concurrency limit, rate limit, retries with
+    jittered exponential backoff and circuit breaker.
+    """
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, rate: float = RATE, burst: Optional[float] = None,
+                 max_attempts: int = MAX_ATTEMPTS_NUMBER, backoff: float = BACKOFF, max_backoff: float = MAX_BACKOFF,
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 instrumentation: Optional[Instrumentation] = None):
+        """
+        :param max_connections: maximum number of concurrent requests to one host;
+        :param rate: maximum number of requests per second to one host;
+        :param burst: maximum number of requests in burst, by default equals to rate;
+        :param max_attempts: maximum number of attempts for request;
+        :param backoff: initial delay between attempts in seconds;
+        :param max_backoff: maximum delay between attempts in seconds;
+        :param connect_timeout: timeout of connection in seconds;
+        :param read_timeout: timeout of reading response in seconds;
+        :param failure_threshold: number of consecutive failures after which requests
+        to host are suspended;
+        :param reset_timeout: time in seconds after which suspended host is tried
+        again;
+        :param instrumentation: object to measure requests. If None then new object
+        is created.
+        """
+
+        self._backoff: float = backoff
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._burst: Optional[float] = burst
+        self._failure_threshold: int = failure_threshold
+        self._lock: threading.Lock = threading.Lock()
+        self._max_attempts: int = max_attempts
+        self._max_backoff: float = max_backoff
+        self._rate: float = rate
+        self._reset_timeout: float = reset_timeout
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self.instrumentation: Instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        self.max_connections: int = max_connections
+        self.timeout: tuple = (connect_timeout, read_timeout)
+
+    def _get_delay(self, attempt: int, response: Optional["requests.Response"]) -> float:
+        """
+        Method returns delay before next attempt. Delay grows exponentially with
+        random jitter, header Retry-After of response is respected.
+        :param attempt: number of failed attempt;
+        :param response: failed response.
+        :return: delay in seconds.
+        """
+
+        delay = random.uniform(0, min(self._max_backoff, self._backoff * 2 ** attempt))
+        retry_after = None if response is None else response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                try:
+                    delay = max(delay, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return delay
+
+    def _get_host_limits(self, host: str):
+        """
+        Method returns semaphore, token bucket and circuit breaker of host.
+        :param host: host.
+        :return: semaphore, token bucket and circuit breaker.
+        """
+
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_connections)
+                self._buckets[host] = TokenBucket(self._rate, self._burst)
+                self._breakers[host] = CircuitBreaker(self._failure_threshold, self._reset_timeout)
+            return self._semaphores[host], self._buckets[host], self._breakers[host]
+
+    @contextmanager
+    def request(self, session: "requests.Session", method: str, url: str, **kwargs) -> Iterator["requests.Response"]:
+        """
+        Method sends request and yields response. Connection errors, timeouts and
+        responses with statuses 429 and 5xx are retried, other responses are yielded
+        as they are. Slot of host is held until response is processed.
+        :param session: HTTP session;
+        :param method: HTTP method;
+        :param url: url address;
+        :param kwargs: arguments for method request of session.
+        :return: response.
+        """
+
+        import requests
+
+        host = urlsplit(url).netloc
+        semaphore, bucket, breaker = self._get_host_limits(host)
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            breaker.before_request(host)
+            with self.instrumentation.span("throttle"):
+                bucket.acquire()
+                semaphore.acquire()
+            response = None
+            error = None
+            with self.instrumentation.span("request", method=method, url=url, attempt=attempt + 1) as attributes:
+                try:
+                    response = session.request(method, url, **kwargs)
+                    attributes["status"] = response.status_code
+                except requests.RequestException as exc:
+                    attributes["error"] = type(exc).__name__
+                    error = exc
+            self.instrumentation.count("requests")
+            if error is None and response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                try:
+                    yield response
+                finally:
+                    response.close()
+                    semaphore.release()
+                return
+            if response is not None:
+                # Тело ответа с ошибкой дочитывается, чтобы соединение можно было использовать повторно
+                try:
+                    response.content
+                except requests.RequestException:
+                    pass
+                response.close()
+            semaphore.release()
+            breaker.record_failure()
+            attempt += 1
+            if attempt >= self._max_attempts:
+                self.instrumentation.count("failed_requests")
+                reason = error if error is not None else f"status {response.status_code}"
+                raise RequestError(f"Request to {url} failed after {attempt} attempts: {reason}")
+            self.instrumentation.count("retries")
+            with self.instrumentation.span("backoff"):
+                time.sleep(self._get_delay(attempt, response))
+
+
+def create_request_layer(config: configparser.ConfigParser, instrumentation: Optional[Instrumentation] = None
+                         ) -> RequestLayer:
+    """
+    Function creates request layer with settings from section NETWORK of config
+    file. Missing settings get default values.
+    :param config: config;
+    :param instrumentation: object to measure requests.
+    :return: request layer.
+    """
+
+    section = "NETWORK"
+    return RequestLayer(max_connections=config.getint(section, "max_connections", fallback=MAX_CONNECTIONS),
+                        rate=config.getfloat(section, "rate", fallback=RATE),
+                        max_attempts=config.getint(section, "max_attempts", fallback=MAX_ATTEMPTS_NUMBER),
+                        connect_timeout=config.getfloat(section, "connect_timeout", fallback=CONNECT_TIMEOUT),
+                        read_timeout=config.getfloat(section, "read_timeout", fallback=READ_TIMEOUT),
+                        instrumentation=instrumentation)
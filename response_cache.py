@@ -0,0 +1,153 @@
+"""
+File with class to cache responses of ximc Redmine on disk.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+MAX_CACHE_SIZE = 100 * 1024 * 1024
+OPEN_PERIOD_TTL = 60 * 60
+
+
+class CacheMissError(Exception):
+    """
+    Exception is raised in offline mode if there is no response in cache.
+    """
+
+
+class CachedResponse(NamedTuple):
+    """
+    Response stored in cache.
+    """
+
+    body: str
+    closed: bool
+    etag: Optional[str]
+    stored: float
+
+
+class ResponseCache:
+    """
+    Class with SQLite cache of responses. Responses are identified by key (url
+    address together with login of user, see method get_key), because the same
+    page shows different issues to users with different permissions. Responses for
+    closed periods never expire, responses for open periods expire
+    after given time. When total size of responses exceeds limit, least recently
+    used responses are removed.
+    """
+
+    def __init__(self, file_name: str = "responses.sqlite", max_size: int = MAX_CACHE_SIZE,
+                 ttl: float = OPEN_PERIOD_TTL, offline: bool = False, revalidate: bool = False):
+        """
+        :param file_name: name of SQLite database file;
+        :param max_size: maximum total size of responses in bytes;
+        :param ttl: lifetime of responses for open periods in seconds;
+        :param offline: if True then responses are taken only from cache;
+        :param revalidate: if True then every response (including responses for closed
+        periods) is revalidated by ETag before use. It is needed when issues of closed
+        periods are known to have changed.
+        """
+
+        self._connection: sqlite3.Connection = sqlite3.connect(file_name, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, body TEXT, etag TEXT, "
+                                 "closed INTEGER, stored REAL, accessed REAL, size INTEGER)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._connection.commit()
+        self._lock: threading.Lock = threading.Lock()
+        self._max_size: int = max_size
+        self._ttl: float = ttl
+        self.offline: bool = offline
+        self.revalidate: bool = revalidate
+
+    def _evict(self):
+        """
+        Method removes least recently used responses while total size of responses
+        exceeds limit.
+        """
+
+        total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self._max_size:
+            return
+        rows = self._connection.execute("SELECT url, size FROM responses ORDER BY accessed").fetchall()
+        urls = []
+        for url, size in rows:
+            if total_size <= self._max_size:
+                break
+            urls.append((url,))
+            total_size -= size
+        self._connection.executemany("DELETE FROM responses WHERE url = ?", urls)
+
+    def close(self):
+        """
+        Method closes database.
+        """
+
+        with self._lock:
+            self._connection.close()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Method returns response from cache.
+        :param key: key of response.
+        :return: cached response or None if there is no response in cache.
+        """
+
+        with self._lock:
+            row = self._connection.execute("SELECT body, closed, etag, stored FROM responses WHERE url = ?",
+                                           (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time.time(), key))
+            self._connection.commit()
+        body, closed, etag, stored = row
+        return CachedResponse(body, bool(closed), etag, stored)
+
+    @staticmethod
+    def get_key(login: str, url: str) -> str:
+        """
+        Method returns key of response.
+        :param login: login of user who requested response;
+        :param url: url address of response.
+        :return: key.
+        """
+
+        return f"{login} {url}"
+
+    def is_fresh(self, response: CachedResponse) -> bool:
+        """
+        Method checks whether cached response can be used without revalidation.
+        :param response: cached response.
+        :return: True if response is fresh.
+        """
+
+        if self.revalidate:
+            return False
+        return response.closed or time.time() - response.stored < self._ttl
+
+    def put(self, key: str, body: str, etag: Optional[str] = None, closed: bool = False):
+        """
+        Method saves response to cache.
+        :param key: key of response;
+        :param body: body of response;
+        :param etag: ETag of response;
+        :param closed: if True then response is for closed period and never expires.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (key, body, etag, int(closed), now, now, len(body.encode("utf-8"))))
+            self._evict()
+            self._connection.commit()
+
+    def touch(self, key: str):
+        """
+        Method marks cached response as just revalidated.
+        :param key: key of response.
+        """
+
+        with self._lock:
+            self._connection.execute("UPDATE responses SET stored = ? WHERE url = ?", (time.time(), key))
+            self._connection.commit()
@@ -0,0 +1,218 @@
+"""
+File with class to store results (values of metrics of projects for periods) as
+dense array that can be loaded memory-mapped.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+DTYPE = np.float64
+META_FILE = "meta.json"
+VALUES_FILE = "values.f8"
+
+
+class ResultsStore:
+    """
+    Class with results stored in directory as dense array of values with shape
+    (periods, projects, metrics) in binary file and metadata (names of periods with
+    their start and end dates, names of projects and metrics, name of binary file)
+    in JSON file. Array is period-major and periods are kept in order of dates, so
+    later periods are appended to end of file without rewriting. Metadata is the
+    only source of shape of array: rows after last period of metadata (left by
+    interrupted saving) are discarded, and array is rewritten to new file that
+    replaces old one only when metadata is replaced. Array is loaded
+    memory-mapped, so loading does not depend on size of results.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: directory with results. If directory does not exist then
+        it is created when results are saved for the first time.
+        """
+
+        self._directory: str = directory
+        self._values: Optional[np.memmap] = None
+        self._values_file: str = VALUES_FILE
+        self.metrics: List[str] = []
+        self.periods: Dict[str, Tuple[str, str]] = {}
+        self.projects: List[str] = []
+        self._read_meta()
+
+    def _get_path(self, file_name: str) -> str:
+        """
+        Method returns path to file in directory with results.
+        :param file_name: name of file.
+        :return: path.
+        """
+
+        return os.path.join(self._directory, file_name)
+
+    def _read_meta(self):
+        """
+        Method reads metadata of results if they exist.
+        """
+
+        if not os.path.exists(self._get_path(META_FILE)):
+            return
+        with open(self._get_path(META_FILE), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        self.metrics = meta["metrics"]
+        self.periods = {name: (start_date, stop_date) for name, start_date, stop_date in meta["periods"]}
+        self.projects = meta["projects"]
+        # Метаданные старого формата не содержат имени файла со значениями
+        self._values_file = meta.get("values", VALUES_FILE)
+        self._values = None
+
+    def _rewrite(self, values: np.ndarray, periods: Dict[str, Tuple[str, str]], projects: List[str],
+                 metrics: List[str]):
+        """
+        Method writes whole array to new file and switches metadata to it. Until
+        metadata is replaced readers use old file, so interrupted rewriting does not
+        damage results.
+        :param values: array with shape (periods, projects, metrics);
+        :param periods: dictionary with names of periods and their start and end
+        dates in order of rows of array;
+        :param projects: names of projects;
+        :param metrics: names of metrics.
+        """
+
+        old_file = self._values_file
+        self._values = None
+        self._values_file = f"values.{time.time_ns()}.f8"
+        values.astype(DTYPE).tofile(self._get_path(self._values_file))
+        self.periods = periods
+        self.projects = projects
+        self.metrics = metrics
+        self._write_meta()
+        if os.path.exists(self._get_path(old_file)):
+            os.remove(self._get_path(old_file))
+
+    def _write_meta(self):
+        """
+        Method writes metadata of results. File is replaced atomically, so readers
+        never see partially written metadata.
+        """
+
+        meta = {"metrics": self.metrics,
+                "periods": [[name, start_date, stop_date] for name, (start_date, stop_date) in self.periods.items()],
+                "projects": self.projects,
+                "values": self._values_file,
+                "dtype": np.dtype(DTYPE).str}
+        temp_file = self._get_path(f"{META_FILE}.{os.getpid()}.tmp")
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self._get_path(META_FILE))
+        self._values = None
+
+    def get(self, project_name: str, metric: Optional[str] = None) -> np.ndarray:
+        """
+        Method returns values of project for all periods.
+        :param project_name: name of project;
+        :param metric: name of metric. If None then values of all metrics are
+        returned.
+        :return: array with shape (periods, metrics) or (periods,) if metric is given.
+        """
+
+        values = self.values[:, self.projects.index(project_name)]
+        return values if metric is None else values[:, self.metrics.index(metric)]
+
+    def save(self, result: Dict[str, Dict[str, Dict[str, float]]], periods: Dict[str, Tuple[str, str]]):
+        """
+        Method saves results for given periods. Periods that are already stored are
+        replaced in place (values missing in results become NaN), new periods that
+        start after stored ones are appended. New projects and metrics and new
+        periods that start before stored ones cause rewriting of whole array.
+        :param result: dictionary with values of metrics for every project and period
+        (see function get_finances of save_finances.py);
+        :param periods: dictionary with names of periods and their start and end
+        dates. Stored period with other dates and new period that overlaps stored
+        one cause ValueError, because values of different periods must not be mixed.
+        """
+
+        for name, (start_date, stop_date) in periods.items():
+            if name in self.periods and self.periods[name] != (start_date, stop_date):
+                raise ValueError(f"Period '{name}' ({start_date} - {stop_date}) is stored with other dates "
+                                 f"({self.periods[name][0]} - {self.periods[name][1]})")
+        all_periods = sorted({**self.periods, **{name: tuple(period) for name, period in periods.items()}}.items(),
+                             key=lambda item: item[1])
+        for (previous_name, (_, previous_stop)), (name, (start_date, stop_date)) in zip(all_periods, all_periods[1:]):
+            if start_date <= previous_stop:
+                raise ValueError(f"Period '{name}' ({start_date} - {stop_date}) overlaps period '{previous_name}'")
+        os.makedirs(self._directory, exist_ok=True)
+        projects = self.projects + [project for project in result if project not in self.projects]
+        metrics = list(self.metrics)
+        for periods_for_project in result.values():
+            for values in periods_for_project.values():
+                metrics.extend(metric for metric in values if metric not in metrics)
+        values = np.full((len(periods), len(projects), len(metrics)), np.nan, dtype=DTYPE)
+        for i, project_name in enumerate(projects):
+            for j, period_name in enumerate(periods):
+                for k, metric in enumerate(metrics):
+                    value = result.get(project_name, {}).get(period_name, {}).get(metric)
+                    if value is not None:
+                        values[j, i, k] = value
+        period_indexes = {name: index for index, name in enumerate(periods)}
+        new_periods = sorted((name for name in periods if name not in self.periods), key=lambda name: periods[name])
+        last_period = max(self.periods.values(), default=None)
+        if (projects != self.projects or metrics != self.metrics or
+                (new_periods and last_period is not None and tuple(periods[new_periods[0]]) < last_period)):
+            # Массив переписывается целиком: добавляются столбцы и периоды встают на место по датам
+            all_periods = dict(sorted({**self.periods, **{name: tuple(periods[name]) for name in new_periods}}.items(),
+                                      key=lambda item: item[1]))
+            all_values = np.full((len(all_periods), len(projects), len(metrics)), np.nan, dtype=DTYPE)
+            row_indexes = {name: index for index, name in enumerate(all_periods)}
+            if self.periods:
+                project_indexes = np.array([projects.index(project) for project in self.projects])
+                metric_indexes = np.array([metrics.index(metric) for metric in self.metrics])
+                rows = np.array([row_indexes[name] for name in self.periods])
+                all_values[rows[:, None, None], project_indexes[:, None], metric_indexes] = self.values
+            rows = np.array([row_indexes[name] for name in periods], dtype=np.int64)
+            all_values[rows] = values
+            self._rewrite(all_values, all_periods, projects, metrics)
+            return
+        if len(new_periods) < len(periods):
+            stored = np.memmap(self._get_path(self._values_file), dtype=DTYPE, mode="r+",
+                               shape=(len(self.periods), len(self.projects), len(self.metrics)))
+            for index, name in enumerate(self.periods):
+                if name in period_indexes:
+                    stored[index] = values[period_indexes[name]]
+            stored.flush()
+            del stored
+        with open(self._get_path(self._values_file), "ab") as file:
+            # Строки после последнего периода метаданных остались от прерванного сохранения
+            file.truncate(len(self.periods) * len(self.projects) * len(self.metrics) * np.dtype(DTYPE).itemsize)
+            values[[period_indexes[name] for name in new_periods]].tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        self.periods.update((name, tuple(periods[name])) for name in new_periods)
+        self._write_meta()
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Method returns results as nested dictionary.
+        :return: dictionary with values of metrics for every project and period.
+        """
+
+        values = np.asarray(self.values)
+        return {project_name: {period_name: {metric: float(values[j, i, k]) for k, metric in enumerate(self.metrics)}
+                               for j, period_name in enumerate(self.periods)}
+                for i, project_name in enumerate(self.projects)}
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        :return: read-only memory-mapped array with shape (periods, projects,
+        metrics).
+        """
+
+        if self._values is None:
+            shape = (len(self.periods), len(self.projects), len(self.metrics))
+            if 0 in shape:
+                return np.empty(shape, dtype=DTYPE)
+            self._values = np.memmap(self._get_path(self._values_file), dtype=DTYPE, mode="r", shape=shape)
+        return self._values
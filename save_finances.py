@@ -1,28 +1,34 @@
+import argparse
 import configparser
+import copy
 import json
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from ximc import XimcRedmine
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from fingerprints import find_changed_periods, FINGERPRINTS_FILE, FingerprintStore
+from instrumentation import Instrumentation
+from issue_store import IssueStore
+from periods import get_base_granularity, get_periods, GRANULARITIES, is_cut_period, roll_up_result
+from progress_journal import JOURNAL_FILE, ProgressJournal
+from query_planner import QueryPlan
+from request_layer import create_request_layer, RATE, RequestError
+from response_cache import CacheMissError, ResponseCache
+from results_store import ResultsStore
+from sharding import get_cells, get_shard_file, merge_shards, parse_shard, run_shards
+import utils as ut
+from ximc import PageParseError, WORKERS_NUMBER, XimcRedmine
 
 # Курс валюты, необходим для сведения финальных рублевых цифр
 USD_CB = 75.1
 # Интервалы, в которые будет собираться статистика
-QUARTERS = {"Q1 2018": ("2018-01-01", "2018-03-31"),
-            "Q2 2018": ("2018-04-01", "2018-06-30"),
-            "Q3 2018": ("2018-07-01", "2018-09-30"),
-            "Q4 2018": ("2018-10-01", "2018-12-31"),
-            "Q1 2019": ("2019-01-01", "2019-03-31"),
-            "Q2 2019": ("2019-04-01", "2019-06-30"),
-            "Q3 2019": ("2019-07-01", "2019-09-30"),
-            "Q4 2019": ("2019-10-01", "2019-12-31"),
-            "Q1 2020": ("2020-01-01", "2020-03-31"),
-            "Q2 2020": ("2020-04-01", "2020-06-30"),
-            "Q3 2020": ("2020-07-01", "2020-09-30"),
-            "Q4 2020": ("2020-10-01", "2020-12-31"),
-            "Q1 2021": ("2021-01-01", "2021-03-31"),
-            "Q2 2021": ("2021-04-01", "2021-06-30"),
-            "Q3 2021": ("2021-07-01", "2021-09-30"),
-            "Q4 2021": ("2021-10-01", "2021-12-31")}
+START_DATE = "2018-01-01"
+STOP_DATE = "2021-12-31"
+QUARTERS = get_periods(START_DATE, STOP_DATE, "quarter")
 
 # Проекты, с которыми будем работать, делим их на 4 группы: Malt, EZ, Raw, Zap.
 # Причем группа Raw содержит только платежи, но не сожержит связанных с ними проектов
@@ -38,6 +44,26 @@ EZ_PAYMENT_LIST = ["EN-Payments", "Bom-Payments", "DA-Payments", "EP-Payments",
 RAW_PAYMENT_LIST = ["Dividends", "Payments"]
 ZAP_PROJ_LIST = ["Z30", "ZEL", "ZRocket"]
 ZAP_PAYMENT_LIST = ["Z30-Payments", "ZEL-Payments", "ZRocket"]
+# Файл с логином, паролем и настройками сети
+CONFIG_FILE = "config.ini"
+# Файл, в котором сохраняются идентификаторы проектов, пользователей и версий между запусками
+INDEX_FILE = "redmine_index.json"
+# Файл с определениями фильтров, полученными от Redmine
+FILTERS_FILE = "redmine_filters.json"
+# Файл с кэшем ответов Redmine: данные за завершившиеся кварталы повторно не запрашиваются
+CACHE_FILE = "responses.sqlite"
+# Файл с локальной копией задач Redmine
+STORE_FILE = "issues.sqlite"
+# Каталог с результатами: массив проекты x кварталы x показатели, который загружается отображением в память
+RESULTS_DIRECTORY = "finances"
+# Столбцы выгрузки задач в CSV, необходимые для расчета финансов. Настраиваемые поля указаны встроенными
+# идентификаторами, при перенумерации полей на сервере запрашиваются его идентификаторы (см. utils.get_field_id)
+CSV_COLUMNS = ("due_date", "project", "subject", "cf_28", "cf_29", "cf_30")
+# Ячейки результата для каждого проекта и квартала: (рубли, доходы, ключ)
+FINANCE_KEYS = ((True, True, "INCOME_RUB"),
+                (True, False, "EXPENDITURE_RUB"),
+                (False, True, "INCOME_USD"),
+                (False, False, "EXPENDITURE_USD"))
 
 
 def save_results_to_json_file(file_name: str, data: dict):
@@ -51,22 +77,24 @@ def save_results_to_json_file(file_name: str, data: dict):
         json.dump(data, file)
 
 
-def get_incomes_or_expenditures(ximc_user: XimcRedmine, rub: bool, income: bool, project_name: str, start_date: str,
-                                stop_date: str) -> float:
+def create_filters_for_incomes_or_expenditures(ximc_user: XimcRedmine, rub: bool, income: bool,
+                                               project_name: Union[str, List[str]], start_date: str,
+                                               stop_date: str) -> list:
     """
-    Function returns RUB or USD income or expenditure for given period.
+    Function creates filters to get RUB or USD income or expenditure for given period.
     :param ximc_user: authorized to Redmine user;
     :param rub: if True then RUB will be used otherwise USD;
     :param income: if True then income will be returned otherwise expenditure;
-    :param project_name: name of project;
+    :param project_name: name of project or list with names of projects;
     :param start_date: quarter start date;
     :param stop_date: quarter end date.
-    :return: RUB or USD income or expenditure.
+    :return: list with filters.
     """
 
     # Задаем фильтры
     ximc_user.clear_filters()
-    ximc_user.add_filter("Проект", "соответствует", project_name)
+    for name in [project_name] if isinstance(project_name, str) else project_name:
+        ximc_user.add_filter("Проект", "соответствует", name)
     ximc_user.add_filter("Статус", "соответствует", "Closed")
     ximc_user.add_filter("Трекер", "соответствует", "Payment")
     ximc_user.add_filter("Срок завершения", "между", start_date, stop_date)
@@ -78,9 +106,18 @@ def get_incomes_or_expenditures(ximc_user: XimcRedmine, rub: bool, income: bool,
         ximc_user.add_filter("Payment category", "соответствует", "Income")
     else:
         ximc_user.add_filter("Payment category", "не соответствует", "Income")
-    # Запрашиваем необходимые итоговые параметры
+    return copy.deepcopy(ximc_user.get_filters())
+
+
+def get_total_payment(totals: dict) -> float:
+    """
+    Function returns sum of cash and cashless payments.
+    :param totals: dictionary with values of totals options "Payment cash" and
+    "Payment cashless".
+    :return: total payment.
+    """
+
     total = 0
-    totals = ximc_user.get_totals("Payment cash", "Payment cashless")
     if totals["Payment cash"] is not None:
         total += totals["Payment cash"]
     if totals["Payment cashless"] is not None:
@@ -88,38 +125,527 @@ def get_incomes_or_expenditures(ximc_user: XimcRedmine, rub: bool, income: bool,
     return total
 
 
+def get_incomes_or_expenditures(ximc_user: XimcRedmine, rub: bool, income: bool, project_name: str, start_date: str,
+                                stop_date: str) -> float:
+    """
+    Function returns RUB or USD income or expenditure for given period.
+    :param ximc_user: authorized to Redmine user;
+    :param rub: if True then RUB will be used otherwise USD;
+    :param income: if True then income will be returned otherwise expenditure;
+    :param project_name: name of project;
+    :param start_date: quarter start date;
+    :param stop_date: quarter end date.
+    :return: RUB or USD income or expenditure.
+    """
+
+    create_filters_for_incomes_or_expenditures(ximc_user, rub, income, project_name, start_date, stop_date)
+    # Запрашиваем необходимые итоговые параметры
+    totals = ximc_user.get_totals("Payment cash", "Payment cashless")
+    return get_total_payment(totals)
+
+
+def create_filters_for_finances(ximc_user: XimcRedmine, project_names: List[str],
+                                periods: Dict[str, Tuple[str, str]], journal: Optional[ProgressJournal] = None,
+                                shard: Optional[Tuple[int, int]] = None) -> Dict[Tuple[str, str, str], list]:
+    """
+    Function creates filters for RUB and USD incomes and expenditures of projects
+    for given periods.
+    :param ximc_user: authorized to Redmine user;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param journal: journal of progress. Filters for cells that are in journal are
+    not created;
+    :param shard: index of shard (from 0) and number of shards. If given then
+    filters are created only for projects and periods of shard.
+    :return: dictionary with names of projects, names of periods and keys of cells
+    and lists with filters.
+    """
+
+    filters = {}
+    for project_name, period_name in get_cells(project_names, periods, shard):
+        start_date, stop_date = periods[period_name]
+        for rub, income, key in FINANCE_KEYS:
+            if journal is not None and journal.get(project_name, period_name, periods[period_name], key) is not None:
+                continue
+            filters[(project_name, period_name, key)] = create_filters_for_incomes_or_expenditures(
+                ximc_user, rub, income, project_name, start_date, stop_date)
+    ximc_user.clear_filters()
+    return filters
+
+
+def get_finances(ximc_user: XimcRedmine, project_names: List[str], periods: Dict[str, Tuple[str, str]],
+                 journal: Optional[ProgressJournal] = None, shard: Optional[Tuple[int, int]] = None) -> dict:
+    """
+    Function returns RUB and USD incomes and expenditures of projects for given
+    periods. Requests to Redmine are chosen by query planner and are executed
+    concurrently: RUB or USD incomes and expenditures of project for period are
+    received from one page grouped by payment category.
+    :param ximc_user: authorized to Redmine user;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param journal: journal of progress. Cells that are in journal are not
+    requested, every received cell is written to journal;
+    :param shard: index of shard (from 0) and number of shards. If given then only
+    projects and periods of shard are requested (see function get_shard of
+    sharding.py).
+    :return: dictionary with incomes and expenditures for every project and period
+    (of shard).
+    """
+
+    cells = get_cells(project_names, periods, shard)
+    result = {project_name: {} for project_name in project_names}
+    filters = create_filters_for_finances(ximc_user, project_names, periods, journal, shard)
+    for project_name, period_name in cells:
+        result[project_name][period_name] = {}
+        for _, _, key in FINANCE_KEYS:
+            if (project_name, period_name, key) not in filters:
+                result[project_name][period_name][key] = journal.get(project_name, period_name, periods[period_name],
+                                                                     key)
+    for (project_name, period_name, key), totals in ximc_user.get_totals_for_filters(filters, "Payment cash",
+                                                                                      "Payment cashless"):
+        result[project_name][period_name][key] = get_total_payment(totals)
+        if journal is not None:
+            journal.add(project_name, period_name, periods[period_name], key, result[project_name][period_name][key])
+    # Восстанавливаем привычный порядок ключей
+    keys = [key for _, _, key in FINANCE_KEYS]
+    for project_name, period_name in cells:
+        result[project_name][period_name] = {key: result[project_name][period_name][key] for key in keys}
+    return result
+
+
+def create_filters_for_changes(ximc_user: XimcRedmine, project_names: List[str], start_date: str,
+                               stop_date: str) -> list:
+    """
+    Function creates filters for all payments of projects with due date in given
+    period regardless of status, currency and payment category. Any change of
+    payments that can change incomes or expenditures changes fingerprint of issues
+    of these filters.
+    :param ximc_user: authorized to Redmine user;
+    :param project_names: names of projects;
+    :param start_date: period start date;
+    :param stop_date: period end date.
+    :return: list with filters.
+    """
+
+    ximc_user.clear_filters()
+    for name in project_names:
+        ximc_user.add_filter("Проект", "соответствует", name)
+    ximc_user.add_filter("Статус", "все")
+    ximc_user.add_filter("Трекер", "соответствует", "Payment")
+    ximc_user.add_filter("Срок завершения", "между", start_date, stop_date)
+    filters = copy.deepcopy(ximc_user.get_filters())
+    ximc_user.clear_filters()
+    return filters
+
+
+def find_changed_cells(ximc_user: XimcRedmine, project_names: List[str], periods: Dict[str, Tuple[str, str]],
+                       fingerprints: FingerprintStore) -> List[Tuple[str, str]]:
+    """
+    Function finds projects and periods whose payments have changed since
+    fingerprints were saved. At first all projects are checked by one request, so
+    run without changes needs one request. Then changed projects are found project
+    by project and their changed periods are found by halving of range of periods.
+    :param ximc_user: authorized to Redmine user;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param fingerprints: stored fingerprints. New fingerprints are kept in it until
+    they are saved.
+    :return: names of projects and names of periods.
+    """
+
+    start_date = min(start_date for start_date, _ in periods.values())
+    stop_date = max(stop_date for _, stop_date in periods.values())
+    if not fingerprints.is_changed(ximc_user, create_filters_for_changes(ximc_user, project_names, start_date,
+                                                                         stop_date)):
+        return []
+    # Фильтры задаются в общем объекте XimcRedmine, поэтому создаются по одному, а запросы выполняются параллельно
+    lock = threading.Lock()
+
+    def find_changed_periods_of_project(project_name: str) -> List[str]:
+        def create_filters(start: str, stop: str) -> list:
+            with lock:
+                return create_filters_for_changes(ximc_user, [project_name], start, stop)
+
+        return find_changed_periods(fingerprints, ximc_user, create_filters, periods)
+
+    with ThreadPoolExecutor(max_workers=WORKERS_NUMBER) as executor:
+        changed_periods = list(executor.map(find_changed_periods_of_project, project_names))
+    return [(project_name, period_name) for project_name, period_names in zip(project_names, changed_periods)
+            for period_name in period_names]
+
+
+def get_results_directory(granularity: str) -> str:
+    """
+    Function returns directory with results for periods of given length. Quarters
+    are saved to main directory.
+    :param granularity: length of periods.
+    :return: name of directory.
+    """
+
+    return RESULTS_DIRECTORY if granularity == "quarter" else f"{RESULTS_DIRECTORY}_{granularity}"
+
+
+def restore_unchanged_cells(journal: ProgressJournal, results: ResultsStore, project_names: List[str],
+                            periods: Dict[str, Tuple[str, str]], changed_cells: List[Tuple[str, str]]) -> int:
+    """
+    Function writes to journal values of cells that are saved in results and whose
+    payments have not changed, so they are not requested again. Cells of periods
+    with other dates and missing values are not restored.
+    :param journal: journal of progress;
+    :param results: saved results;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param changed_cells: names of projects and names of periods whose payments have
+    changed.
+    :return: number of restored values.
+    """
+
+    changed_cells = set(changed_cells)
+    stored = results.to_dict() if results.periods else {}
+    restored = 0
+    for project_name in project_names:
+        for period_name, period in periods.items():
+            if (project_name, period_name) in changed_cells or results.periods.get(period_name) != tuple(period):
+                continue
+            for _, _, key in FINANCE_KEYS:
+                value = stored.get(project_name, {}).get(period_name, {}).get(key)
+                if value is None or np.isnan(value) or journal.get(project_name, period_name, period, key) is not None:
+                    continue
+                journal.add(project_name, period_name, period, key, value)
+                restored += 1
+    return restored
+
+
+def aggregate_finances(payments: pd.DataFrame, project_names: List[str], periods: Dict[str, Tuple[str, str]]) -> dict:
+    """
+    Function computes RUB and USD incomes and expenditures of projects for given
+    periods from table with payments.
+    :param payments: table with columns due_date, project, subject, cf_28, cf_29
+    and cf_30 (see method XimcRedmine.get_payments);
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates.
+    :return: dictionary with incomes and expenditures for every project and period.
+    """
+
+    period_names = list(periods)
+    cube = np.zeros((len(project_names), len(period_names), len(FINANCE_KEYS)))
+    if len(payments):
+        project_index = pd.Index(project_names).get_indexer(payments["project"])
+        # Тема содержит/не содержит "валют", Payment category соответствует/не соответствует Income
+        rub = ~payments["subject"].fillna("").str.contains("валют", case=False, regex=False).to_numpy()
+        income = (payments["cf_28"] == "Income").to_numpy()
+        key_index = np.where(rub, 0, 2) + np.where(income, 0, 1)
+        amounts = (pd.to_numeric(payments["cf_29"], errors="coerce").fillna(0).to_numpy() +
+                   pd.to_numeric(payments["cf_30"], errors="coerce").fillna(0).to_numpy())
+        due_dates = pd.to_datetime(payments["due_date"]).to_numpy()
+        starts = pd.to_datetime([start_date for start_date, _ in periods.values()]).to_numpy()
+        stops = pd.to_datetime([stop_date for _, stop_date in periods.values()]).to_numpy()
+        rows, period_index = np.nonzero((due_dates[:, None] >= starts) & (due_dates[:, None] <= stops))
+        selected = project_index[rows] >= 0
+        rows, period_index = rows[selected], period_index[selected]
+        np.add.at(cube, (project_index[rows], period_index, key_index[rows]), amounts[rows])
+    return {project_name: {period_name: {key: float(cube[i, j, k]) for k, (_, _, key) in enumerate(FINANCE_KEYS)}
+                           for j, period_name in enumerate(period_names)}
+            for i, project_name in enumerate(project_names)}
+
+
+def get_finances_grouped(ximc_user: XimcRedmine, project_names: List[str], periods: Dict[str, Tuple[str, str]],
+                         journal: Optional[ProgressJournal] = None) -> dict:
+    """
+    Function returns RUB and USD incomes and expenditures of projects for given
+    periods. Incomes or expenditures of all projects for period are received by
+    one query with issues grouped by projects.
+    :param ximc_user: authorized to Redmine user;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param journal: journal of progress. Queries whose cells are in journal are not
+    executed, cells of every executed query are written to journal.
+    :return: dictionary with incomes and expenditures for every project and period.
+    """
+
+    result = {project_name: {period_name: {key: 0 for _, _, key in FINANCE_KEYS} for period_name in periods}
+              for project_name in project_names}
+    for period_name, (start_date, stop_date) in periods.items():
+        for rub, income, key in FINANCE_KEYS:
+            if journal is not None:
+                values = {project_name: journal.get(project_name, period_name, periods[period_name], key)
+                          for project_name in project_names}
+                if None not in values.values():
+                    for project_name, value in values.items():
+                        result[project_name][period_name][key] = value
+                    continue
+            create_filters_for_incomes_or_expenditures(ximc_user, rub, income, project_names, start_date, stop_date)
+            groups = ximc_user.get_grouped_totals("Проект", "Payment cash", "Payment cashless")
+            for project_name, totals in groups.items():
+                if project_name in result:
+                    result[project_name][period_name][key] = get_total_payment(totals)
+            if journal is not None:
+                for project_name in project_names:
+                    journal.add(project_name, period_name, periods[period_name], key,
+                                result[project_name][period_name][key])
+    ximc_user.clear_filters()
+    return result
+
+
+def get_finances_locally(source: Union[XimcRedmine, IssueStore], project_names: List[str],
+                         periods: Dict[str, Tuple[str, str]]) -> dict:
+    """
+    Function returns RUB and USD incomes and expenditures of projects for given
+    periods. All payments for whole date range are taken once (downloaded from
+    Redmine or read from local store) and then are aggregated locally.
+    :param source: authorized to Redmine user or local store with issues;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates.
+    :return: dictionary with incomes and expenditures for every project and period.
+    """
+
+    start_date = min(start_date for start_date, _ in periods.values())
+    stop_date = max(stop_date for _, stop_date in periods.values())
+    payments = pd.DataFrame(source.get_payments(start_date, stop_date),
+                            columns=["due_date", "project", "subject", "cf_28", "cf_29", "cf_30"])
+    return aggregate_finances(payments, project_names, periods)
+
+
+def get_finances_from_csv(ximc_user: XimcRedmine, project_names: List[str], periods: Dict[str, Tuple[str, str]]
+                          ) -> dict:
+    """
+    Function returns RUB and USD incomes and expenditures of projects for given
+    periods. All payments of projects for whole date range are exported from
+    Redmine as CSV once and are aggregated by chunks, so memory does not depend on
+    number of payments. Because Redmine limits number of exported issues, sum of
+    exported payments is checked against query totals, and sum of results is
+    checked against sum of exported payments, so payments that fell into no project
+    or period are not lost silently.
+    :param ximc_user: authorized to Redmine user;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates.
+    :return: dictionary with incomes and expenditures for every project and period.
+    """
+
+    start_date = min(start_date for start_date, _ in periods.values())
+    stop_date = max(stop_date for _, stop_date in periods.values())
+    ximc_user.clear_filters()
+    for project_name in project_names:
+        ximc_user.add_filter("Проект", "соответствует", project_name)
+    ximc_user.add_filter("Статус", "соответствует", "Closed")
+    ximc_user.add_filter("Трекер", "соответствует", "Payment")
+    ximc_user.add_filter("Срок завершения", "между", start_date, stop_date)
+    result = aggregate_finances(pd.DataFrame(columns=CSV_COLUMNS), project_names, periods)
+    exported_total = 0
+    for payments in ximc_user.get_issues_csv(*CSV_COLUMNS):
+        if payments["due_date"].isna().any():
+            raise ValueError("Exported payments have no due date")
+        exported_total += payments["cf_29"].fillna(0).sum() + payments["cf_30"].fillna(0).sum()
+        chunk_result = aggregate_finances(payments, project_names, periods)
+        for project_name in project_names:
+            for period_name in periods:
+                for key, value in chunk_result[project_name][period_name].items():
+                    result[project_name][period_name][key] += value
+    total = get_total_payment(ximc_user.get_totals("Payment cash", "Payment cashless"))
+    ximc_user.clear_filters()
+    if abs(total - exported_total) > 0.005:
+        raise ValueError(f"Sum of exported payments {exported_total} differs from query totals {total}, probably "
+                         f"export limit of Redmine is less than number of payments")
+    aggregated_total = sum(value for periods_for_project in result.values()
+                           for values in periods_for_project.values() for value in values.values())
+    if abs(aggregated_total - exported_total) > 0.005:
+        raise ValueError(f"Sum of results {aggregated_total} differs from sum of exported payments {exported_total}, "
+                         f"some payments belong to no project or period")
+    return result
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Save RUB and USD incomes and expenditures of payment projects")
+    parser.add_argument("--local", action="store_true",
+                        help="download all payments once and aggregate them locally")
+    parser.add_argument("--grouped", action="store_true",
+                        help="get incomes or expenditures of all projects for quarter by one grouped query")
+    parser.add_argument("--csv", action="store_true",
+                        help="export all payments once as CSV and aggregate them locally by chunks")
+    parser.add_argument("--store", action="store_true",
+                        help="synchronize issues updated since last run into local store and aggregate them locally")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="remove issues deleted in Redmine from local store")
+    parser.add_argument("--offline", action="store_true",
+                        help="take pages with issues only from cache and fail if page is not cached")
+    parser.add_argument("--granularity", nargs="+", choices=GRANULARITIES, default=["quarter"],
+                        help="granularities of periods. Values are received for finest required periods only, "
+                             "coarser periods are summed up locally")
+    parser.add_argument("--start", default=START_DATE, help="first date of periods in format YYYY-MM-DD")
+    parser.add_argument("--stop", default=STOP_DATE, help="last date of periods in format YYYY-MM-DD")
+    parser.add_argument("--resume", action="store_true",
+                        help="resume interrupted run, values that are in progress journal are not requested again")
+    parser.add_argument("--changed", action="store_true",
+                        help="request values only for projects and periods whose payments have changed since previous "
+                             "run (checked by fingerprints of issues), other values are taken from saved results")
+    parser.add_argument("--explain", action="store_true",
+                        help="print plan of requests for totals of payments and exit without requesting them")
+    parser.add_argument("--no-json", action="store_true",
+                        help="do not save results to JSON file with date and time in its name, save them only to "
+                             "directories of results")
+    parser.add_argument("--metrics",
+                        help="prefix of files to save metrics of run as JSON summary (.json), Prometheus text file "
+                             "(.prom) and Chrome trace (.trace.json)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file with login, password and network settings")
+    parser.add_argument("--rate", type=float,
+                        help="maximum number of requests per second of this process, overrides rate of config file")
+    parser.add_argument("--workers", type=int,
+                        help="split projects and periods into given number of shards by stable hash, compute shards "
+                             "by separate processes and merge their results")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="compute only shard I of N (for example on other machine) and save it to shard file "
+                             "instead of results")
+    parser.add_argument("--merge", type=int, metavar="N",
+                        help="merge files of N shards (copied from other machines) instead of requesting Redmine")
+    args = parser.parse_args()
+    if (args.workers is not None and args.workers < 1) or (args.merge is not None and args.merge < 1):
+        parser.error("--workers and --merge require positive number of shards")
+    if sum(option is not None for option in (args.workers, args.shard, args.merge)) > 1:
+        parser.error("--workers, --shard and --merge can not be used together")
+    if args.changed and (args.offline or args.workers or args.shard or args.merge):
+        parser.error("--changed can not be used with --offline, --workers, --shard and --merge")
+    # Шарды считаются только запросами итогов, другие способы расчета с ними не работают
+    if (args.workers or args.shard or args.merge) and (args.grouped or args.store or args.local or args.csv):
+        parser.error("--workers, --shard and --merge can not be used with --grouped, --store, --local and --csv")
+    if (args.workers or args.merge) and args.explain:
+        parser.error("--explain can not be used with --workers and --merge")
     config = configparser.ConfigParser()
-    config.read("config.ini")
-    user_name = config.get("MAIN", "login")
-    password = config.get("MAIN", "password")
-    try:
-        ximc_user = XimcRedmine(user_name, password)
-        ximc_user.auth()
-    except Exception:
-        print("User authorization failed")
-        sys.exit(0)
-
-    result = {}
+    config.read(args.config)
+    if args.rate is not None:
+        if not config.has_section("NETWORK"):
+            config.add_section("NETWORK")
+        config.set("NETWORK", "rate", str(args.rate))
+    # Значения запрашиваются только для самых коротких периодов, из которых складываются остальные
+    base_granularity = get_base_granularity(args.granularity)
+    base_periods = get_periods(args.start, args.stop, base_granularity)
     # Общий перечень проектов, включающий все, по нему можно общие сверять цифры с треккером
-    print("\nОбщие доходы/расходы по всем проектам за 2018-2021 по кварталам:")
     payment_list = MALT_PAYMENT_LIST + EZ_PAYMENT_LIST + RAW_PAYMENT_LIST + ZAP_PAYMENT_LIST
-    for project_name in payment_list:
-        result[project_name] = {}
-        print(project_name)
-        for quarter_name, quarter_period in QUARTERS.items():
-            start_date, stop_date = quarter_period
-            income_rub = get_incomes_or_expenditures(ximc_user, True, True, project_name, start_date, stop_date)
-            expenditure_rub = get_incomes_or_expenditures(ximc_user, True, False, project_name, start_date, stop_date)
-            income_usd = get_incomes_or_expenditures(ximc_user, False, True, project_name, start_date, stop_date)
-            expenditure_usd = get_incomes_or_expenditures(ximc_user, False, False, project_name, start_date, stop_date)
-            print(f"{quarter_name} ({quarter_period[0]} - {quarter_period[1]}):", income_rub, expenditure_rub,
-                  income_usd, expenditure_usd)
-            result[project_name][quarter_name] = {"INCOME_RUB": income_rub,
-                                                  "EXPENDITURE_RUB": expenditure_rub,
-                                                  "INCOME_USD": income_usd,
-                                                  "EXPENDITURE_USD": expenditure_usd}
-    # Сохраняем данные
-    file_name = f"finances {datetime.now().strftime('%Y-%m-%d %H-%M-%S')}.json"
-    save_results_to_json_file(file_name, result)
-    print(f"Результаты сохранены в файл '{file_name}'")
+    instrumentation = Instrumentation()
+    journal = None
+    fingerprints = None
+    if args.workers or args.merge:
+        shards = args.workers or args.merge
+        if args.workers:
+            # Общий лимит запросов к серверу делится между процессами шардов
+            arguments = ["--config", args.config, "--start", args.start, "--stop", args.stop, "--granularity",
+                         *args.granularity, "--rate", str(config.getfloat("NETWORK", "rate", fallback=RATE) / shards)]
+            arguments += ["--offline"] * args.offline + ["--resume"] * args.resume
+            failed = run_shards(__file__, arguments, shards)
+            if failed:
+                print(f"Не удалось получить шарды {', '.join(str(shard + 1) for shard in failed)} из {shards}, для "
+                      f"продолжения запустите скрипт с ключами --workers {shards} --resume")
+                sys.exit(1)
+        print(f"\nОбщие доходы/расходы по всем проектам с {args.start} по {args.stop}:")
+        try:
+            result = merge_shards([get_shard_file(shard, shards) for shard in range(shards)], payment_list,
+                                  base_periods, [key for _, _, key in FINANCE_KEYS])
+        except (OSError, ValueError) as exc:
+            print(f"Не удалось объединить результаты шардов: {exc}")
+            sys.exit(1)
+    else:
+        user_name = config.get("MAIN", "login")
+        password = config.get("MAIN", "password")
+        url = config.get("MAIN", "url", fallback=ut.REDMINE_URL)
+        try:
+            ximc_user = XimcRedmine(user_name, password, index_file=INDEX_FILE,
+                                    cache=ResponseCache(CACHE_FILE, offline=args.offline, revalidate=args.changed),
+                                    url=url, request_layer=create_request_layer(config, instrumentation),
+                                    filters_file=FILTERS_FILE,
+                                    date_format=config.get("MAIN", "date_format", raw=True, fallback=None))
+            ximc_user.auth()
+        except Exception:
+            print("User authorization failed")
+            sys.exit(0)
+        for change in ximc_user.load_filters():
+            print(f"Определение фильтра на сервере отличается от встроенного: {change}")
+        if args.explain:
+            # План строится по тем же фильтрам, что и в get_finances, запросы итогов не выполняются
+            plan = QueryPlan(create_filters_for_finances(ximc_user, payment_list, base_periods, shard=args.shard))
+            print(plan.explain())
+            sys.exit(0)
+        # Каждое полученное значение сразу пишется в журнал, чтобы прерванный запуск можно было продолжить.
+        # Журнал шарда является и его результатом
+        journal_file = JOURNAL_FILE if args.shard is None else get_shard_file(*args.shard)
+        journal = ProgressJournal(journal_file, resume=args.resume)
+        if args.resume:
+            print(f"Восстановлено значений из журнала '{journal_file}': {len(journal.cells)}")
+        try:
+            if args.shard is not None:
+                get_finances(ximc_user, payment_list, base_periods, journal, args.shard)
+                journal.close()
+                print(f"Шард {args.shard[0] + 1} из {args.shard[1]} сохранен в файл '{journal_file}'")
+                print(f"\n{instrumentation.format_summary()}")
+                sys.exit(0)
+            if args.changed:
+                # Отпечатки запрашиваются до расчета, поэтому изменения во время расчета найдет следующий запуск.
+                # Запрашиваются только изменившиеся ячейки, поэтому кэш проверяет все страницы, даже закрытых периодов
+                fingerprints = FingerprintStore(FINGERPRINTS_FILE, url)
+                changed_cells = find_changed_cells(ximc_user, payment_list, base_periods, fingerprints)
+                restored = restore_unchanged_cells(journal, ResultsStore(get_results_directory(base_granularity)),
+                                                   payment_list, base_periods, changed_cells)
+                print(f"Проектов и периодов с изменившимися платежами: {len(changed_cells)}, значений взято из "
+                      f"сохраненных результатов: {restored}")
+            print(f"\nОбщие доходы/расходы по всем проектам с {args.start} по {args.stop}:")
+            if args.store:
+                store = IssueStore(STORE_FILE)
+                print(f"Синхронизировано задач: {store.sync(ximc_user, args.reconcile)}")
+                result = get_finances_locally(store, payment_list, base_periods)
+                store.close()
+            elif args.grouped:
+                result = get_finances_grouped(ximc_user, payment_list, base_periods, journal)
+            elif args.csv:
+                result = get_finances_from_csv(ximc_user, payment_list, base_periods)
+            elif args.local:
+                result = get_finances_locally(ximc_user, payment_list, base_periods)
+            else:
+                result = get_finances(ximc_user, payment_list, base_periods, journal)
+        except (CacheMissError, PageParseError, RequestError, ValueError) as exc:
+            # Неполученные суммы нельзя считать нулевыми, поэтому результаты не сохраняются
+            journal.close()
+            print(f"Не удалось получить данные из Redmine: {exc}")
+            print("Полученные значения сохранены в журнал, для продолжения запустите скрипт с ключом --resume")
+            print(instrumentation.format_summary())
+            sys.exit(1)
+        except KeyboardInterrupt:
+            journal.close()
+            print("\nЗапуск прерван, для продолжения запустите скрипт с ключом --resume")
+            sys.exit(1)
+    for granularity in args.granularity:
+        periods = get_periods(args.start, args.stop, granularity)
+        result_for_granularity = (result if granularity == base_granularity
+                                  else roll_up_result(result, base_periods, periods))
+        for project_name in payment_list:
+            print(project_name)
+            for period_name, period in periods.items():
+                print(f"{period_name} ({period[0]} - {period[1]}):",
+                      *result_for_granularity[project_name][period_name].values())
+        # Сохраняем данные, новые периоды добавляются к ранее сохраненным. Кварталы сохраняются в основной каталог.
+        # Периоды, обрезанные ключами --start и --stop, не сохраняются, чтобы не смешивать их с полными
+        directory = get_results_directory(granularity)
+        whole_periods = {name: period for name, period in periods.items() if not is_cut_period(*period, granularity)}
+        if whole_periods:
+            ResultsStore(directory).save(result_for_granularity, whole_periods)
+            print(f"Результаты сохранены в каталог '{directory}'")
+        if len(whole_periods) < len(periods):
+            print(f"Неполные периоды не сохранены в каталог '{directory}': "
+                  f"{', '.join(name for name in periods if name not in whole_periods)}")
+        if not args.no_json:
+            suffix = "" if granularity == "quarter" else f" {granularity}"
+            file_name = f"finances{suffix} {datetime.now().strftime('%Y-%m-%d %H-%M-%S')}.json"
+            save_results_to_json_file(file_name, result_for_granularity)
+            print(f"Результаты сохранены в файл '{file_name}'")
+    # Отпечатки сохраняются только вместе с результатами, иначе изменения прерванного запуска были бы потеряны
+    if fingerprints is not None:
+        fingerprints.save()
+    # Результаты сохранены, журнал и файлы шардов, полученные этим запуском, больше не нужны
+    if journal is not None:
+        journal.remove()
+    for shard in range(args.workers or 0):
+        os.remove(get_shard_file(shard, args.workers))
+    # Выводим, на что ушло время работы
+    print(f"\n{instrumentation.format_summary()}")
+    if args.metrics:
+        instrumentation.save_json(f"{args.metrics}.json")
+        instrumentation.save_prometheus(f"{args.metrics}.prom")
+        instrumentation.save_chrome_trace(f"{args.metrics}.trace.json")
+        print(f"Метрики сохранены в файлы с префиксом '{args.metrics}'")
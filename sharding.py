@@ -0,0 +1,134 @@
+"""
+File with functions to split work of report run into shards by stable hash, to
+run shards in separate processes and to merge results of shards. Shards can be
+computed on several machines: every machine runs its shards with its own
+config.ini, then shard files are copied to one directory and merged.
+"""
+
+import json
+import subprocess
+import sys
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Файл результата шарда. Он же служит журналом прогресса шарда, поэтому прерванный шард можно продолжить
+SHARD_FILE = "finances.shard-{shard}-of-{shards}.jsonl"
+
+
+def get_cells(project_names: Iterable[str], periods: Dict[str, Tuple[str, str]],
+              shard: Optional[Tuple[int, int]] = None) -> List[Tuple[str, str]]:
+    """
+    Function returns pairs of project and period of shard.
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param shard: index of shard (from 0) and number of shards. If None then all
+    pairs are returned.
+    :return: names of projects and names of periods.
+    """
+
+    return [(project_name, period_name) for project_name in project_names for period_name in periods
+            if shard is None or get_shard(project_name, period_name, shard[1]) == shard[0]]
+
+
+def get_shard(project_name: str, period_name: str, shards: int) -> int:
+    """
+    Function returns shard of pair of project and period. Hash does not depend on
+    process and machine (unlike built-in hash of strings), so all workers split work
+    identically.
+    :param project_name: name of project;
+    :param period_name: name of period;
+    :param shards: number of shards.
+    :return: index of shard from 0.
+    """
+
+    return zlib.crc32(f"{project_name}\t{period_name}".encode("utf-8")) % shards
+
+
+def get_shard_file(shard: int, shards: int) -> str:
+    """
+    Function returns name of file with results of shard.
+    :param shard: index of shard from 0;
+    :param shards: number of shards.
+    :return: name of file.
+    """
+
+    return SHARD_FILE.format(shard=shard + 1, shards=shards)
+
+
+def merge_shards(file_names: Sequence[str], project_names: List[str], periods: Dict[str, Tuple[str, str]],
+                 keys: List[str]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Function merges results of shards. Result does not depend on order of files and
+    of cells in files. Cell received by several shards and cell that was not received
+    are errors. Cells of other projects or periods are ignored.
+    :param file_names: names of files with results of shards;
+    :param project_names: names of projects;
+    :param periods: dictionary with names of periods and their start and end dates;
+    :param keys: names of metrics.
+    :return: dictionary with values of metrics for every project and period.
+    """
+
+    values = {}
+    sources = {}
+    duplicates = []
+    for file_name in file_names:
+        with open(file_name, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Неполная строка прерванного шарда, ячейка будет найдена как отсутствующая
+                    continue
+                project_name, period_name, key = record["project"], record["period"], record["key"]
+                if (project_name not in project_names or periods.get(period_name) != (record["start"], record["stop"])
+                        or key not in keys):
+                    continue
+                cell = project_name, period_name, key
+                if cell in sources and sources[cell] != file_name:
+                    duplicates.append(f"{cell} in '{sources[cell]}' and '{file_name}'")
+                sources[cell] = file_name
+                values[cell] = record["value"]
+    missing = [(project_name, period_name, key) for project_name in project_names for period_name in periods
+               for key in keys if (project_name, period_name, key) not in values]
+    if duplicates or missing:
+        message = []
+        if duplicates:
+            message.append(f"{len(duplicates)} cells are received by several shards: {', '.join(duplicates[:5])}")
+        if missing:
+            message.append(f"{len(missing)} cells are missing: {', '.join(str(cell) for cell in missing[:5])}")
+        raise ValueError("; ".join(message))
+    return {project_name: {period_name: {key: values[(project_name, period_name, key)] for key in keys}
+                           for period_name in periods}
+            for project_name in project_names}
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Function parses shard of command line.
+    :param value: shard in format I/N, where I is number of shard from 1 and N is
+    number of shards.
+    :return: index of shard from 0 and number of shards.
+    """
+
+    try:
+        shard, shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard '{value}' is not in format I/N") from None
+    if not 1 <= shard <= shards:
+        raise ValueError(f"Number of shard must be from 1 to {shards}")
+    return shard - 1, shards
+
+
+def run_shards(script: str, arguments: List[str], shards: int) -> List[int]:
+    """
+    Function runs every shard in separate process of given script and waits for
+    all processes.
+    :param script: path of script that computes shard given by argument --shard;
+    :param arguments: other arguments of script;
+    :param shards: number of shards.
+    :return: indexes of shards whose processes failed.
+    """
+
+    processes = [subprocess.Popen([sys.executable, script, *arguments, "--shard", f"{shard + 1}/{shards}"])
+                 for shard in range(shards)]
+    return [shard for shard, process in enumerate(processes) if process.wait() != 0]
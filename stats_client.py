@@ -0,0 +1,141 @@
+"""
+File with thin client of local daemon with statistics of ximc Redmine (see
+stats_daemon.py). Client uses only standard library, so it is imported quickly
+by notebooks and scripts.
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+DAEMON_PORT = 8642
+DAEMON_URL = f"http://127.0.0.1:{DAEMON_PORT}"
+# Запросы финансов за много периодов выполняются долго, если их результатов еще нет в памяти демона
+TIMEOUT = 600
+
+
+class DaemonError(Exception):
+    """
+    Exception raised when daemon is not available or query failed.
+    """
+
+
+class StatsClient:
+    """
+    Class with client of local daemon with statistics. Filters are given as in
+    web interface of Redmine, for example [("Проект", "соответствует", "Payments"),
+    ("Статус", "closed")].
+    """
+
+    def __init__(self, url: str = DAEMON_URL, timeout: float = TIMEOUT):
+        """
+        :param url: url address of daemon;
+        :param timeout: timeout of queries in seconds.
+        """
+
+        self.timeout: float = timeout
+        self.url: str = url.rstrip("/")
+
+    def _request(self, path: str, request: Optional[dict] = None, timeout: Optional[float] = None) -> dict:
+        """
+        Method sends request to daemon.
+        :param path: path of request;
+        :param request: parameters of query. If None then GET request is sent,
+        otherwise POST request with JSON;
+        :param timeout: timeout of request in seconds. If None then timeout of
+        client is used.
+        :return: response of daemon.
+        """
+
+        data = None if request is None else json.dumps(request, ensure_ascii=False).encode("utf-8")
+        http_request = Request(f"{self.url}{path}", data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urlopen(http_request, timeout=self.timeout if timeout is None else timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as exc:
+            try:
+                message = json.loads(exc.read()).get("error")
+            except ValueError:
+                message = exc.reason
+            raise DaemonError(f"Query {path} failed: {message}") from None
+        except (URLError, OSError) as exc:
+            raise DaemonError(f"Daemon at {self.url} is not available: {exc}") from None
+
+    def get_finances(self, project_names: List[str], periods: Dict[str, Tuple[str, str]], grouped: bool = False,
+                     refresh: bool = False) -> dict:
+        """
+        Method returns RUB and USD incomes and expenditures of projects for given
+        periods (see function get_finances of save_finances.py).
+        :param project_names: names of projects;
+        :param periods: dictionary with names of periods and their start and end dates;
+        :param grouped: if True then incomes or expenditures of all projects for period
+        are received by one grouped query;
+        :param refresh: if True then result is requested from Redmine even if it is in
+        memory of daemon.
+        :return: dictionary with incomes and expenditures for every project and period.
+        """
+
+        request = {"projects": list(project_names), "periods": periods, "grouped": grouped}
+        return self._request("/finances" + "?refresh" * refresh, request)["result"]
+
+    def get_grouped_totals(self, group_by: str, filters: Iterable[Sequence], *totals_options,
+                           refresh: bool = False) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Method returns values for given totals options for every group of issues.
+        :param group_by: name of column to group issues by (for example "Проект",
+        "Payment category");
+        :param filters: filters as lists with name, operator and values;
+        :param totals_options: list with required totals options;
+        :param refresh: if True then result is requested from Redmine even if it is in
+        memory of daemon.
+        :return: dictionary with names of groups and values of required options.
+        """
+
+        request = {"group_by": group_by, "filters": [list(filter_obj) for filter_obj in filters],
+                   "options": list(totals_options)}
+        return self._request("/grouped_totals" + "?refresh" * refresh, request)["result"]
+
+    def get_projects(self) -> List[Tuple[int, str]]:
+        """
+        Method returns available projects.
+        :return: IDs and names of projects.
+        """
+
+        return [tuple(project) for project in self._request("/projects")["result"]]
+
+    def get_totals(self, filters: Iterable[Sequence], *totals_options, refresh: bool = False
+                   ) -> Dict[str, Optional[float]]:
+        """
+        Method returns values for given totals options for issues that satisfy filters.
+        :param filters: filters as lists with name, operator and values;
+        :param totals_options: list with required totals options;
+        :param refresh: if True then result is requested from Redmine even if it is in
+        memory of daemon.
+        :return: dictionary with values of required options.
+        """
+
+        request = {"filters": [list(filter_obj) for filter_obj in filters], "options": list(totals_options)}
+        return self._request("/totals" + "?refresh" * refresh, request)["result"]
+
+    def get_versions_for_project(self, project_name: str) -> List[Tuple[int, str]]:
+        """
+        Method returns versions for project with given name.
+        :param project_name: name of project.
+        :return: IDs and names of versions.
+        """
+
+        return [tuple(version) for version in self._request(f"/versions?project={quote(project_name)}")["result"]]
+
+    def is_running(self) -> bool:
+        """
+        Method checks whether daemon is available.
+        :return: True if daemon answers.
+        """
+
+        try:
+            self._request("/status", timeout=1)
+        except DaemonError:
+            return False
+        return True
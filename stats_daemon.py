@@ -0,0 +1,317 @@
+"""
+Local daemon with statistics of ximc Redmine. Daemon authorizes once, keeps
+indexes of names and recent results in memory and serves totals, grouped totals
+and finances over HTTP/JSON API on local address (see class StatsClient of
+stats_client.py). Results for open periods are refreshed in background on
+schedule, results for closed periods do not change and are not refreshed.
+
+Example:
+    python stats_daemon.py --port 8642
+"""
+
+import argparse
+import configparser
+import copy
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Hashable, Tuple
+from urllib.parse import parse_qs, urlsplit
+from request_layer import create_request_layer
+from response_cache import ResponseCache
+import save_finances as sf
+from stats_client import DAEMON_PORT
+import utils as ut
+from ximc import XimcRedmine
+
+CACHE_FILE = "responses.sqlite"
+# Число результатов в памяти, давно не запрашивавшиеся результаты вытесняются
+CACHE_SIZE = 1000
+CONFIG_FILE = "config.ini"
+FILTERS_FILE = "redmine_filters.json"
+INDEX_FILE = "redmine_index.json"
+# Период обновления результатов для незавершившихся периодов в секундах
+REFRESH_INTERVAL = 15 * 60
+
+
+class StatsDaemon:
+    """
+    Class with HTTP server that answers queries of statistics by one authorized
+    client of ximc Redmine. Results are kept in memory: repeated query is answered
+    without requests to Redmine.
+    """
+
+    def __init__(self, ximc_user: XimcRedmine, host: str = "127.0.0.1", port: int = DAEMON_PORT,
+                 refresh_interval: float = REFRESH_INTERVAL, cache_size: int = CACHE_SIZE):
+        """
+        :param ximc_user: authorized to Redmine user;
+        :param host: host of server. By default daemon is available only on local
+        machine;
+        :param port: port of server. If 0 then free port is chosen;
+        :param refresh_interval: period of refresh of results for open periods in
+        seconds;
+        :param cache_size: maximum number of results in memory.
+        """
+
+        self._cache: "OrderedDict[Hashable, Tuple[bool, float, dict]]" = OrderedDict()
+        self._cache_lock: threading.Lock = threading.Lock()
+        # Фильтры задаются в общем объекте XimcRedmine, поэтому запросы с фильтрами выполняются по одному
+        self._filters_lock: threading.Lock = threading.Lock()
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stats = self
+        self._stopped: threading.Event = threading.Event()
+        self._threads: list = []
+        self.cache_size: int = cache_size
+        self.refresh_interval: float = refresh_interval
+        self.started: float = time.time()
+        self.ximc_user: XimcRedmine = ximc_user
+
+    def _execute(self, kind: str, request: dict) -> Tuple[bool, dict]:
+        """
+        Method executes query.
+        :param kind: "totals", "grouped_totals" or "finances";
+        :param request: parameters of query. Filters are given as lists with name,
+        operator and values of every filter as in web interface, for example
+        [["Проект", "соответствует", "Payments"], ["Статус", "closed"]].
+        :return: True if query is for closed period, and result of query.
+        """
+
+        if kind == "finances":
+            periods = {period_name: tuple(period) for period_name, period in request["periods"].items()}
+            get_finances = sf.get_finances_grouped if request.get("grouped") else sf.get_finances
+            with self._filters_lock:
+                result = get_finances(self.ximc_user, request["projects"], periods)
+            closed = all(date.fromisoformat(stop_date) < date.today() for _, stop_date in periods.values())
+            return closed, result
+        if kind not in ("totals", "grouped_totals"):
+            raise ValueError(f"Unknown query '{kind}'")
+        options = request.get("options", [])
+        with self._filters_lock:
+            self.ximc_user.clear_filters()
+            try:
+                for filter_name, operator_name, *values in request.get("filters", []):
+                    self.ximc_user.add_filter(filter_name, operator_name, *values)
+                filters = copy.deepcopy(self.ximc_user.get_filters())
+                if kind == "grouped_totals":
+                    return ut.is_closed_period(filters), self.ximc_user.get_grouped_totals(request["group_by"],
+                                                                                            *options)
+            finally:
+                self.ximc_user.clear_filters()
+        # Запрос итогов не зависит от фильтров объекта XimcRedmine и выполняется без блокировки
+        return ut.is_closed_period(filters), dict(self.ximc_user.get_totals_for_filters({"totals": filters},
+                                                                                        *options))["totals"]
+
+    def _refresh(self):
+        """
+        Method refreshes results for open periods on schedule until daemon is
+        stopped. Queries are executed one by one, so load of Redmine is bounded.
+        """
+
+        while not self._stopped.wait(self.refresh_interval):
+            with self._cache_lock:
+                keys = [key for key, (closed, _, _) in self._cache.items() if not closed]
+            for key in keys:
+                if self._stopped.is_set():
+                    return
+                kind, request = key[0], json.loads(key[1])
+                try:
+                    closed, result = self._execute(kind, request)
+                except Exception as exc:
+                    print(f"Refresh of {kind} failed: {exc}", file=sys.stderr)
+                    continue
+                with self._cache_lock:
+                    if key in self._cache:
+                        self._cache[key] = closed, time.time(), result
+
+    def get_status(self) -> Dict[str, float]:
+        """
+        Method returns state of daemon.
+        :return: dictionary with user, start time, uptime and number of results in
+        memory.
+        """
+
+        with self._cache_lock:
+            cached = len(self._cache)
+        return {"user": getattr(self.ximc_user.user, "login", None), "started": self.started,
+                "uptime": time.time() - self.started, "cached": cached}
+
+    def query(self, kind: str, request: dict, refresh: bool = False) -> dict:
+        """
+        Method returns result of query from memory or executes query.
+        :param kind: "totals", "grouped_totals" or "finances";
+        :param request: parameters of query;
+        :param refresh: if True then query is executed even if its result is in
+        memory.
+        :return: result of query with time when it was received.
+        """
+
+        key = kind, json.dumps(request, ensure_ascii=False, sort_keys=True)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and not refresh:
+                self._cache.move_to_end(key)
+                return {"result": cached[2], "received": cached[1], "closed": cached[0]}
+        closed, result = self._execute(kind, request)
+        received = time.time()
+        with self._cache_lock:
+            self._cache[key] = closed, received, result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {"result": result, "received": received, "closed": closed}
+
+    def serve_forever(self):
+        """
+        Method starts refresh of results and serves requests until daemon is
+        stopped.
+        """
+
+        self.start(serve=False)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+
+    def start(self, serve: bool = True):
+        """
+        Method starts refresh of results and server in background threads.
+        :param serve: if False then only refresh of results is started.
+        """
+
+        self._threads = [threading.Thread(target=self._refresh, daemon=True)]
+        if serve:
+            self._threads.append(threading.Thread(target=self._server.serve_forever, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Method stops server and refresh of results.
+        """
+
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        """
+        :return: url address of daemon.
+        """
+
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Class handles requests to daemon.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, response: dict):
+        """
+        Method sends JSON response.
+        :param status: HTTP status;
+        :param response: body of response.
+        """
+
+        body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """
+        Method handles GET request: state of daemon, projects and versions.
+        """
+
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/status":
+                self._send(200, self.stats.get_status())
+            elif url.path == "/projects":
+                self._send(200, {"result": self.stats.ximc_user.get_projects(cached=True)})
+            elif url.path == "/versions":
+                self._send(200, {"result": self.stats.ximc_user.get_versions_for_project(params["project"][0],
+                                                                                         cached=True)})
+            else:
+                self._send(404, {"error": f"Unknown path {url.path}"})
+        except Exception as exc:
+            self._send(500, {"error": str(exc)})
+
+    def do_POST(self):
+        """
+        Method handles POST request with query of statistics. Path is kind of query,
+        body is JSON with parameters of query.
+        """
+
+        url = urlsplit(self.path)
+        kind = url.path.strip("/")
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError as exc:
+            self._send(400, {"error": f"Invalid JSON: {exc}"})
+            return
+        if kind not in ("totals", "grouped_totals", "finances"):
+            self._send(404, {"error": f"Unknown query '{kind}'"})
+            return
+        try:
+            self._send(200, self.stats.query(kind, request, refresh="refresh" in parse_qs(url.query)))
+        except (KeyError, TypeError, ValueError) as exc:
+            self._send(400, {"error": f"Invalid query: {exc!r}"})
+        except Exception as exc:
+            self._send(500, {"error": str(exc)})
+
+    def log_message(self, format: str, *args):
+        """
+        Method disables logging of requests.
+        """
+
+    @property
+    def stats(self) -> StatsDaemon:
+        """
+        :return: daemon served by handler.
+        """
+
+        return self.server.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local daemon with statistics of ximc Redmine")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT, help="port of daemon")
+    parser.add_argument("--refresh-interval", type=float, default=REFRESH_INTERVAL,
+                        help="period of refresh of results for open periods in seconds")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="maximum number of results in memory")
+    args = parser.parse_args()
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    try:
+        # Результаты в памяти демона уже заменяют кэш, поэтому страницы открытых периодов при каждом выполнении
+        # запроса проверяются по ETag, иначе обновление по расписанию и запрос с refresh вернули бы устаревшие итоги
+        ximc_user = XimcRedmine(config.get("MAIN", "login"), config.get("MAIN", "password"), index_file=INDEX_FILE,
+                                cache=ResponseCache(CACHE_FILE, ttl=0),
+                                url=config.get("MAIN", "url", fallback=ut.REDMINE_URL),
+                                request_layer=create_request_layer(config), filters_file=FILTERS_FILE)
+        ximc_user.auth(cached=True)
+    except Exception:
+        print("User authorization failed", file=sys.stderr)
+        sys.exit(1)
+    for change in ximc_user.load_filters():
+        print(f"Definition of filter in Redmine differs from built-in one: {change}", file=sys.stderr)
+    daemon = StatsDaemon(ximc_user, port=args.port, refresh_interval=args.refresh_interval,
+                         cache_size=args.cache_size)
+    print(f"Statistics daemon is available at {daemon.url}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,154 @@
+"""
+File with class to compute statistics of spent time locally. Time entries are
+downloaded once for whole date range and kept as columns of NumPy arrays, so spent
+hours for any grouping and any periods are computed without requests to Redmine.
+"""
+
+import sys
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from ximc import XimcRedmine
+
+GROUP_COLUMNS = {"project": "project_id",
+                 "user": "user_id",
+                 "activity": "activity_id",
+                 "issue": "issue_id"}
+
+
+class TimeEntries:
+    """
+    Class with time entries in columnar form: IDs of projects, users, activities
+    and issues, dates and hours are kept in NumPy arrays sorted by date, names of
+    projects, users and activities are kept once in dictionaries.
+    """
+
+    def __init__(self):
+        self.activity_id: np.ndarray = np.zeros(0, dtype=np.int32)
+        self.hours: np.ndarray = np.zeros(0, dtype=np.float64)
+        self.issue_id: np.ndarray = np.zeros(0, dtype=np.int32)
+        self.names: Dict[str, Dict[int, str]] = {"project": {}, "user": {}, "activity": {}}
+        self.project_id: np.ndarray = np.zeros(0, dtype=np.int32)
+        self.spent_on: np.ndarray = np.zeros(0, dtype="datetime64[D]")
+        self.user_id: np.ndarray = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        """
+        :return: number of time entries.
+        """
+
+        return len(self.hours)
+
+    def _find_ids(self, group: str, values: Iterable[Union[int, str]]) -> np.ndarray:
+        """
+        Method converts names of projects, users or activities to IDs. IDs are kept
+        as they are.
+        :param group: "project", "user", "activity" or "issue";
+        :param values: names or IDs.
+        :return: IDs. Unknown names are skipped.
+        """
+
+        ids_by_name = {name: entity_id for entity_id, name in self.names.get(group, {}).items()}
+        ids = []
+        for value in values:
+            if isinstance(value, str) and value in ids_by_name:
+                ids.append(ids_by_name[value])
+            elif not isinstance(value, str):
+                ids.append(value)
+        return np.array(ids, dtype=np.int64)
+
+    def _get_label(self, group: str, entity_id: int) -> Union[int, str]:
+        """
+        Method returns label of project, user, activity or issue for tables.
+        :param group: "project", "user", "activity" or "issue";
+        :param entity_id: ID.
+        :return: name or ID if name is unknown.
+        """
+
+        return self.names.get(group, {}).get(entity_id, entity_id)
+
+    def get_spent_hours(self, by: Union[str, Sequence[str]] = "project",
+                        periods: Optional[Dict[str, Tuple[str, str]]] = None,
+                        **filters: Iterable[Union[int, str]]) -> pd.DataFrame:
+        """
+        Method returns spent hours for every period and every combination of values
+        of given columns.
+        :param by: "project", "user", "activity", "issue" or sequence of them, for
+        example ("project", "user");
+        :param periods: dictionary with names of periods and their start and end dates
+        (see function get_periods of periods.py). Periods can overlap. If None then
+        totals for all time entries are returned;
+        :param filters: names or IDs of projects, users, activities or issues to take
+        into account, for example project=["EP-software"], user=["dasha"].
+        :return: table with periods in rows and groups in columns (names of projects,
+        users and activities, IDs of issues). If several columns are given then
+        columns of table are tuples.
+        """
+
+        groups = [by] if isinstance(by, str) else list(by)
+        for group in groups + list(filters):
+            if group not in GROUP_COLUMNS:
+                raise ValueError(f"Unknown column '{group}', available: {', '.join(GROUP_COLUMNS)}")
+        mask = np.ones(len(self), dtype=bool)
+        for group, values in filters.items():
+            mask &= np.isin(getattr(self, GROUP_COLUMNS[group]), self._find_ids(group, values))
+        keys = np.stack([getattr(self, GROUP_COLUMNS[group]) for group in groups], axis=1)
+        unique_keys, codes = np.unique(keys, axis=0, return_inverse=True)
+        codes = codes.reshape(-1)
+        hours = np.where(mask, self.hours, 0)
+        if periods is None:
+            periods = {"total": (None, None)}
+        table = np.zeros((len(periods), len(unique_keys)))
+        for index, (start_date, stop_date) in enumerate(periods.values()):
+            # Трудозатраты отсортированы по дате, поэтому период соответствует непрерывному срезу
+            start = 0 if start_date is None else np.searchsorted(self.spent_on, np.datetime64(start_date), "left")
+            stop = (len(self) if stop_date is None
+                    else np.searchsorted(self.spent_on, np.datetime64(stop_date), "right"))
+            table[index] = np.bincount(codes[start:stop], weights=hours[start:stop], minlength=len(unique_keys))
+        # Группы без единой подходящей записи не выводятся
+        used = np.bincount(codes[mask], minlength=len(unique_keys)) > 0
+        columns = [tuple(self._get_label(group, int(value)) for group, value in zip(groups, key))
+                   for key in unique_keys[used]]
+        if len(groups) == 1:
+            columns = [column[0] for column in columns]
+        return pd.DataFrame(table[:, used], index=list(periods), columns=columns)
+
+    def load(self, ximc_user: XimcRedmine, start_date: str, stop_date: str, **filters):
+        """
+        Method downloads time entries spent in given period by concurrent requests of
+        pages, previously loaded time entries are replaced.
+        :param ximc_user: authorized to Redmine user;
+        :param start_date: period start date;
+        :param stop_date: period end date;
+        :param filters: filters for time entries in format of REST API (for example
+        project_id, user_id).
+        """
+
+        project_ids = []
+        user_ids = []
+        activity_ids = []
+        issue_ids = []
+        hours = []
+        dates = []
+        names = {"project": {}, "user": {}, "activity": {}}
+        with ximc_user.instrumentation.span("load_time_entries"):
+            pages = ximc_user.get_time_entry_pages(start_date, stop_date, **filters)
+            for entry in (entry for page in pages for entry in page):
+                for group, ids in (("project", project_ids), ("user", user_ids), ("activity", activity_ids)):
+                    reference = entry.get(group) or {}
+                    ids.append(reference.get("id", 0))
+                    if "name" in reference:
+                        names[group][reference["id"]] = sys.intern(reference["name"])
+                issue_ids.append((entry.get("issue") or {}).get("id", 0))
+                hours.append(entry.get("hours") or 0)
+                dates.append(entry["spent_on"])
+        spent_on = np.array(dates, dtype="datetime64[D]")
+        order = np.argsort(spent_on, kind="stable")
+        self.spent_on = spent_on[order]
+        self.project_id = np.array(project_ids, dtype=np.int32)[order]
+        self.user_id = np.array(user_ids, dtype=np.int32)[order]
+        self.activity_id = np.array(activity_ids, dtype=np.int32)[order]
+        self.issue_id = np.array(issue_ids, dtype=np.int32)[order]
+        self.hours = np.array(hours, dtype=np.float64)[order]
+        self.names = names
+        ximc_user.instrumentation.count("time_entries", len(self))
@@ -2,7 +2,10 @@
 File with useful functions and constants.
 """
 
-from typing import Optional, Tuple
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+REDMINE_URL = "https://ximc.ru"
 
 BRACKET_CONVERTER = {"[": "%5B",
                      "]": "%5D"}
@@ -129,6 +132,22 @@ AVAILABLE_FILTERS = {
     "watcher_id": {"type": "list", "name": ("наблюдатель", "watcher")},
     "issue_tags": {"type": "text", "name": ("метки", "tags")}}
 
+GROUP_BY_OPTIONS = {"проект": "project",
+                    "project": "project",
+                    "трекер": "tracker",
+                    "tracker": "tracker",
+                    "статус": "status",
+                    "status": "status",
+                    "приоритет": "priority",
+                    "priority": "priority",
+                    "назначена": "assigned_to",
+                    "assignee": "assigned_to",
+                    "версия": "fixed_version",
+                    "target version": "fixed_version",
+                    "payment category": "cf_28",
+                    "company": "cf_41",
+                    "валюта": "cf_42"}
+
 FILTERS_WITH_USERS = ("author_id", "assigned_to_id", "updated_by", "last_updated_by", "watcher_id")
 
 TOTALS_OPTIONS = {"оценка временных затрат": "estimated_hours",
@@ -140,16 +159,69 @@ TOTALS_OPTIONS = {"оценка временных затрат": "estimated_hou
                   "rate": "cf_38",
                   "payment tail": "cf_39"}
 
+# Обратные индексы: подпись в нижнем регистре -> идентификатор фильтра, оператора или значения фильтра.
+# Строятся функцией build_indexes из таблиц выше, чтобы поиск при каждом add_filter не перебирал таблицы
+FILTER_INDEX: Dict[str, str] = {}
+OPERATOR_INDEX: Dict[str, str] = {}
+VALUE_INDEX: Dict[str, Dict[str, str]] = {}
+# Встроенный идентификатор настраиваемого поля -> идентификатор на сервере, если он изменился.
+# Заполняется при загрузке определений фильтров (см. FilterVocabulary.apply)
+FIELD_IDS: Dict[str, str] = {}
 
-def create_url(filters: list, totals_options: dict) -> str:
+
+def build_indexes():
+    """
+    Function builds reverse indexes of labels of filters, operators and values of
+    filters. Function must be called after AVAILABLE_FILTERS or OPERATOR_LABELS are
+    changed. If label belongs to several items then the first one is used.
     """
-    Function creates url address to get required data from ximc.
+
+    FILTER_INDEX.clear()
+    OPERATOR_INDEX.clear()
+    VALUE_INDEX.clear()
+    for real_name, friendly_names in OPERATOR_LABELS.items():
+        for friendly_name in friendly_names:
+            OPERATOR_INDEX.setdefault(friendly_name.casefold(), real_name)
+    for real_name, available_filter in AVAILABLE_FILTERS.items():
+        for friendly_name in available_filter["name"]:
+            FILTER_INDEX.setdefault(friendly_name.casefold(), real_name)
+        values = VALUE_INDEX.setdefault(real_name, {})
+        for available_value, value_id in available_filter.get("values", []):
+            for friendly_value in available_value:
+                values.setdefault(friendly_value.casefold(), value_id)
+
+
+def create_url(filters: list, totals_options: dict, per_page: int = 1, columns: Iterable[str] = ("id",),
+               redmine_url: str = REDMINE_URL, group_by: Optional[str] = None, page: int = 1,
+               file_format: Optional[str] = None, sort: str = "id:desc") -> str:
+    """
+    Function creates url address to get required data from ximc. By default page
+    contains as few issues and columns as possible because only totals are read.
     :param filters: filters for required data;
-    :param totals_options: list of required options.
+    :param totals_options: list of required options;
+    :param per_page: number of issues on page (server can replace it with the
+    nearest allowed value);
+    :param columns: columns of table with issues;
+    :param redmine_url: url address of Redmine;
+    :param group_by: real name of column to group issues by;
+    :param page: number of page;
+    :param file_format: format of export (for example "csv"). If None then url of
+    HTML page is created. Export contains all issues (up to export limit set in
+    Redmine settings) regardless of number of issues on page;
+    :param sort: column and direction of sorting of issues.
     :return: url address.
     """
 
-    url = f"https://ximc.ru/issues?utf8=✓&set_filter=1&sort=id%3Adesc"
+    path = "issues" if file_format is None else f"issues.{file_format}"
+    url = f"{redmine_url}/{path}?utf8=✓&set_filter=1&sort={sort.replace(':', '%3A')}&per_page={per_page}"
+    if file_format is not None:
+        url += "&encoding=UTF-8"
+    if group_by is not None:
+        url += f"&group_by={group_by}"
+    if page > 1:
+        url += f"&page={page}"
+    for column in columns:
+        url += f"&c%5B%5D={column}"
     # Part with filters
     for filter_obj in filters:
         filter_name = filter_obj.get("filter")
@@ -185,6 +257,18 @@ def decode_symbols(word: str) -> str:
     return decoded_word
 
 
+def get_field_id(field_id: str) -> str:
+    """
+    Function returns ID of custom field in Redmine for built-in ID (for example
+    "cf_29"). Built-in IDs are used as names of columns in code, so columns keep
+    their names when custom fields are renumbered in Redmine.
+    :param field_id: built-in ID of custom field.
+    :return: ID of custom field in Redmine.
+    """
+
+    return FIELD_IDS.get(field_id, field_id)
+
+
 def find_operator(operator_name: str) -> Optional[str]:
     """
     Function finds real name (identifier) for operator with given user friendly
@@ -193,10 +277,7 @@ def find_operator(operator_name: str) -> Optional[str]:
     :return: real name of operator.
     """
 
-    for real_name, friendly_name in OPERATOR_LABELS.items():
-        if operator_name in friendly_name:
-            return real_name
-    return None
+    return OPERATOR_INDEX.get(operator_name.casefold())
 
 
 def find_real_filter_name_and_value(filter_name: str, value: Optional[str] = None) -> Optional[Tuple[str, str]]:
@@ -207,13 +288,37 @@ def find_real_filter_name_and_value(filter_name: str, value: Optional[str] = Non
     :return: real name of filter.
     """
 
-    for real_name, available_filter in AVAILABLE_FILTERS.items():
-        if filter_name.lower() in available_filter["name"]:
-            if value is not None:
-                available_values = available_filter.get("values", [])
-                for available_value, value_id in available_values:
-                    if value.lower() in available_value:
-                        value = value_id
-                        break
-            return real_name, value
-    return None
+    real_name = FILTER_INDEX.get(filter_name.casefold())
+    if real_name is None:
+        return None
+    if isinstance(value, str):
+        value = VALUE_INDEX[real_name].get(value.casefold(), value)
+    return real_name, value
+
+
+def is_closed_period(filters: list, today: Optional[date] = None) -> bool:
+    """
+    Function checks whether filters select issues only for period that has already
+    ended. It is so if there is a filter by date with explicit end date in the past.
+    :param filters: filters for required data;
+    :param today: current date.
+    :return: True if period is closed.
+    """
+
+    today = today or date.today()
+    for filter_obj in filters:
+        filter_type = AVAILABLE_FILTERS.get(filter_obj.get("filter"), {}).get("type")
+        filter_values = filter_obj.get("values")
+        if filter_type not in ("date", "date_past") or filter_obj.get("operator") not in ("=", "<=", "><") or \
+                not filter_values:
+            continue
+        try:
+            end_date = date.fromisoformat(str(filter_values[-1]))
+        except ValueError:
+            continue
+        if end_date < today:
+            return True
+    return False
+
+
+build_indexes()
@@ -2,19 +2,53 @@
 File with class to work with Ximc Redmine.
 """
 
+import html as html_module
+import io
 import re
-import time
-from typing import Callable, Dict, Iterable, List, Optional, Tuple
-import requests
-from bs4 import BeautifulSoup
-from redminelib import Redmine
-from redminelib.exceptions import ForbiddenError
-from redminelib.resources.standard import Project, User
+import threading
+from collections import deque
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
 import utils as ut
+from filter_vocabulary import FILTERS_TTL, FilterVocabulary
+from instrumentation import Instrumentation
+from name_index import INDEX_TTL, NameIndex
+from query_planner import QueryPlan
+from request_layer import RequestError, RequestLayer
+from response_cache import CacheMissError, ResponseCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import requests
+    from redminelib import Redmine
+    from redminelib.managers import ResourceManager
+    from redminelib.resources.standard import Project, User
 
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
                          "Chrome/99.0.4844.82 Safari/537.36"}
-MAX_ATTEMPTS_NUMBER = 5
+CHUNK_SIZE = 4096
+CSV_CHUNK_SIZE = 10000
+CSV_DATE_COLUMNS = ("closed_on", "created_on", "due_date", "start_date", "updated_on")
+# Форматы дат Redmine по умолчанию для языков, в которых поля CSV разделяются так (русский и английский)
+CSV_DATE_FORMATS = {";": "%d.%m.%Y", ",": "%m/%d/%Y"}
+CSV_NUMERIC_COLUMNS = ("cf_29", "cf_30", "cf_38", "cf_39", "done_ratio", "estimated_hours", "id", "spent_hours",
+                       "total_estimated_hours", "total_spent_hours")
+DRAIN_LIMIT = 16 * 1024
+PAYMENT_FIELDS = ("cf_28", "cf_29", "cf_30")
+GROUP_NAME_PATTERN = re.compile(r'<span class="name">(.*?)</span>', re.DOTALL)
+GROUP_PATTERN = re.compile(r'<tr class="group[^"]*">(.*?)</tr>', re.DOTALL)
+GROUPS_PER_PAGE = 100
+PAGE_SIZE = 100
+# Формат времени в REST API Redmine
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+NEXT_PAGE_PATTERN = re.compile(r'class="next')
+QUERY_TOTALS_PATTERN = re.compile(r'<p class="query-totals">(.*?)</p>|<p class="nodata">', re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+TOTAL_PATTERN = re.compile(r'<span class="total-for-([\w-]+)">.*?<span class="value">([^<]*)</span>', re.DOTALL)
+# Данные пользователя, которые сохраняются в снимке индексов для повторной авторизации без запроса
+USER_FIELDS = ("firstname", "id", "lastname", "login")
+WORKERS_NUMBER = 8
 
 
 def check_auth(func: Callable):
@@ -23,53 +57,266 @@ def check_auth(func: Callable):
     :param func: decorated method.
     """
 
-    def wrapper(self, *args):
+    def wrapper(self, *args, **kwargs):
         """
         :param self: object of class;
-        :param args: arguments for method.
+        :param args: arguments for method;
+        :param kwargs: keyword arguments for method.
         """
 
-        if self.user is None:
-            print("User is not logged in to https://ximc.ru")
+        if self._user_data is None:
+            print(f"User is not logged in to {self.url}")
             return
-        return func(self, *args)
+        return func(self, *args, **kwargs)
 
     return wrapper
 
 
+class PageParseError(Exception):
+    """
+    Exception is raised if values of totals options can not be found on page with
+    issues.
+    """
+
+
 class XimcRedmine:
     """
     Class to work with ximc Redmine.
     """
 
-    def __init__(self, username: str, password: str):
+    def __init__(self, username: str, password: str, index_file: Optional[str] = None, index_ttl: float = INDEX_TTL,
+                 cache: Optional[ResponseCache] = None, url: str = ut.REDMINE_URL,
+                 request_layer: Optional[RequestLayer] = None, instrumentation: Optional[Instrumentation] = None,
+                 filters_file: Optional[str] = None, filters_ttl: float = FILTERS_TTL,
+                 date_format: Optional[str] = None):
         """
         :param username: username in ximc Redmine;
-        :param password: password to ximc Redmine.
-        """
-
-        self._all_projects = None
+        :param password: password to ximc Redmine;
+        :param index_file: name of file with snapshot of indexes of names of projects,
+        users and versions. If None then snapshot is not used;
+        :param index_ttl: lifetime of snapshot in seconds;
+        :param cache: cache for pages with issues. If None then pages are not cached;
+        :param url: url address of Redmine;
+        :param request_layer: layer that limits, retries and times out all requests
+        to Redmine. If None then layer with default settings is used;
+        :param instrumentation: object to measure operations of client. If None then
+        object of request layer is used;
+        :param filters_file: name of file with snapshot of definitions of filters
+        received from Redmine (see method load_filters). If None then snapshot is not
+        used;
+        :param filters_ttl: lifetime of snapshot of definitions of filters in seconds;
+        :param date_format: format of dates set in settings of Redmine (for example
+        "%Y-%m-%d"), it is used to read dates from CSV export. If None then default
+        format of language of user is used.
+        """
+
+        self._cache: Optional[ResponseCache] = cache
+        self._date_format: Optional[str] = date_format
         self._filters: list = []
+        self._index: NameIndex = NameIndex(self._get_redmine, index_file, index_ttl, url, username)
+        self._layer: RequestLayer = (RequestLayer(instrumentation=instrumentation) if request_layer is None
+                                     else request_layer)
+        self._lock: threading.Lock = threading.Lock()
         self._password: str = password
         self._projects: list = []
-        self._redmine: Redmine = Redmine("https://ximc.ru", username=username, password=password)
+        # Объекты python-redmine и requests создаются при первом запросе, чтобы запросы из кэша и снимков не
+        # загружали эти модули
+        self._redmine: Optional["Redmine"] = None
+        self._session: Optional["requests.Session"] = None
         self._totals_options: dict = {}
+        self._user: Optional["User"] = None
+        self._user_data: Optional[dict] = None
         self._username: str = username
-        self.user: User = None
+        self._vocabulary: FilterVocabulary = FilterVocabulary(filters_file, filters_ttl)
+        self.instrumentation: Instrumentation = (self._layer.instrumentation if instrumentation is None
+                                                 else instrumentation)
+        self.url: str = url
+
+    @staticmethod
+    def _check_permission(manager: "ResourceManager", resource_name: str):
+        """
+        Method checks permission to work with resources by request of one resource.
+        :param manager: manager of resources;
+        :param resource_name: name of resources for message.
+        """
+
+        from redminelib.exceptions import ForbiddenError
+
+        try:
+            len(manager.all(limit=1))
+        except ForbiddenError:
+            print(f"You do not have permission to work with {resource_name}")
+            raise
 
-    def _find_project_id(self, project_name: str) -> Optional[str]:
+    @staticmethod
+    def _create_session(username: str, password: str) -> "requests.Session":
+        """
+        Method creates HTTP session with keep-alive connections that is shared by all
+        requests to pages with issues.
+        :param username: username in ximc Redmine;
+        :param password: password to ximc Redmine.
+        :return: HTTP session.
+        """
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.auth = (username, password)
+        session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WORKERS_NUMBER)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _find_project_id(self, project_name: str) -> Optional[int]:
         """
         Method searches identifier of project with given name.
         :param project_name: project name.
         :return: project identifier.
         """
 
-        projects = self._redmine.project.all()
-        if isinstance(projects, Iterable):
-            for project in projects:
-                if project.name == project_name:
-                    return project.id
-        return None
+        return self._index.find_project_id(project_name)
+
+    def _get_grouped_totals(self, filters: list, real_group_by: str, options: List[str]
+                            ) -> Tuple[Dict[str, Optional[float]], Dict[str, Dict[str, Optional[float]]]]:
+        """
+        Method returns query totals and totals of every group of issues. Redmine
+        shows group only on pages where there are issues of group, so pages are
+        requested until the last one.
+        :param filters: list with filters;
+        :param real_group_by: real name of column to group issues by;
+        :param options: names of totals options.
+        :return: query totals and dictionary with names of groups and their totals.
+        """
+
+        closed = ut.is_closed_period(filters)
+        query_totals = {option: None for option in options}
+        groups = {}
+        page = 1
+        while True:
+            url = ut.create_url(filters, options, per_page=GROUPS_PER_PAGE, columns=(real_group_by,),
+                                redmine_url=self.url, group_by=real_group_by, page=page)
+            html = self._get_issues_page(url, closed, whole_page=True)
+            if page == 1:
+                self._parse_totals(html, query_totals)
+            for group_html in GROUP_PATTERN.findall(html):
+                name_match = GROUP_NAME_PATTERN.search(group_html)
+                name = "" if name_match is None else html_module.unescape(TAG_PATTERN.sub("", name_match.group(1)))
+                totals = {option: None for option in options}
+                values = dict(TOTAL_PATTERN.findall(group_html))
+                for option in options:
+                    real_option_name = ut.TOTALS_OPTIONS[option.lower()].replace("_", "-")
+                    if real_option_name in values:
+                        totals[option] = float(values[real_option_name])
+                groups[name.strip()] = totals
+            if NEXT_PAGE_PATTERN.search(html) is None:
+                break
+            page += 1
+        return query_totals, groups
+
+    def _get_issues_page(self, url: str, closed: bool = False, whole_page: bool = False) -> str:
+        """
+        Method downloads page with issues. If cache is used then page is taken from
+        cache when possible. If page can not be downloaded then RequestError is
+        raised.
+        :param url: url address of page with filtered issues;
+        :param closed: if True then page is for period that has already ended;
+        :param whole_page: if True then whole page is read, otherwise page is read
+        until block with query totals.
+        :return: HTML of page.
+        """
+
+        key = ResponseCache.get_key(self._username, url)
+        cached = None if self._cache is None else self._cache.get(key)
+        if cached is not None and (self._cache.offline or self._cache.is_fresh(cached)):
+            self.instrumentation.count("cache_hits")
+            return cached.body
+        if self._cache is not None:
+            self.instrumentation.count("cache_misses")
+            if self._cache.offline:
+                raise CacheMissError(f"There is no response in cache for {url}")
+        import requests
+
+        headers = {} if cached is None or cached.etag is None else {"If-None-Match": cached.etag}
+        with self.instrumentation.span("fetch", url=url):
+            with self._layer.request(self._get_session(), "get", url, headers=headers, stream=True) as response:
+                if response.status_code == 304 and cached is not None:
+                    self.instrumentation.count("cache_revalidations")
+                    self._cache.touch(key)
+                    return cached.body
+                if not response.ok:
+                    raise RequestError(f"Request to {url} failed with status {response.status_code}")
+                try:
+                    html = response.text if whole_page else self._read_until_totals(response)
+                except requests.RequestException as exc:
+                    raise RequestError(f"Reading of response from {url} failed: {exc}") from exc
+                etag = response.headers.get("ETag")
+        self.instrumentation.count("bytes_received", len(html.encode("utf-8")))
+        if self._cache is not None:
+            self._cache.put(key, html, etag, closed)
+        return html
+
+    def _get_pages(self, path: str, container: str, params: dict, workers: int = WORKERS_NUMBER
+                   ) -> Iterator[List[dict]]:
+        """
+        Method yields pages of resources of REST API. Total number of resources is
+        taken from the first page, remaining pages are requested concurrently with
+        maximum page size. Only limited number of pages is requested ahead, so
+        memory does not depend on number of resources if pages are processed as they
+        are yielded.
+        :param path: path of resources, for example "/issues.json";
+        :param container: key of resources in response;
+        :param params: parameters of query string;
+        :param workers: number of workers that execute requests.
+        :return: lists with resources of pages in order of pages.
+        """
+
+        url = f"{self.url}{path}"
+
+        def get_page(offset: int) -> dict:
+            return self._get_redmine().engine.request("get", url, params=dict(params, limit=PAGE_SIZE, offset=offset))
+
+        first_page = get_page(0)
+        yield first_page[container]
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = deque()
+            for offset in range(PAGE_SIZE, first_page.get("total_count", 0), PAGE_SIZE):
+                futures.append(executor.submit(get_page, offset))
+                if len(futures) >= 2 * workers:
+                    yield futures.popleft().result()[container]
+            while futures:
+                yield futures.popleft().result()[container]
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _get_redmine(self) -> "Redmine":
+        """
+        Method returns Redmine object, object is created by the first call.
+        :return: Redmine object.
+        """
+
+        with self._lock:
+            if self._redmine is None:
+                from redminelib import Redmine
+                from layer_engine import LayerEngine
+
+                self._redmine = Redmine(self.url, engine=LayerEngine, request_layer=self._layer,
+                                        username=self._username, password=self._password)
+            return self._redmine
+
+    def _get_session(self) -> "requests.Session":
+        """
+        Method returns HTTP session for pages with issues, session is created by the
+        first call.
+        :return: HTTP session.
+        """
+
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session(self._username, self._password)
+            return self._session
 
     def _get_user_id(self, username: str) -> Optional[int]:
         """
@@ -78,72 +325,108 @@ class XimcRedmine:
         :return: user ID.
         """
 
-        def get_user_from_memberships(memberships) -> Optional[int]:
-            for membership in memberships:
-                user = getattr(membership, "user", None)
-                if user is not None and user.name == username:
-                    return user.id
-            return None
-
-        if self._projects:
-            for project_id, _ in self._projects:
-                memberships = self._redmine.project_membership.filter(project_id=project_id)
-                user_id = get_user_from_memberships(memberships)
-                if user_id is not None:
-                    return user_id
-        for project in self._all_projects:
-            user_id = get_user_from_memberships(project.memberships)
-            if user_id is not None:
-                return user_id
-        return None
+        return self._index.find_user_id(username, [project_id for project_id, _ in self._projects])
 
     def _get_version_id(self, version_name: str) -> Optional[int]:
         """
         Method returns ID of version for given project.
-        :param version_name: name of project version.
+        :param version_name: name of version.
         :return: version ID.
         """
 
-        if self._projects:
-            for project_id, _ in self._projects:
-                versions = self._redmine.version.filter(project_id=project_id)
-                for version in versions:
-                    if version.name == version_name:
-                        return version.id
-        for project in self._all_projects:
-            versions = self._redmine.version.filter(project_id=project.id)
-            for version in versions:
-                if version.name == version_name:
-                    return version.id
-        return None
-
-    def _parse_info_from_issues_page(self, url: str):
-        """
-        Method parses information from page with issues.
-        :param url: url address of page with filtered issues.
-        """
-
-        attempt = 0
-        html = None
-        while attempt < MAX_ATTEMPTS_NUMBER:
-            try:
-                html = requests.get(url, auth=(self._username, self._password), timeout=3, headers=HEADERS).text
-            except Exception:
-                attempt += 1
-                time.sleep(0.5)
-            else:
-                attempt = MAX_ATTEMPTS_NUMBER
-        if html is None:
-            return
-        soup = BeautifulSoup(html, "html.parser")
-        ps_query_totals = soup.find_all("p", {"class": "query-totals"})
-        for p_query_totals in ps_query_totals:
-            for span in p_query_totals.find_all("span", {"class": re.compile("total-for-")}):
-                for total_option in self._totals_options:
-                    real_option_name = ut.TOTALS_OPTIONS[total_option.lower()].replace("_", "-")
-                    if span["class"][0] == f"total-for-{real_option_name}":
-                        value_span = span.find("span", {"class": "value"})
-                        self._totals_options[total_option] = float(value_span.get_text())
+        return self._index.find_version_id(version_name, [project_id for project_id, _ in self._projects])
+
+    def _parse_info_from_issues_page(self, url: str, totals_options: Iterable[str], closed: bool = False
+                                     ) -> Dict[str, Optional[float]]:
+        """
+        Method parses information from page with issues. If neither query totals nor
+        message about absence of issues is found or query totals have no required
+        option then PageParseError is raised.
+        :param url: url address of page with filtered issues;
+        :param totals_options: list with required totals options;
+        :param closed: if True then page is for period that has already ended.
+        :return: dictionary with values of required options.
+        """
+
+        totals = {option: None for option in totals_options}
+        html = self._get_issues_page(url, closed)
+        with self.instrumentation.span("parse"):
+            if self._parse_totals(html, totals):
+                return totals
+            # Разметка страницы не распознана, используем полный разбор страницы
+            self.instrumentation.count("full_parses")
+            # BeautifulSoup загружается только при полном разборе, чтобы не замедлять запуск
+            from bs4 import BeautifulSoup
+
+            soup = BeautifulSoup(html, "html.parser")
+            ps_query_totals = soup.find_all("p", {"class": "query-totals"})
+            if not ps_query_totals and soup.find("p", {"class": "nodata"}) is None:
+                raise PageParseError(f"Query totals were not found on page {url}")
+            for p_query_totals in ps_query_totals:
+                for span in p_query_totals.find_all("span", {"class": re.compile("total-for-")}):
+                    for total_option in totals:
+                        real_option_name = ut.TOTALS_OPTIONS[total_option.lower()].replace("_", "-")
+                        if span["class"][0] == f"total-for-{real_option_name}":
+                            value_span = span.find("span", {"class": "value"})
+                            totals[total_option] = float(value_span.get_text())
+            if ps_query_totals:
+                for total_option, value in totals.items():
+                    if value is None:
+                        raise PageParseError(f"Totals option '{total_option}' was not found on page {url}")
+            return totals
+
+    @staticmethod
+    def _parse_totals(html: str, totals: Dict[str, Optional[float]]) -> bool:
+        """
+        Method quickly parses values of totals options from block with query totals
+        without building tree of page.
+        :param html: HTML of page with issues;
+        :param totals: dictionary with required totals options where values will be
+        saved.
+        :return: True if block with query totals or message about absence of issues
+        was found. If block with query totals has no required option then
+        PageParseError is raised.
+        """
+
+        match = QUERY_TOTALS_PATTERN.search(html)
+        if match is None:
+            return False
+        if match.group(1) is None:
+            return True
+        values = {real_option_name: value for real_option_name, value in TOTAL_PATTERN.findall(match.group(1))}
+        for total_option in totals:
+            real_option_name = ut.TOTALS_OPTIONS[total_option.lower()].replace("_", "-")
+            # Отсутствующий итог нельзя считать нулевым, None остается только для страницы без задач
+            if real_option_name not in values:
+                raise PageParseError(f"Totals option '{real_option_name}' was not found in query totals")
+            totals[total_option] = float(values[real_option_name])
+        return True
+
+    @staticmethod
+    def _read_until_totals(response: "requests.Response") -> str:
+        """
+        Method reads page with issues until block with query totals is received.
+        Rest of page is read only if it is small so that connection can be reused.
+        :param response: streamed response.
+        :return: received part of page.
+        """
+
+        if response.encoding is None:
+            response.encoding = "utf-8"
+        html = ""
+        chunks = response.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True)
+        for chunk in chunks:
+            html += chunk
+            if QUERY_TOTALS_PATTERN.search(html):
+                break
+        else:
+            return html
+        drained = 0
+        for chunk in chunks:
+            drained += len(chunk)
+            if drained > DRAIN_LIMIT:
+                break
+        return html
 
     @check_auth
     def add_filter(self, filter_name: str, operator_name: str, *values):
@@ -164,20 +447,24 @@ class XimcRedmine:
         else:
             value = values[0]
         real_filter_name, value = ut.find_real_filter_name_and_value(filter_name, value)
-        if value is not None and real_filter_name in ut.FILTERS_WITH_USERS:
-            value = self._get_user_id(value)
-        elif filter_name in ("версия", "target version"):
-            value = self._get_version_id(value)
-        elif filter_name in ("проект", "project"):
-            project_id = self._find_project_id(value)
-            self._projects.append((project_id, value))
-            value = project_id
+        with self.instrumentation.span("resolve_name", filter=real_filter_name):
+            if value is not None and real_filter_name in ut.FILTERS_WITH_USERS:
+                value = self._get_user_id(value)
+            elif filter_name in ("версия", "target version"):
+                value = self._get_version_id(value)
+            elif filter_name in ("проект", "project"):
+                project_id = self._find_project_id(value)
+                self._projects.append((project_id, value))
+                value = project_id
         operator = ut.find_operator(operator_name)
         for filter_obj in self._filters:
-            if (value is None and real_filter_name == filter_obj.get("filter") and
-                    operator == filter_obj.get("operator")):
-                values = filter_obj.get("values")
-                if value not in values:
+            if real_filter_name != filter_obj.get("filter") or operator != filter_obj.get("operator"):
+                continue
+            if value is None:
+                return
+            # Значения фильтров-списков объединяются, как в веб-интерфейсе (например, несколько проектов)
+            if operator in ("=", "!") and ut.AVAILABLE_FILTERS[real_filter_name]["type"].startswith("list"):
+                if value not in filter_obj["values"]:
                     filter_obj["values"].append(value)
                 return
         self._filters.append({"filter": real_filter_name,
@@ -186,13 +473,24 @@ class XimcRedmine:
         if operator_name in ("между", "between"):
             self._filters[-1]["values"].append(value_2)
 
-    def auth(self):
+    def auth(self, cached: bool = False):
         """
         Method authenticates user in Redmine.
+        :param cached: if True and snapshot of indexes is fresh then user is taken
+        from snapshot without request to Redmine. Password is checked only by the
+        first request that needs it.
         """
 
-        self.user = self._redmine.auth()
-        self._all_projects = self._redmine.project.all()
+        with self.instrumentation.span("auth"):
+            user = self._index.get_user(self._username) if cached else None
+            if user is not None:
+                self._user = None
+            else:
+                self._user = self._get_redmine().auth()
+                user = {field: value for field, value in self._user.raw().items() if field in USER_FIELDS}
+            self._user_data = user
+            with self.instrumentation.span("load_index"):
+                self._index.load(user)
 
     def clear_filters(self):
         """
@@ -210,48 +508,235 @@ class XimcRedmine:
 
         return self._filters
 
+    @check_auth
+    def get_fingerprint(self, filters: list) -> Tuple[Optional[str], int]:
+        """
+        Method returns fingerprint of set of issues: time of the last update of
+        issues and number of issues. Any created, changed or deleted issue changes
+        fingerprint, so fingerprint shows whether totals for filters must be
+        recomputed. Fingerprint is received by one request with one issue.
+        :param filters: list with filters (see method get_filters).
+        :return: time of the last update (None if there are no issues) and number of
+        issues.
+        """
+
+        url = ut.create_url(filters, [], redmine_url=self.url, file_format="json", sort="updated_on:desc")
+        with self.instrumentation.span("fingerprint"):
+            # REST API берет размер страницы из параметра limit, а не per_page
+            response = self._get_redmine().engine.request("get", url, params={"limit": 1})
+        self.instrumentation.count("fingerprint_requests")
+        issues = response.get("issues", [])
+        return (issues[0]["updated_on"] if issues else None), response.get("total_count", 0)
+
+    @check_auth
+    def get_grouped_totals(self, group_by: str, *totals_options) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Method returns values for given totals options for every group of issues.
+        Redmine shows group only on pages where there are issues of group, so pages
+        are requested until the last one.
+        :param group_by: name of column to group issues by (for example "Проект",
+        "Payment category", "Валюта", "Трекер", "Статус");
+        :param totals_options: list with required totals options.
+        :return: dictionary with names of groups and values of required options.
+        """
+
+        real_group_by = ut.GROUP_BY_OPTIONS[group_by.lower()]
+        options = [option for option in totals_options if option.lower() in ut.TOTALS_OPTIONS]
+        _, groups = self._get_grouped_totals(self._filters, real_group_by, options)
+        return groups
+
     @check_auth
     def get_groups(self):
         """
         Method returns groups. To work with groups in Redmine user must have special
-        permission.
+        permission, it is checked by request of one resource. Then all groups are
+        downloaded once by concurrent requests of pages.
         :return: groups.
         """
 
-        groups = self._redmine.group.all()
-        try:
-            for _ in groups:
-                pass
-        except ForbiddenError:
-            print("You do not have permission to work with groups")
-            raise
+        self._check_permission(self._get_redmine().group, "groups")
+        groups = self._get_redmine().group.all()
+        # Все страницы запрашиваются сразу и параллельно, дальше набор работает без запросов
+        len(groups)
         return groups
 
     @check_auth
-    def get_project(self, project_name: str) -> Optional[Project]:
+    def get_issue_ids(self) -> Set[int]:
+        """
+        Method returns IDs of all issues (including closed ones) visible to user.
+        IDs are exported as CSV with the only column, so full issues are not
+        downloaded. If export is cut by export limit of Redmine then IDs are taken
+        from issues of REST API.
+        :return: IDs of issues.
+        """
+
+        filters = [{"filter": "status_id", "operator": "*", "values": [""]}]
+        issue_ids = {int(issue_id) for chunk in self.get_issues_csv("id", filters=filters)
+                     for issue_id in chunk["id"].dropna()}
+        # Число задач запрашивается после выгрузки: созданная во время выгрузки задача только вызовет запасной путь
+        total_count = self._get_redmine().engine.request("get", f"{self.url}/issues.json",
+                                                   params={"status_id": "*", "limit": 1}).get("total_count", 0)
+        if len(issue_ids) < total_count:
+            self.instrumentation.count("cut_exports")
+            issue_ids = {issue["id"] for page in self.get_issue_pages(status_id="*") for issue in page}
+        return issue_ids
+
+    @check_auth
+    def get_issue_pages(self, **filters) -> Iterator[List[dict]]:
+        """
+        Method returns issues through REST API by pages. Pages are requested
+        concurrently and are not kept, so issues can be converted to compact form page
+        by page (see class IssueRecords).
+        :param filters: filters for issues in format of REST API.
+        :return: lists with issues as dictionaries.
+        """
+
+        return self._get_pages("/issues.json", "issues", filters)
+
+    @check_auth
+    def get_issue_statuses(self) -> List[Tuple[int, str, bool]]:
+        """
+        Method returns statuses of issues.
+        :return: list with IDs, names of statuses and flags whether status is closed.
+        """
+
+        return [(status["id"], status["name"], status.get("is_closed", False))
+                for status in self._get_redmine().issue_status.all().values()]
+
+    @check_auth
+    def get_issues(self, *fields, **filters) -> Iterator[dict]:
+        """
+        Method returns issues through REST API. Issues are downloaded when they are
+        iterated, pages after the first one are requested concurrently.
+        :param fields: names of fields to keep in issues. If not given then all
+        fields are kept;
+        :param filters: filters for issues in format of REST API.
+        :return: dictionaries with fields of issues.
+        """
+
+        return self._get_redmine().issue.filter(**filters).values(*fields)
+
+    @check_auth
+    def get_issues_csv(self, *columns, chunk_size: int = CSV_CHUNK_SIZE, filters: Optional[list] = None
+                       ) -> Iterator["pd.DataFrame"]:
+        """
+        Method exports issues that satisfy filters as CSV and yields them by tables
+        with given number of rows. Export is read from stream, so memory does not
+        depend on number of issues. Numeric columns (payments, rate, tail, hours) are
+        converted to numbers, columns with dates are converted to dates in format of
+        Redmine (see parameter date_format), date in other format causes
+        PageParseError, empty date becomes NaT. Redmine exports not more issues than
+        export limit set in its settings.
+        :param columns: real names of columns (for example "project", "due_date",
+        "cf_29"). Custom fields are given by built-in IDs, they are requested by IDs
+        of Redmine (see function utils.get_field_id), but tables keep given names;
+        :param chunk_size: number of rows in one table;
+        :param filters: list with filters (see method get_filters). If None then
+        current filters are used.
+        :return: tables with issues.
+        """
+
+        import pandas as pd
+        import requests
+
+        columns = list(columns)
+        url = ut.create_url(self._filters if filters is None else filters, {},
+                            columns=[ut.get_field_id(column) for column in columns], redmine_url=self.url,
+                            file_format="csv")
+        with self.instrumentation.span("export_csv", url=url) as attributes:
+            with self._layer.request(self._get_session(), "get", url, stream=True) as response:
+                if not response.ok:
+                    raise RequestError(f"Request to {url} failed with status {response.status_code}")
+                response.raw.decode_content = True
+                # Иначе поток закрывается после получения всех данных, а pandas читает его еще раз
+                response.raw.auto_close = False
+                stream = io.TextIOWrapper(response.raw, encoding="utf-8-sig", newline="")
+                # Разделители зависят от языка пользователя: в русском языке поля разделяются
+                # точкой с запятой, а дробная часть отделяется запятой
+                header = stream.readline()
+                separator = ";" if ";" in header else ","
+                decimal = "," if separator == ";" else "."
+                date_format = self._date_format or CSV_DATE_FORMATS[separator]
+                rows_number = 0
+                try:
+                    for chunk in pd.read_csv(stream, sep=separator, header=None, names=columns, dtype=str,
+                                             keep_default_na=False, na_values=[""], chunksize=chunk_size):
+                        for column in columns:
+                            if column in CSV_NUMERIC_COLUMNS:
+                                chunk[column] = pd.to_numeric(chunk[column].str.replace(decimal, ".", regex=False),
+                                                              errors="coerce")
+                            elif column in CSV_DATE_COLUMNS:
+                                # Время в столбцах вроде created_on следует за датой и не разбирается
+                                try:
+                                    chunk[column] = pd.to_datetime(chunk[column], format=date_format, exact=False)
+                                except ValueError as exc:
+                                    raise PageParseError(f"Column {column} of export {url} has dates not in "
+                                                         f"format '{date_format}': {exc}") from exc
+                        rows_number += len(chunk)
+                        yield chunk
+                except requests.RequestException as exc:
+                    raise RequestError(f"Reading of response from {url} failed: {exc}") from exc
+                attributes["rows"] = rows_number
+        self.instrumentation.count("exported_rows", rows_number)
+
+    @check_auth
+    def get_payments(self, start_date: str, stop_date: str) -> List[Dict[str, Optional[str]]]:
+        """
+        Method returns closed issues of tracker Payment with due date in given period.
+        Issues are downloaded through REST API by concurrent paginated requests, only
+        fields required for finances are kept from every page.
+        :param start_date: period start date;
+        :param stop_date: period end date.
+        :return: list with due date, project, subject and payment custom fields of
+        issues. Custom fields are named by built-in IDs (see PAYMENT_FIELDS).
+        """
+
+        _, status_id = ut.find_real_filter_name_and_value("статус", "closed")
+        _, tracker_id = ut.find_real_filter_name_and_value("трекер", "payment")
+        pages = self.get_issue_pages(status_id=status_id, tracker_id=tracker_id, due_date=f"><{start_date}|{stop_date}")
+        # Поля платежей называются встроенными идентификаторами, даже если на сервере их идентификаторы другие
+        field_ids = {ut.get_field_id(field_id): field_id for field_id in PAYMENT_FIELDS}
+        payments = []
+        for issue in (issue for page in pages for issue in page):
+            payment = {"due_date": issue.get("due_date"),
+                       "project": issue.get("project", {}).get("name"),
+                       "subject": issue.get("subject")}
+            for field_id in PAYMENT_FIELDS:
+                payment[field_id] = None
+            for custom_field in issue.get("custom_fields", []):
+                field_id = field_ids.get(f"cf_{custom_field.get('id')}")
+                if field_id is not None:
+                    payment[field_id] = custom_field.get("value")
+            payments.append(payment)
+        return payments
+
+    @check_auth
+    def get_project(self, project_name: str) -> Optional["Project"]:
         """
         Method returns project with given name.
         :param project_name: name of project.
         :return: project.
         """
 
-        for project in self._all_projects:
-            if project.name == project_name:
-                try:
-                    project = self._redmine.project.get(project.id)
-                    return project
-                except Exception:
-                    return None
-        return None
+        project_id = self._find_project_id(project_name)
+        if project_id is None:
+            return None
+        try:
+            return self._get_redmine().project.get(project_id)
+        except Exception:
+            return None
 
     @check_auth
-    def get_projects(self) -> List[Tuple[int, str]]:
+    def get_projects(self, cached: bool = False) -> List[Tuple[int, str]]:
         """
         Method returns IDs and names of all available projects.
+        :param cached: if True then projects are taken from index of names.
         :return: IDs and names of available projects.
         """
 
-        return [(project.id, project.name) for project in self._redmine.project.all()]
+        if cached:
+            return self._index.get_projects()
+        return [(project.id, project.name) for project in self._get_redmine().project.all()]
 
     @check_auth
     def get_roles(self) -> List[Tuple[int, str]]:
@@ -260,7 +745,39 @@ class XimcRedmine:
         :return: list with IDs and names of roles.
         """
 
-        return [(role.id, role.name) for role in self._redmine.role.all()]
+        return [(role.id, role.name) for role in self._get_redmine().role.all()]
+
+    @check_auth
+    def get_time_entries(self, start_date: str, stop_date: str, *fields, **filters) -> Iterator[dict]:
+        """
+        Method returns time entries spent in given period through REST API. Time
+        entries are downloaded when they are iterated, pages after the first one are
+        requested concurrently.
+        :param start_date: period start date;
+        :param stop_date: period end date;
+        :param fields: names of fields to keep in time entries. If not given then all
+        fields are kept;
+        :param filters: filters for time entries in format of REST API (for example
+        project_id, user_id).
+        :return: dictionaries with fields of time entries.
+        """
+
+        return self._get_redmine().time_entry.filter(from_date=start_date, to_date=stop_date, **filters).values(*fields)
+
+    @check_auth
+    def get_time_entry_pages(self, start_date: str, stop_date: str, **filters) -> Iterator[List[dict]]:
+        """
+        Method returns time entries spent in given period through REST API by pages.
+        Pages are requested concurrently and are not kept.
+        :param start_date: period start date;
+        :param stop_date: period end date;
+        :param filters: filters for time entries in format of REST API (for example
+        project_id, user_id).
+        :return: lists with time entries as dictionaries.
+        """
+
+        return self._get_pages("/time_entries.json", "time_entries", dict(filters, **{"from": start_date,
+                                                                                        "to": stop_date}))
 
     @check_auth
     def get_totals(self, *totals_options) -> Dict[str, Optional[float]]:
@@ -274,35 +791,165 @@ class XimcRedmine:
         for option in totals_options:
             if option.lower() in ut.TOTALS_OPTIONS:
                 self._totals_options[option] = None
-        url = ut.create_url(self._filters, self._totals_options)
-        self._parse_info_from_issues_page(url)
+        url = ut.create_url(self._filters, self._totals_options, redmine_url=self.url)
+        with self.instrumentation.span("get_totals"):
+            self._totals_options = self._parse_info_from_issues_page(url, self._totals_options,
+                                                                     ut.is_closed_period(self._filters))
         return self._totals_options
 
+    @check_auth
+    def get_totals_for_filters(self, filters: Dict[Hashable, list], *totals_options, workers: int = WORKERS_NUMBER
+                               ) -> Iterator[Tuple[Hashable, Dict[str, Optional[float]]]]:
+        """
+        Method returns values for given totals options for several sets of filters.
+        Requests are chosen by query planner (see class QueryPlan): identical queries
+        are executed only once, queries that differ by complementary filters are
+        received from grouped pages or by subtraction. Requests are executed
+        concurrently by pool of workers. Results are yielded as soon as requests
+        they depend on are completed.
+        :param filters: dictionary with keys of queries and lists with filters (see
+        method get_filters);
+        :param totals_options: list with required totals options;
+        :param workers: number of workers that execute requests.
+        :return: pairs of query key and dictionary with values of required options.
+        """
+
+        options = [option for option in totals_options if option.lower() in ut.TOTALS_OPTIONS]
+        plan = QueryPlan(filters)
+        self.instrumentation.count("planned_requests", len(plan))
+        self.instrumentation.count("planned_queries", len(filters))
+        responses = {}
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {}
+            for index, (filters_for_request, group_by) in enumerate(plan.requests):
+                if group_by is None:
+                    url = ut.create_url(filters_for_request, options, redmine_url=self.url)
+                    future = executor.submit(self._parse_info_from_issues_page, url, options,
+                                             ut.is_closed_period(filters_for_request))
+                else:
+                    future = executor.submit(self._get_grouped_totals, filters_for_request, group_by, options)
+                futures[future] = index
+            for future in as_completed(futures):
+                index = futures[future]
+                result = future.result()
+                responses[index] = result if isinstance(result, tuple) else (result, {})
+                for key in plan.get_keys(index):
+                    yield key, plan.get_totals(key, responses, options)
+            for key in plan.get_keys():
+                yield key, plan.get_totals(key, responses, options)
+        finally:
+            # При ошибке или прерывании (Ctrl-C) запросы из очереди отменяются, чтобы не ждать их выполнения
+            executor.shutdown(cancel_futures=True)
+
+    @check_auth
+    def get_updated_issues(self, updated_on: Optional[str] = None, issue_id: int = 0, **filters
+                           ) -> Iterator[List[dict]]:
+        """
+        Method returns issues updated since given time in order of time of update and
+        ID. Pages are requested by keyset pagination: every page starts after the
+        last received issue and not at offset, so changes of issues during download
+        neither shift nor skip other issues. Issue changed during download is
+        returned again later with new time of update.
+        :param updated_on: time of update of the last received issue in format of
+        REST API. If None then all issues are returned;
+        :param issue_id: ID of the last received issue, issues with the same time of
+        update and smaller IDs are skipped;
+        :param filters: other filters for issues in format of REST API.
+        :return: lists with issues.
+        """
+
+        url = f"{self.url}/issues.json"
+        while True:
+            params = dict(filters, sort="updated_on,id", limit=PAGE_SIZE)
+            if updated_on is not None:
+                params["updated_on"] = f">={updated_on}"
+            issues = self._get_redmine().engine.request("get", url, params=params).get("issues", [])
+            # Фильтр по времени нестрогий, поэтому уже полученные задачи с тем же временем отбрасываются
+            new_issues = [issue for issue in issues
+                          if updated_on is None or (issue["updated_on"], issue["id"]) > (updated_on, issue_id)]
+            if new_issues:
+                yield new_issues
+                updated_on, issue_id = new_issues[-1]["updated_on"], new_issues[-1]["id"]
+                continue
+            if len(issues) < PAGE_SIZE:
+                return
+            # Вся страница состоит из полученных задач с одним временем обновления: они дочитываются по ID,
+            # затем чтение продолжается со следующей секунды
+            while True:
+                params.update(updated_on=f"><{updated_on}|{updated_on}", issue_id=f">={issue_id + 1}", sort="id")
+                issues = self._get_redmine().engine.request("get", url, params=params).get("issues", [])
+                if issues:
+                    yield issues
+                    issue_id = issues[-1]["id"]
+                if len(issues) < PAGE_SIZE:
+                    break
+            updated_on = (datetime.strptime(updated_on, TIME_FORMAT) + timedelta(seconds=1)).strftime(TIME_FORMAT)
+            issue_id = 0
+
     @check_auth
     def get_users(self):
         """
         Method returns users. To work with users in Redmine user must have special
-        permission.
+        permission, it is checked by request of one resource. Then all users are
+        downloaded once by concurrent requests of pages.
         :return: users.
         """
 
-        users = self._redmine.user.all()
-        try:
-            for _ in users:
-                pass
-        except ForbiddenError:
-            print("You do not have permission to work with users")
-            raise
+        self._check_permission(self._get_redmine().user, "users")
+        users = self._get_redmine().user.all()
+        # Все страницы запрашиваются сразу и параллельно, дальше набор работает без запросов
+        len(users)
         return users
 
     @check_auth
-    def get_versions_for_project(self, project_name: str) -> List[Tuple[int, str]]:
+    def get_versions_for_project(self, project_name: str, cached: bool = False) -> List[Tuple[int, str]]:
         """
         Method returns versions for project with given name.
-        :param project_name: name of project for which all versions should be returned.
+        :param project_name: name of project for which all versions should be returned;
+        :param cached: if True then versions are taken from index of names, they are
+        requested only if they are not in index.
         :return: IDs and names of versions for given project.
         """
 
         project_identifier = self._find_project_id(project_name)
-        versions = self._redmine.version.filter(project_id=project_identifier)
+        if cached:
+            return [] if project_identifier is None else self._index.get_versions(project_identifier)
+        versions = self._get_redmine().version.filter(project_id=project_identifier)
         return [(version.id, version.name) for version in versions]
+
+    @check_auth
+    def load_filters(self, cached: bool = True) -> List[str]:
+        """
+        Method synchronizes definitions of filters, operators and values of filters
+        with Redmine, so IDs changed on server (for example, IDs of custom fields) are
+        used in queries. If page of Redmine can not be received or has no definitions
+        then built-in definitions are kept.
+        :param cached: if True and snapshot of definitions is fresh then definitions
+        are taken from snapshot without request to Redmine.
+        :return: descriptions of IDs that differ from built-in ones.
+        """
+
+        with self.instrumentation.span("load_filters"):
+            if not (cached and self._vocabulary.is_fresh(self.url)):
+                url = ut.create_url([], {}, redmine_url=self.url)
+                try:
+                    html = self._get_issues_page(url, whole_page=True)
+                except (CacheMissError, RequestError):
+                    html = ""
+                if not self._vocabulary.load(html, self.url):
+                    self.instrumentation.count("filters_not_loaded")
+                    return []
+            return self._vocabulary.apply()
+
+    @property
+    def user(self) -> Optional["User"]:
+        """
+        :return: authenticated user or None if user is not authenticated. User taken
+        from snapshot of indexes is converted to resource of python-redmine only when
+        it is needed.
+        """
+
+        if self._user is None and self._user_data is not None:
+            self._user = self._get_redmine().user.to_resource(self._user_data)
+        return self._user